@@ -0,0 +1,56 @@
+"""Замер скорости сопоставления заявок торговой площадки.
+
+Прогоняет через стаканы случайные заявки вокруг общей цены и выводит
+сколько заявок и сделок обрабатывается в секунду.
+База данных для замера не нужна.
+
+Запуск из корня проекта:
+
+    python -m benchmarks.orderbook [orders] [items]
+"""
+
+import random
+import sys
+
+from libs.orderbook import MatchingEngine, Order
+
+_SEED = 42
+
+
+def make_orders(count: int, items: int) -> list[Order]:
+    """Собирает случайные заявки для замера."""
+    rnd = random.Random(_SEED)
+    return [
+        Order(
+            order_id=i,
+            user_id=rnd.randrange(1000),
+            item_id=rnd.randrange(items),
+            side=rnd.choice(("buy", "sell")),
+            price=rnd.randint(90, 110),
+            amount=rnd.randint(1, 20),
+        )
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    """Запускает замер."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 50  # noqa: PLR2004
+    orders = make_orders(count, items)
+
+    engine = MatchingEngine()
+    for order in orders:
+        engine.submit(order)
+
+    stats = engine.stats
+    print(f"Заявок: {stats.orders}, предметов в стаканах: {items}")
+    print(f"Сделок: {stats.trades}, продано предметов: {stats.items}")
+    print(f"Осталось заявок в стаканах: {len(engine)}")
+    print(f"Время: {stats.duration:.3f} с")
+    print(f"Заявок в секунду: {stats.orders_per_second:,.0f}")
+    print(f"Сделок в секунду: {stats.trades / stats.duration:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
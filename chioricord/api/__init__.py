@@ -3,13 +3,18 @@
 Доступен библиотекам и плагинам.
 """
 
+from chioricord.api.buffer import CopyBuffer
 from chioricord.api.config import BotConfig, PluginConfig, PluginConfigManager
 from chioricord.api.db import ChioDB, DBTable
+from chioricord.api.leaderboard import Leaderboard, LeaderPage
 
 __all__ = (
     "BotConfig",
     "PluginConfig",
     "PluginConfigManager",
     "ChioDB",
+    "CopyBuffer",
     "DBTable",
+    "Leaderboard",
+    "LeaderPage",
 )
@@ -0,0 +1,130 @@
+"""Отложенная запись строк в базу данных.
+
+Позволяет не ждать записи в базу данных на горячем пути.
+Строки накапливаются в памяти и записываются пачками через `COPY`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, Any
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from chioricord.api.db import ChioDB
+
+Row = tuple[Any, ...]
+
+
+class CopyBuffer:
+    """Буфер строк для пакетной записи в таблицу.
+
+    Строки записываются в таблицу каждые `interval` секунд или как
+    только в буфере накопится `batch_size` строк.
+    Если буфер переполнен, новые строки отбрасываются и учитываются
+    в счётчике `dropped`.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        db: ChioDB,
+        table: str,
+        columns: Sequence[str],
+        *,
+        batch_size: int = 500,
+        interval: float = 1.0,
+        max_size: int = 50_000,
+    ) -> None:
+        self._db = db
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_size = max_size
+
+        self.written = 0
+        self.dropped = 0
+
+        self._rows: deque[Row] = deque()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._stop = asyncio.Event()
+        self._flush_task: asyncio.Task[int] | None = None
+
+    def __len__(self) -> int:
+        """Сколько строк ожидают записи."""
+        return len(self._rows)
+
+    def add(self, row: Row) -> bool:
+        """Добавляет строку в буфер.
+
+        Не ждёт записи в базу данных.
+        Возвращает False, если строка была отброшена.
+        """
+        if len(self._rows) >= self.max_size:
+            self.dropped += 1
+            return False
+
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self.flush())
+        return True
+
+    def _requeue(self, rows: list[Row]) -> None:
+        # Более новые строки остаются, а лишние старые отбрасываются
+        free = max(self.max_size - len(self._rows), 0)
+        self.dropped += max(len(rows) - free, 0)
+        self._rows.extendleft(reversed(rows[:free]))
+
+    async def flush(self) -> int:
+        """Записывает все накопленные строки в базу данных."""
+        async with self._lock:
+            if not self._rows:
+                return 0
+
+            rows = list(self._rows)
+            self._rows.clear()
+            try:
+                await self._db.pool.copy_records_to_table(
+                    self.table, records=rows, columns=list(self.columns)
+                )
+            except asyncio.CancelledError:
+                self._requeue(rows)
+                raise
+            except Exception as e:
+                logger.exception(e)
+                self._requeue(rows)
+                return 0
+
+            self.written += len(rows)
+            return len(rows)
+
+    async def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.interval)
+            except TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self) -> None:
+        """Запускает периодическую запись строк."""
+        if self._task is None:
+            self._stop.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Останавливает запись и сохраняет оставшиеся строки.
+
+        Дожидается текущей записи, а не отменяет её.
+        """
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
@@ -28,6 +28,19 @@ class DBTable(ABC):
     async def create_table(self) -> None:
         """Создаёт таблицу в базе данных, если ещё не была создана."""
 
+    async def load(self) -> None:
+        """Загружает данные таблицы после подключения к базе данных.
+
+        Вызывается один раз, после создания всех таблиц.
+        Используется таблицами, которые держат часть данных в памяти.
+        """
+
+    async def close(self) -> None:
+        """Сохраняет данные таблицы перед отключением от базы данных.
+
+        Используется таблицами, которые откладывают запись в базу данных.
+        """
+
     @property
     def pool(self) -> asyncpg.Pool:
         """Возвращает подключение к базе данных."""
@@ -79,6 +92,13 @@ class ChioDB:
         if self._pool is None:
             logger.warning("No active connection to close")
             return
+
+        for name, model in self._tables.items():
+            logger.debug("Close table for model {}", name)
+            try:
+                await model.close()
+            except Exception as e:
+                logger.exception(e)
         await self._pool.close()
 
     def register(self, table: type[DBTable]) -> None:
@@ -97,3 +117,10 @@ class ChioDB:
         for name, model in self._tables.items():
             logger.debug("Create table for model {}", name)
             await model.create_table()
+
+    async def load_tables(self) -> None:
+        """Загружает данные таблиц в память."""
+        logger.info("Load tables")
+        for name, model in self._tables.items():
+            logger.debug("Load table for model {}", name)
+            await model.load()
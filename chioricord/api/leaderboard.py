@@ -0,0 +1,198 @@
+"""Постраничные таблицы лидеров.
+
+Страницы выбираются по ключу `(score, user_id)` последней строки
+предыдущей страницы, а не через `OFFSET`.
+Потому стоимость получения страницы не зависит от её номера.
+Для быстрой работы таблица должна иметь индекс по `(score, user_id)`.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Generic, TypeVar
+
+if TYPE_CHECKING:
+    from chioricord.api.db import ChioDB
+
+_T = TypeVar("_T")
+
+# Ключ строки в таблице лидеров: (score, user_id)
+LeaderKey = tuple[Any, int]
+
+
+@dataclass(slots=True, frozen=True)
+class LeaderPage(Generic[_T]):  # noqa: UP046
+    """Страница таблицы лидеров.
+
+    - start: Место первой записи на странице, начиная с 1.
+    - items: Записи страницы.
+    - keys: Ключи записей страницы.
+    - has_next: Есть ли записи после этой страницы.
+    """
+
+    start: int
+    items: list[_T]
+    keys: list[LeaderKey]
+    has_next: bool
+
+    @property
+    def has_prev(self) -> bool:
+        """Есть ли записи перед этой страницей."""
+        return self.start > 1
+
+    def positions(self) -> list[tuple[int, _T]]:
+        """Записи страницы вместе с их местами."""
+        return list(enumerate(self.items, self.start))
+
+
+class Leaderboard(Generic[_T]):  # noqa: UP046
+    """Таблица лидеров по одной колонке или выражению.
+
+    - table: Имя таблицы базы данных.
+    - score: Колонка или выражение, по которому строится рейтинг.
+    - from_row: Как собрать запись из строки таблицы.
+    - prepare: Вызывается перед каждым запросом.
+      Используется таблицами с отложенной записью.
+
+    Записи с одинаковым счётом упорядочиваются по ID пользователя,
+    потому каждое место в рейтинге уникально.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        db: ChioDB,
+        table: str,
+        score: str,
+        from_row: Callable[[Sequence[Any]], _T],
+        *,
+        page_size: int = 10,
+        prepare: Callable[[], Awaitable[None]] | None = None,
+    ) -> None:
+        self._db = db
+        self.table = table
+        self.score = score
+        self.from_row = from_row
+        self.page_size = page_size
+        self._prepare = prepare
+
+    async def _fetch(
+        self, where: str, order: str, limit: int, *args: object
+    ) -> tuple[list[_T], list[LeaderKey]]:
+        if self._prepare is not None:
+            await self._prepare()
+        cur = await self._db.pool.fetch(
+            f"SELECT {self.score}, * FROM {self.table} {where} "
+            f"ORDER BY {self.score} {order}, user_id {order} "
+            f"LIMIT {int(limit)}",
+            *args,
+        )
+        return (
+            [self.from_row(row[1:]) for row in cur],
+            [(row[0], row[1]) for row in cur],
+        )
+
+    def _page(
+        self, start: int, items: list[_T], keys: list[LeaderKey]
+    ) -> LeaderPage[_T]:
+        has_next = len(items) > self.page_size
+        return LeaderPage(
+            start, items[: self.page_size], keys[: self.page_size], has_next
+        )
+
+    def page_number(self, page: LeaderPage[_T]) -> int:
+        """Номер страницы, начиная с 1."""
+        return (page.start - 1) // self.page_size + 1
+
+    async def first_page(self) -> LeaderPage[_T]:
+        """Первая страница таблицы лидеров."""
+        items, keys = await self._fetch("", "DESC", self.page_size + 1)
+        return self._page(1, items, keys)
+
+    async def next_page(self, page: LeaderPage[_T]) -> LeaderPage[_T]:
+        """Страница, следующая за переданной."""
+        if not page.keys:
+            return page
+        score, user_id = page.keys[-1]
+        items, keys = await self._fetch(
+            f"WHERE ({self.score}, user_id) < ($1, $2)",
+            "DESC",
+            self.page_size + 1,
+            score,
+            user_id,
+        )
+        if not items:
+            return page
+        return self._page(page.start + len(page.items), items, keys)
+
+    async def prev_page(self, page: LeaderPage[_T]) -> LeaderPage[_T]:
+        """Страница, предшествующая переданной."""
+        if not page.keys or page.start <= self.page_size + 1:
+            return await self.first_page()
+        score, user_id = page.keys[0]
+        items, keys = await self._fetch(
+            f"WHERE ({self.score}, user_id) > ($1, $2)",
+            "ASC",
+            self.page_size,
+            score,
+            user_id,
+        )
+        items.reverse()
+        keys.reverse()
+        return LeaderPage(page.start - len(items), items, keys, True)
+
+    async def get_key(self, user_id: int) -> LeaderKey | None:
+        """Ключ пользователя в таблице лидеров."""
+        if self._prepare is not None:
+            await self._prepare()
+        score = await self._db.pool.fetchval(
+            f"SELECT {self.score} FROM {self.table} WHERE user_id=$1",
+            user_id,
+        )
+        return None if score is None else (score, user_id)
+
+    async def rank(self, user_id: int) -> int | None:
+        """Место пользователя в таблице лидеров."""
+        key = await self.get_key(user_id)
+        if key is None:
+            return None
+        return await self._rank(key)
+
+    async def _rank(self, key: LeaderKey) -> int:
+        return await self._db.pool.fetchval(
+            f"SELECT COUNT(*) + 1 FROM {self.table} "
+            f"WHERE ({self.score}, user_id) > ($1, $2)",
+            *key,
+        )
+
+    async def user_page(self, user_id: int) -> LeaderPage[_T]:
+        """Страница, на которой находится пользователь.
+
+        Если пользователя нет в таблице, возвращает первую страницу.
+        """
+        key = await self.get_key(user_id)
+        if key is None:
+            return await self.first_page()
+
+        rank = await self._rank(key)
+        start = (rank - 1) // self.page_size * self.page_size + 1
+        before = rank - start
+        items: list[_T] = []
+        keys: list[LeaderKey] = []
+        if before > 0:
+            items, keys = await self._fetch(
+                f"WHERE ({self.score}, user_id) > ($1, $2)",
+                "ASC",
+                before,
+                *key,
+            )
+            items.reverse()
+            keys.reverse()
+
+        after_items, after_keys = await self._fetch(
+            f"WHERE ({self.score}, user_id) <= ($1, $2)",
+            "DESC",
+            self.page_size - len(items) + 1,
+            *key,
+        )
+        return self._page(start, items + after_items, keys + after_keys)
@@ -7,6 +7,7 @@
 
 import asyncio
 import sys
+from functools import partial
 
 import hikari
 import miru
@@ -43,6 +44,16 @@ async def _connect_db(client: ChioClient) -> None:
     logger.info("Connect to chio database")
     await client.db.connect(str(client.bot_config.DB_DSN))
     await client.db.create_tables()
+    await client.db.load_tables()
+
+
+async def _close_db(client: ChioClient, event: hikari.StoppedEvent) -> None:
+    """Закрываем подключение к базе данных.
+
+    Вызывается после выключения бота, когда все хуки выключения уже
+    сохранили свои данные.
+    """
+    await client.db.close()
 
 
 def _setup_logger(config: BotConfig) -> None:
@@ -68,6 +79,9 @@ def _setup_db(client: ChioClient) -> None:
     client.db.register(RoleTable)
     client.add_hook(has_role(RoleLevel.USER))
     client.add_startup_hook(_connect_db)
+    client.app.event_manager.subscribe(
+        hikari.StoppedEvent, partial(_close_db, client)
+    )
 
 
 def start_bot() -> None:
@@ -0,0 +1,105 @@
+"""Кеш в памяти процесса.
+
+Используется ядром и библиотеками, чтобы не обращаться к базе данных
+за редко изменяемыми данными на каждое событие.
+"""
+
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import Generic, TypeVar
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+__all__ = ("CacheStats", "TTLCache")
+
+
+@dataclass(slots=True)
+class CacheStats:
+    """Статистика использования кеша.
+
+    - hits: Сколько раз значение было найдено в кеше.
+    - misses: Сколько раз значения не оказалось в кеше.
+    """
+
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def total(self) -> int:
+        """Общее количество обращений к кешу."""
+        return self.hits + self.misses
+
+    @property
+    def ratio(self) -> float:
+        """Доля попаданий в кеш от 0 до 1."""
+        return self.hits / self.total if self.total else 0.0
+
+
+class TTLCache(Generic[_K, _V]):  # noqa: UP046
+    """Ограниченный кеш с временем жизни записей.
+
+    Запись удаляется из кеша по истечению `ttl` секунд.
+    При переполнении вытесняются давно не используемые записи.
+    """
+
+    __slots__ = ("maxsize", "ttl", "stats", "_data")
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[_K, tuple[float, _V]] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Количество записей в кеше, включая устаревшие."""
+        return len(self._data)
+
+    def __contains__(self, key: _K) -> bool:
+        """Проверяет наличие актуального значения в кеше."""
+        return self.peek(key) is not None
+
+    def peek(self, key: _K) -> _V | None:
+        """Возвращает значение не затрагивая статистику."""
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item[1]
+
+    def get(self, key: _K) -> _V | None:
+        """Возвращает значение из кеша, если оно ещё не устарело."""
+        value = self.peek(key)
+        if value is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: _K, value: _V, ttl: float | None = None) -> None:
+        """Записывает новое значение в кеш.
+
+        Для отдельной записи можно указать своё время жизни.
+        """
+        self._data[key] = (
+            time.monotonic() + (self.ttl if ttl is None else ttl),
+            value,
+        )
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: _K) -> _V | None:
+        """Удаляет значение из кеша."""
+        item = self._data.pop(key, None)
+        return None if item is None else item[1]
+
+    def clear(self) -> None:
+        """Полностью очищает кеш."""
+        self._data.clear()
@@ -9,8 +9,11 @@ from hikari.guilds import PartialGuild
 from hikari.locales import Locale
 from hikari.traits import GatewayBotAware
 from hikari.undefined import UNDEFINED
+from loguru import logger
 
 from chioricord.api import BotConfig, ChioDB, PluginConfigManager
+from chioricord.resolver import EntityResolver
+from chioricord.timings import CommandTimings
 
 __all__ = ("ChioClient", "ChioContext")
 
@@ -18,7 +21,8 @@ __all__ = ("ChioClient", "ChioContext")
 class ChioClient(arc.GatewayClient):
     """Надстройка над GatewayClient.
 
-    Предоставляет доступ к базе данных и настройкам плагинов.
+    Предоставляет доступ к базе данных, настройкам плагинов,
+    получению сущностей Discord и времени выполнения команд.
     """
 
     def __init__(  # noqa: PLR0913
@@ -47,6 +51,20 @@ class ChioClient(arc.GatewayClient):
         self._bot_config = config
         self._config = PluginConfigManager(self)
         self._db = ChioDB(self)
+        self._resolver = EntityResolver(self)
+
+        # Хуки замера добавляются раньше всех остальных хуков
+        self._timings = CommandTimings()
+        self.add_injection_hook(self._timings.injection_hook)
+        self.add_hook(self._timings.pre_hook)
+        self.add_post_hook(self._timings.post_hook)
+        self.add_startup_hook(self._add_ready_hooks)
+
+    async def _add_ready_hooks(self, client: arc.GatewayClient) -> None:
+        # Команды плагинов получают хук при подключении, здесь остаются
+        # команды, добавленные напрямую в клиент
+        count = self._timings.add_ready_hooks(client)
+        logger.debug("Timings ready hook added to {} commands", count)
 
     @property
     def bot_config(self) -> BotConfig:
@@ -63,6 +81,16 @@ class ChioClient(arc.GatewayClient):
         """База данных Chiori."""
         return self._db
 
+    @property
+    def resolver(self) -> EntityResolver:
+        """Получение пользователей, гильдий и каналов Discord."""
+        return self._resolver
+
+    @property
+    def timings(self) -> CommandTimings:
+        """Время выполнения команд."""
+        return self._timings
+
 
 ChioContext = arc.Context[ChioClient]
 """A context using the default chio client implementation."""
@@ -62,6 +62,8 @@ class ChioPlugin(arc.GatewayPluginBase[ChioClient]):
 
     def _client_include_hook(self, client: ChioClient) -> None:
         super()._client_include_hook(client)
+        # Расширения могут перезагружаться уже после запуска клиента
+        client.timings.add_ready_hooks(self)
 
         for table in self._tables:
             client.db.register(table)
@@ -0,0 +1,268 @@
+"""Получение сущностей Discord: пользователей, гильдий и каналов.
+
+Сначала сущность ищется в кеше hikari, затем в собственном кеше.
+Только если сущности нигде нет, она запрашивается через REST.
+Одновременные запросы одной и той же сущности объединяются.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable, Iterable
+from dataclasses import dataclass
+from enum import Enum
+from typing import TYPE_CHECKING, Generic, Literal, TypeVar, cast
+
+import hikari
+from loguru import logger
+
+from chioricord.cache import TTLCache
+
+if TYPE_CHECKING:
+    from chioricord.client import ChioClient
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+__all__ = ("EntityResolver", "ResolveStats", "SingleFlight")
+
+EntityKind = Literal["users", "guilds", "channels"]
+
+# Сколько REST запросов может выполняться одновременно
+_MAX_CONCURRENT = 8
+# Настройки собственного кеша для каждого типа сущностей
+_CACHE_SETTINGS: dict[EntityKind, tuple[int, float]] = {
+    "users": (4096, 600),
+    "guilds": (256, 60),
+    "channels": (1024, 60),
+}
+# Сколько секунд помнить, что сущность не найдена
+_NEGATIVE_TTL = 60
+
+
+class _Missing(Enum):
+    """Отметка в кеше, что сущность не была найдена."""
+
+    MISSING = "missing"
+
+
+@dataclass(slots=True)
+class ResolveStats:
+    """Статистика получения сущностей одного типа.
+
+    - cache_hits: Сколько раз сущность была в кеше hikari.
+    - fallback_hits: Сколько раз сущность была в собственном кеше,
+      в том числе отметка, что сущность не найдена.
+    - misses: Сколько раз сущности не было ни в одном кеше.
+    - rest_calls: Сколько было выполнено REST запросов.
+    - shared: Сколько запросов присоединились к уже выполняемому.
+    - errors: Сколько REST запросов завершились ошибкой.
+    """
+
+    cache_hits: int = 0
+    fallback_hits: int = 0
+    misses: int = 0
+    rest_calls: int = 0
+    shared: int = 0
+    errors: int = 0
+
+    @property
+    def total(self) -> int:
+        """Общее количество обращений."""
+        return self.cache_hits + self.fallback_hits + self.misses
+
+
+class SingleFlight(Generic[_K, _V]):  # noqa: UP046
+    """Объединяет одновременные запросы одного значения.
+
+    Пока запрос по ключу выполняется, остальные вызовы с тем же ключом
+    дожидаются его результата, а не выполняют запрос повторно.
+    """
+
+    __slots__ = ("_calls",)
+
+    def __init__(self) -> None:
+        self._calls: dict[_K, asyncio.Task[_V]] = {}
+
+    def __len__(self) -> int:
+        """Сколько запросов выполняется прямо сейчас."""
+        return len(self._calls)
+
+    def __contains__(self, key: _K) -> bool:
+        """Выполняется ли запрос по ключу."""
+        return key in self._calls
+
+    async def do(self, key: _K, func: Callable[[], Awaitable[_V]]) -> _V:
+        """Выполняет запрос или присоединяется к уже выполняемому."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        # Отмена одного из ожидающих не должна отменять запрос для всех
+        return await asyncio.shield(task)
+
+
+class _Entities(Generic[_V]):  # noqa: UP046
+    """Собственный кеш и объединение запросов для одного типа сущностей."""
+
+    __slots__ = ("cache", "flight", "stats")
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.cache: TTLCache[int, _V | _Missing] = TTLCache(maxsize, ttl)
+        self.flight: SingleFlight[int, _V] = SingleFlight()
+        self.stats = ResolveStats()
+
+
+class EntityResolver:
+    """Получает сущности Discord с наименьшим числом REST запросов.
+
+    Доступен через `ChioClient.resolver`.
+    """
+
+    def __init__(self, client: ChioClient) -> None:
+        self._client = client
+        self._semaphore = asyncio.Semaphore(_MAX_CONCURRENT)
+        self._users: _Entities[hikari.User | None] = _Entities(
+            *_CACHE_SETTINGS["users"]
+        )
+        self._guilds: _Entities[hikari.Guild] = _Entities(
+            *_CACHE_SETTINGS["guilds"]
+        )
+        self._channels: _Entities[hikari.PartialChannel] = _Entities(
+            *_CACHE_SETTINGS["channels"]
+        )
+
+    @property
+    def stats(self) -> dict[EntityKind, ResolveStats]:
+        """Статистика получения сущностей по типам."""
+        return {
+            "users": self._users.stats,
+            "guilds": self._guilds.stats,
+            "channels": self._channels.stats,
+        }
+
+    async def _resolve(
+        self,
+        entities: _Entities[_V],
+        key: int,
+        cached: _V | None,
+        fetch: Callable[[], Awaitable[_V]],
+    ) -> _V:
+        if cached is not None:
+            entities.stats.cache_hits += 1
+            return cached
+
+        value = entities.cache.peek(key)
+        if value is _Missing.MISSING:
+            entities.stats.fallback_hits += 1
+            return cast("_V", None)
+        if value is not None:
+            entities.stats.fallback_hits += 1
+            return value
+
+        entities.stats.misses += 1
+        if key in entities.flight:
+            entities.stats.shared += 1
+
+        async def _fetch() -> _V:
+            entities.stats.rest_calls += 1
+            async with self._semaphore:
+                try:
+                    value = await fetch()
+                except Exception:
+                    entities.stats.errors += 1
+                    raise
+            if value is None:
+                # Отсутствие сущности помнится меньше, чем сама сущность
+                entities.cache.set(key, _Missing.MISSING, _NEGATIVE_TTL)
+            else:
+                entities.cache.set(key, value)
+            return value
+
+        return await entities.flight.do(key, _fetch)
+
+    # Пользователи
+    # ============
+
+    async def _fetch_user(self, user_id: int) -> hikari.User | None:
+        try:
+            return await self._client.rest.fetch_user(user_id)
+        except hikari.NotFoundError:
+            logger.warning("User {} not found", user_id)
+            return None
+
+    async def get_user(self, user_id: int) -> hikari.User | None:
+        """Получает пользователя по ID."""
+        return await self._resolve(
+            self._users,
+            user_id,
+            self._client.cache.get_user(user_id),
+            lambda: self._fetch_user(user_id),
+        )
+
+    async def get_users(
+        self, user_ids: Iterable[int]
+    ) -> dict[int, hikari.User]:
+        """Получает сразу несколько пользователей.
+
+        Недостающие пользователи запрашиваются одновременно.
+        Не найденные пользователи пропускаются.
+        """
+        ids = list(dict.fromkeys(user_ids))
+        users = await asyncio.gather(*(self.get_user(i) for i in ids))
+        return {
+            user_id: user
+            for user_id, user in zip(ids, users, strict=True)
+            if user is not None
+        }
+
+    async def display_names(
+        self, user_ids: Iterable[int], guild_id: int | None = None
+    ) -> dict[int, str]:
+        """Отображаемые имена пользователей.
+
+        Если указана гильдия, то используются имена участников.
+        Для не найденных пользователей возвращается упоминание.
+        """
+        names: dict[int, str] = {}
+        missing: list[int] = []
+        for user_id in dict.fromkeys(user_ids):
+            member = (
+                None
+                if guild_id is None
+                else self._client.cache.get_member(guild_id, user_id)
+            )
+            if member is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = member.display_name
+
+        users = await self.get_users(missing)
+        for user_id in missing:
+            user = users.get(user_id)
+            names[user_id] = (
+                f"<@{user_id}>" if user is None else user.display_name
+            )
+        return names
+
+    # Гильдии и каналы
+    # ================
+
+    async def get_guild(self, guild_id: int) -> hikari.Guild:
+        """Получает гильдию по ID."""
+        return await self._resolve(
+            self._guilds,
+            guild_id,
+            self._client.cache.get_guild(guild_id),
+            lambda: self._client.rest.fetch_guild(guild_id),
+        )
+
+    async def get_channel(self, channel_id: int) -> hikari.PartialChannel:
+        """Получает канал по ID."""
+        return await self._resolve(
+            self._channels,
+            channel_id,
+            self._client.cache.get_guild_channel(channel_id),
+            lambda: self._client.rest.fetch_channel(channel_id),
+        )
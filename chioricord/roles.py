@@ -12,6 +12,7 @@ from asyncpg import Record
 from loguru import logger
 
 from chioricord.api import ChioDB, DBTable
+from chioricord.cache import CacheStats, TTLCache
 from chioricord.events import DBEvent
 
 if TYPE_CHECKING:
@@ -53,12 +54,58 @@ class ChangeRoleEvent(DBEvent):
     new_role: UserRole
 
 
+# Настройки кеша ролей
+# Роли меняются крайне редко, а нужны при выполнении каждой команды
+_CACHE_SIZE = 4096
+_CACHE_TTL = 600
+
+
 class RoleTable(DBTable, table="roles"):
-    """Таблица ролей пользователей."""
+    """Таблица ролей пользователей.
+
+    Все роли, отличные от USER, загружаются в память при запуске.
+    Остальные роли пользователей кешируются в памяти.
+    Оба хранилища обновляются при получении события `ChangeRoleEvent`.
+    """
 
     def __init__(self, db: ChioDB) -> None:
         super().__init__(db)
+        self._cache: TTLCache[int, UserRole] = TTLCache(_CACHE_SIZE, _CACHE_TTL)
+        self._roles: dict[int, UserRole] = {}
+        self._loaded = False
+        # Сколько ролей было получено из памяти после загрузки таблицы
+        self.preload_hits = 0
         self._db.client.add_injection_hook(self.role_injector)
+        self._db.app.event_manager.subscribe(
+            ChangeRoleEvent, self._on_change_role
+        )
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        """Статистика попаданий в кеш ролей.
+
+        Учитывает только обращения до загрузки таблицы.
+        После загрузки роли берутся из памяти и считаются отдельно в
+        `preload_hits`.
+        """
+        return self._cache.stats
+
+    async def _on_change_role(self, event: ChangeRoleEvent) -> None:
+        user = event.new_role
+        self._cache.set(user.user_id, user)
+        if user.role == RoleLevel.USER:
+            self._roles.pop(user.user_id, None)
+        else:
+            self._roles[user.user_id] = user
+
+    def is_banned(self, user_id: int) -> bool:
+        """Проверяет, заблокирован ли пользователь.
+
+        Не обращается к базе данных.
+        Работает только после загрузки таблицы.
+        """
+        user = self._roles.get(user_id)
+        return user is not None and user.role == RoleLevel.BANNED
 
     async def role_injector(
         self, ctx: ChioContext, inj_ctx: arc.InjectorOverridingContext
@@ -70,7 +117,7 @@ class RoleTable(DBTable, table="roles"):
                 ctx.user.id, None, RoleLevel.OWNER, None, "From core config"
             )
         else:
-            user = await self.get_or_create(ctx.user.id)
+            user = await self.get_cached(ctx.user.id)
         logger.debug(user)
         inj_ctx.set_type_dependency(UserRole, user)
 
@@ -85,6 +132,15 @@ class RoleTable(DBTable, table="roles"):
             '"reason"	TEXT)'
         )
 
+    async def load(self) -> None:
+        """Загружает все роли, отличные от USER, в память."""
+        cur = await self.pool.fetch(
+            "SELECT * FROM roles WHERE role<>$1", RoleLevel.USER.value
+        )
+        self._roles = {row[0]: UserRole.from_row(row) for row in cur}
+        self._loaded = True
+        logger.info("Loaded {} user roles", len(self._roles))
+
     async def get_roles(self, role: RoleLevel) -> list[UserRole]:
         """Получает всех заблокированных пользователей."""
         cur = await self.pool.fetch(
@@ -106,36 +162,79 @@ class RoleTable(DBTable, table="roles"):
             return user
         return UserRole(user_id, None, RoleLevel.USER, datetime.now(), None)
 
-    async def _create_user(self, user: UserRole) -> None:
-        """Create a new user record in the database."""
-        await self.pool.execute(
-            f"INSERT INTO {self.__tablename__} VALUES($1,$2,$3,$4,$5)",
-            user.user_id,
-            user.from_id,
-            user.role.value,
-            user.start_time,
-            user.reason,
-        )
+    async def get_cached(self, user_id: int) -> UserRole:
+        """Получает роль пользователя из кеша.
+
+        После загрузки таблицы роль берётся из памяти без обращения к
+        базе данных.
+        До тех пор, если роли нет в кеше, то получает её из базы данных.
+        Отсутствие записи также кешируется как роль по умолчанию.
+        """
+        if self._loaded:
+            self.preload_hits += 1
+            return self._roles.get(user_id) or UserRole(
+                user_id, None, RoleLevel.USER, None, None
+            )
 
-    async def _set_user(self, user: UserRole) -> None:
-        """Update user record in the database."""
-        await self.pool.execute(
-            f"UPDATE {self.__tablename__} SET from_id=$1, start_time=$2, "
-            "role=$3, reason=$4 WHERE user_id=$5",
-            user.from_id,
-            user.start_time,
-            user.role,
-            user.reason,
-            user.user_id,
-        )
+        user = self._cache.get(user_id)
+        if user is None:
+            user = await self.get_or_create(user_id)
+            self._cache.set(user_id, user)
+        return user
+
+    async def _upsert_users(
+        self,
+        user_ids: list[int],
+        from_id: int | None,
+        role: RoleLevel,
+        start_time: datetime,
+        reason: str | None,
+    ) -> list[tuple[int, UserRole | None]]:
+        """Устанавливает роль пользователям в одной транзакции.
+
+        Возвращает ID пользователя и его роль до изменения.
+        Существующие строки блокируются до вставки, потому параллельная
+        смена роли дождётся окончания транзакции и увидит новую роль.
+        Строки новых пользователей блокирует сама вставка.
+        """
+        async with self.pool.acquire() as conn, conn.transaction():
+            old = {
+                row[0]: UserRole.from_row(row)
+                for row in await conn.fetch(
+                    f"SELECT * FROM {self.__tablename__} "
+                    "WHERE user_id = ANY($1::BIGINT[]) "
+                    "ORDER BY user_id FOR UPDATE",
+                    user_ids,
+                )
+            }
+            await conn.execute(
+                f"INSERT INTO {self.__tablename__} "
+                "SELECT u, $2, $3, $4, $5 FROM unnest($1::BIGINT[]) AS u "
+                "ON CONFLICT (user_id) DO UPDATE SET "
+                "from_id=EXCLUDED.from_id, role=EXCLUDED.role, "
+                "start_time=EXCLUDED.start_time, reason=EXCLUDED.reason",
+                user_ids,
+                from_id,
+                role.value,
+                start_time,
+                reason,
+            )
+        return [(user_id, old.get(user_id)) for user_id in user_ids]
 
     # Высокоуровневые функции работы с ролями
     # =======================================
 
     async def remove_role(self, user_id: int) -> None:
         """Remove record from database by ID."""
-        await self.pool.execute(
-            f"DELETE FROM {self.__tablename__} WHERE user_id=$1", user_id
+        cur = await self.pool.fetchrow(
+            f"DELETE FROM {self.__tablename__} WHERE user_id=$1 RETURNING *",
+            user_id,
+        )
+        user = UserRole(user_id, None, RoleLevel.USER, None, None)
+        self._db.app.event_manager.dispatch(
+            ChangeRoleEvent(
+                self._db, None if cur is None else UserRole.from_row(cur), user
+            )
         )
 
     async def set_role(
@@ -145,23 +244,53 @@ class RoleTable(DBTable, table="roles"):
         role: RoleLevel,
         reason: str | None = None,
     ) -> UserRole:
-        """Remove record from database by ID."""
-        now = datetime.now()
-        db_user = await self.get_user(user_id)
-        user = UserRole(user_id, from_id, role, now, reason)
-        if db_user is None:
-            await self._create_user(user)
-        else:
-            await self._set_user(user)
+        """Устанавливает новую роль пользователю.
 
+        Запись создаётся или обновляется в одной транзакции.
+        """
+        user = UserRole(user_id, from_id, role, datetime.now(), reason)
+        res = await self._upsert_users(
+            [user_id], from_id, role, user.start_time, reason
+        )
         self._db.app.event_manager.dispatch(
-            ChangeRoleEvent(self._db, db_user, user)
+            ChangeRoleEvent(self._db, res[0][1], user)
         )
         return user
 
+    async def set_roles(
+        self,
+        user_ids: list[int],
+        from_id: int,
+        role: RoleLevel,
+        reason: str | None = None,
+    ) -> list[UserRole]:
+        """Устанавливает одну роль сразу нескольким пользователям.
+
+        К примеру для массовой блокировки после рейда.
+        Все записи изменяются в одной транзакции.
+        """
+        now = datetime.now()
+        res = await self._upsert_users(
+            list(dict.fromkeys(user_ids)), from_id, role, now, reason
+        )
+        users: list[UserRole] = []
+        for user_id, old_user in res:
+            user = UserRole(user_id, from_id, role, now, reason)
+            self._db.app.event_manager.dispatch(
+                ChangeRoleEvent(self._db, old_user, user)
+            )
+            users.append(user)
+        return users
+
     # Role aliases
     # ============
 
+    async def set_banned_many(
+        self, user_ids: list[int], from_id: int, reason: str | None = None
+    ) -> list[UserRole]:
+        """Устанавливает роль BANNED сразу нескольким пользователям."""
+        return await self.set_roles(user_ids, from_id, RoleLevel.BANNED, reason)
+
     async def set_banned(
         self, user_id: int, from_id: int, reason: str | None = None
     ) -> UserRole:
@@ -0,0 +1,248 @@
+"""Время выполнения команд.
+
+Замеряет, сколько времени уходит на каждую команду: отдельно на
+хуки внедрения зависимостей и на сам обработчик с остальными хуками.
+Замеры собираются в гистограммы, по которым считаются перцентили.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import TYPE_CHECKING, Literal
+
+import hikari
+
+if TYPE_CHECKING:
+    import arc
+
+    from chioricord.client import ChioClient, ChioContext
+
+__all__ = ("CommandStats", "CommandTimings", "Histogram", "Phase")
+
+# Точность гистограммы: сколько корзин на каждую степень двойки
+# 16 корзин дают погрешность не больше 1/16
+_SUB_BITS = 5
+_SUB_HALF = 1 << (_SUB_BITS - 1)
+# Замеры дольше 2^27 мкс (~2 минуты) попадают в последнюю корзину
+_MAX_BITS = 27
+BUCKETS = (_MAX_BITS - _SUB_BITS + 2) * _SUB_HALF
+
+Phase = Literal["inject", "handler", "total"]
+PHASES: tuple[Phase, ...] = ("inject", "handler", "total")
+
+# Сколько незавершённых замеров может храниться одновременно
+_MAX_STARTED = 10_000
+
+
+def _bucket(value: int) -> int:
+    if value < 1 << _SUB_BITS:
+        return max(value, 0)
+    shift = value.bit_length() - _SUB_BITS
+    return min(shift * _SUB_HALF + (value >> shift), BUCKETS - 1)
+
+
+def _bucket_value(index: int) -> int:
+    if index < 1 << _SUB_BITS:
+        return index
+    shift = index // _SUB_HALF - 1
+    lower = (index % _SUB_HALF + _SUB_HALF) << shift
+    return lower + (1 << shift) // 2
+
+
+class Histogram:
+    """Гистограмма времени выполнения в микросекундах.
+
+    Устроена как HDR гистограмма: корзины растут вместе со значением,
+    потому относительная погрешность одинакова для любых замеров.
+    Гистограммы с одинаковым числом корзин можно складывать.
+    """
+
+    __slots__ = ("counts", "count", "max")
+
+    def __init__(self, counts: list[int] | None = None) -> None:
+        self.counts = [0] * BUCKETS if counts is None else counts
+        self.count = sum(self.counts)
+        self.max = 0
+        for i in range(BUCKETS - 1, -1, -1):
+            if self.counts[i]:
+                self.max = _bucket_value(i)
+                break
+
+    def record(self, value: int) -> None:
+        """Добавляет замер в гистограмму."""
+        self.counts[_bucket(value)] += 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other: Histogram) -> None:
+        """Добавляет замеры другой гистограммы."""
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    @classmethod
+    def from_sparse(cls, buckets: list[int], counts: list[int]) -> Histogram:
+        """Собирает гистограмму из непустых корзин."""
+        full = [0] * BUCKETS
+        for bucket, count in zip(buckets, counts, strict=True):
+            full[bucket] += count
+        return cls(full)
+
+    def sparse(self) -> tuple[list[int], list[int]]:
+        """Номера и значения непустых корзин.
+
+        Используется для компактного хранения в базе данных.
+        """
+        buckets = [i for i, count in enumerate(self.counts) if count]
+        return buckets, [self.counts[i] for i in buckets]
+
+    def percentile(self, percent: float) -> int:
+        """Значение, меньше которого указанный процент замеров."""
+        if self.count == 0:
+            return 0
+        target = max(math.ceil(self.count * percent / 100), 1)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(_bucket_value(i), self.max)
+        return self.max
+
+
+@dataclass(slots=True)
+class CommandStats:
+    """Время выполнения одной команды.
+
+    - errors: Сколько раз обработчик команды завершился ошибкой.
+    - phases: Гистограммы по этапам выполнения команды.
+      inject: Хуки внедрения зависимостей.
+      handler: Остальные хуки и обработчик команды.
+      total: Всё выполнение команды.
+    """
+
+    errors: int = 0
+    phases: dict[Phase, Histogram] = field(
+        default_factory=lambda: {phase: Histogram() for phase in PHASES}
+    )
+
+    @property
+    def calls(self) -> int:
+        """Сколько раз была выполнена команда."""
+        return self.phases["total"].count
+
+    def merge(self, other: CommandStats) -> None:
+        """Добавляет замеры другой статистики."""
+        self.errors += other.errors
+        for phase, hist in other.phases.items():
+            self.phases[phase].merge(hist)
+
+
+@dataclass(slots=True)
+class _Started:
+    start: float
+    injected: float | None = None
+    # Все хуки перед обработчиком пройдены
+    ready: bool = False
+
+
+class CommandTimings:
+    """Собирает время выполнения команд.
+
+    Доступен через `ChioClient.timings`.
+    Хуки регистрируются клиентом раньше всех остальных, потому
+    замер начинается до первого хука внедрения зависимостей.
+
+    Команды, которые остановил один из хуков, не учитываются.
+    Для этого `ready_hook` добавляется последним хуком каждой команды:
+    при подключении плагина, в том числе при перезагрузке расширения,
+    и ещё раз при запуске клиента для команд вне плагинов.
+    Хуки останавливают команду исключением, потому до него доходят
+    только команды, дошедшие до обработчика.
+    """
+
+    def __init__(self) -> None:
+        self.stats: dict[str, CommandStats] = {}
+        self._pending: dict[str, CommandStats] = {}
+        self._started: dict[int, _Started] = {}
+
+    def add_ready_hooks(
+        self, source: arc.GatewayClient | arc.GatewayPluginBase[ChioClient]
+    ) -> int:
+        """Добавляет `ready_hook` последним хуком команд клиента или плагина.
+
+        Команды, у которых уже есть хук, пропускаются.
+        Возвращает количество команд, к которым добавлен хук.
+        """
+        count = 0
+        for command in chain(
+            source.walk_commands(hikari.CommandType.SLASH, callable_only=True),
+            source.walk_commands(hikari.CommandType.USER),
+            source.walk_commands(hikari.CommandType.MESSAGE),
+        ):
+            if self.ready_hook not in command.hooks:
+                command.add_hook(self.ready_hook)
+                count += 1
+        return count
+
+    def injection_hook(
+        self, ctx: ChioContext, inj_ctx: arc.InjectorOverridingContext
+    ) -> None:
+        """Начинает замер перед хуками внедрения зависимостей."""
+        # Вытесняются самые старые замеры, команды которых так и не
+        # дошли до конца
+        while len(self._started) >= _MAX_STARTED:
+            del self._started[next(iter(self._started))]
+        self._started[ctx.interaction.id] = _Started(time.perf_counter())
+
+    def pre_hook(self, ctx: ChioContext) -> None:
+        """Отмечает окончание внедрения зависимостей."""
+        started = self._started.get(ctx.interaction.id)
+        if started is not None:
+            started.injected = time.perf_counter()
+
+    def ready_hook(self, ctx: ChioContext) -> None:
+        """Отмечает, что команда дошла до обработчика."""
+        started = self._started.get(ctx.interaction.id)
+        if started is not None:
+            started.ready = True
+
+    def post_hook(self, ctx: ChioContext) -> None:
+        """Завершает замер и добавляет его в статистику команды.
+
+        Замеры остановленных хуками команд отбрасываются.
+        """
+        started = self._started.pop(ctx.interaction.id, None)
+        if started is None or not started.ready:
+            return
+
+        now = time.perf_counter()
+        start = started.start
+        injected = now if started.injected is None else started.injected
+        name = " ".join(ctx.command.qualified_name)
+        for stats in (
+            self.stats.setdefault(name, CommandStats()),
+            self._pending.setdefault(name, CommandStats()),
+        ):
+            stats.phases["inject"].record(int((injected - start) * 1e6))
+            stats.phases["handler"].record(int((now - injected) * 1e6))
+            stats.phases["total"].record(int((now - start) * 1e6))
+            if ctx.has_command_failed:
+                stats.errors += 1
+
+    def take_pending(self) -> dict[str, CommandStats]:
+        """Забирает замеры, накопленные с прошлого вызова.
+
+        Используется для сохранения замеров в базу данных.
+        """
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore_pending(self, pending: dict[str, CommandStats]) -> None:
+        """Возвращает замеры, которые не удалось сохранить."""
+        for name, stats in pending.items():
+            self._pending.setdefault(name, CommandStats()).merge(stats)
@@ -0,0 +1,86 @@
+"""Общие интерактивные компоненты для плагинов."""
+
+from collections.abc import Awaitable, Callable
+from typing import Generic, TypeVar
+
+import hikari
+import miru
+
+from chioricord.api import Leaderboard, LeaderPage
+
+_T = TypeVar("_T")
+
+# Собирает сообщение для страницы таблицы лидеров
+PageRender = Callable[[LeaderPage[_T]], Awaitable[hikari.Embed]]
+
+
+class LeaderboardView(miru.View, Generic[_T]):  # noqa: UP046
+    """Листалка для таблицы лидеров.
+
+    Позволяет переходить на соседние страницы, в начало таблицы и на
+    страницу, где находится пользователь.
+    Каждая страница получается одним запросом по ключу, без `OFFSET`.
+    """
+
+    def __init__(
+        self,
+        board: Leaderboard[_T],
+        render: PageRender[_T],
+        *,
+        timeout: float = 120,
+    ) -> None:
+        super().__init__(timeout=timeout)
+        self.board = board
+        self.render = render
+        self.page: LeaderPage[_T] | None = None
+
+    async def open(self, page: LeaderPage[_T]) -> hikari.Embed:
+        """Переходит на страницу и собирает для неё сообщение."""
+        self.page = page
+        self.first_button.disabled = not page.has_prev
+        self.prev_button.disabled = not page.has_prev
+        self.next_button.disabled = not page.has_next
+        emb = await self.render(page)
+        emb.set_footer(f"Страница {self.board.page_number(page)}")
+        return emb
+
+    async def _switch(
+        self, ctx: miru.ViewContext, page: LeaderPage[_T]
+    ) -> None:
+        emb = await self.open(page)
+        await ctx.edit_response(emb, components=self)
+
+    @miru.button("⏮", style=hikari.ButtonStyle.SECONDARY)
+    async def first_button(
+        self, ctx: miru.ViewContext, button: miru.Button
+    ) -> None:
+        """Первая страница."""
+        await self._switch(ctx, await self.board.first_page())
+
+    @miru.button("◀", style=hikari.ButtonStyle.SECONDARY)
+    async def prev_button(
+        self, ctx: miru.ViewContext, button: miru.Button
+    ) -> None:
+        """Предыдущая страница."""
+        if self.page is not None:
+            await self._switch(ctx, await self.board.prev_page(self.page))
+
+    @miru.button("▶", style=hikari.ButtonStyle.SECONDARY)
+    async def next_button(
+        self, ctx: miru.ViewContext, button: miru.Button
+    ) -> None:
+        """Следующая страница."""
+        if self.page is not None:
+            await self._switch(ctx, await self.board.next_page(self.page))
+
+    @miru.button("📍", style=hikari.ButtonStyle.PRIMARY)
+    async def me_button(
+        self, ctx: miru.ViewContext, button: miru.Button
+    ) -> None:
+        """Страница, на которой находится нажавший пользователь."""
+        await self._switch(ctx, await self.board.user_page(ctx.user.id))
+
+    async def on_timeout(self) -> None:
+        """Убирает кнопки по истечению времени."""
+        if self.message is not None:
+            await self.message.edit(components=None)
@@ -13,18 +13,27 @@
 
     В ином случае вам самостоятельно придётся её подключать.
 
-Version: v2.1.1 (20)
+Version: v2.5 (24)
 Author: Milinuri Nirvalen
 """
 
 import arc
 import hikari
+import miru
+from loguru import logger
 
+from chioricord.api import LeaderPage
 from chioricord.client import ChioClient, ChioContext
 from chioricord.hooks import has_role
 from chioricord.plugin import ChioPlugin
-from chioricord.roles import RoleLevel
-from libs.coinengine import CoinsTable
+from chioricord.roles import RoleLevel, UserRole
+from chioricord.views import LeaderboardView
+from libs.coinengine import (
+    DEPOSIT_PERCENT,
+    CoinsTable,
+    LedgerEntry,
+    UserCoins,
+)
 
 plugin = ChioPlugin("Coins")
 
@@ -126,6 +135,87 @@ async def coin_take_handler(
     await ctx.respond(emb)
 
 
+@coin_group.include
+@arc.with_hook(has_role(RoleLevel.MODERATOR))
+@arc.slash_subcommand("interest", description="Начисление процентов.")
+async def coin_interest_handler(
+    ctx: ChioContext, coins: CoinsTable = arc.inject()
+) -> None:
+    """Информация о последнем начислении процентов по депозитам.
+
+    Проценты начисляются автоматически раз в день.
+    Показывает за сколько дней, скольким пользователям и как быстро
+    были начислены проценты.
+    """
+    run = coins.last_interest
+    if run is None:
+        await ctx.respond("Проценты ещё не начислялись с момента запуска.")
+        return
+
+    emb = hikari.Embed(
+        title="🏦 Начисление процентов",
+        description=(
+            f"Ставка: `{DEPOSIT_PERCENT * 100}%` в день\n"
+            f"Начислено по: `{run.last_run}`\n"
+            f"Дней: `{run.days}`\n"
+            f"Депозитов: `{run.rows}`\n"
+            f"Время выполнения: `{round(run.duration, 2)}` мс."
+        ),
+        color=_COLOR_MAIN,
+    )
+    await ctx.respond(emb)
+
+
+_LEDGER_OPS = {
+    "give": "Выдача",
+    "take": "Списание",
+    "move": "Перевод",
+    "deposit": "В банк",
+    "withdraw": "Из банка",
+    "interest": "Проценты",
+    "market": "Торговая площадка",
+}
+
+
+def _ledger_entry(entry: LedgerEntry) -> str:
+    time = entry.created_at.strftime("%d/%m/%Y %H:%M")
+    other = f" <@{entry.other_id}>" if entry.other_id is not None else ""
+    return f"`{time}` {_LEDGER_OPS[entry.op]}: **{entry.amount:+}**{other}"
+
+
+@coin_group.include
+@arc.slash_subcommand("history", description="История операций с монетами.")
+async def coin_history_handler(
+    ctx: ChioContext,
+    user: arc.Option[  # type: ignore
+        hikari.User | None, arc.UserParams("Чью историю посмотреть (свою)")
+    ] = None,
+    coins: CoinsTable = arc.inject(),
+    my_role: UserRole = arc.inject(),
+) -> None:
+    """Последние операции с монетами пользователя.
+
+    Просматривать чужую историю могут только модераторы.
+    """
+    user = user or ctx.user
+    if user.id != ctx.user.id and my_role.role < RoleLevel.MODERATOR:
+        await ctx.respond(
+            "🔒 Вы можете просматривать только свою историю.",
+            flags=hikari.MessageFlag.EPHEMERAL,
+        )
+        return
+
+    history = await coins.get_history(user.id)
+    emb = hikari.Embed(
+        title="📜 История операций",
+        description="\n".join(_ledger_entry(e) for e in history)
+        or "Операций пока не было.",
+        color=_COLOR_MAIN,
+    )
+    emb.set_thumbnail(user.make_avatar_url())
+    await ctx.respond(emb)
+
+
 # Управление накоплениями
 # =======================
 
@@ -294,6 +384,7 @@ async def rich_handler(
         ),
     ] = "amount+deposit",
     coins: CoinsTable = arc.inject(),
+    client: miru.Client = arc.inject(),
 ) -> None:
     """Таблица лидеров самых богатых участников сервера."""
     # guild = ctx.get_guild()
@@ -310,38 +401,77 @@ async def rich_handler(
         header = "Общее"
         color = hikari.Color(0x66CCFF)
 
-    leaders = await coins.get_leaders(group)  # type: ignore
-    leaderboard: list[str] = []
-    for i, user_coins in enumerate(leaders):
-        user = ctx.client.cache.get_user(
-            user_coins.user_id
-        ) or await ctx.client.rest.fetch_user(user_coins.user_id)
-
-        pos = _pretty_pos(i + 1)
-        nickname = user.display_name or user.global_name
-        leaderboard.append(
-            f"{pos}. {nickname}: {user_coins.amount} ({user_coins.deposit})"
-        )
-
-    emb = hikari.Embed(
-        title=f"🚀 Богачи / {header}",
-        description="\n".join(leaderboard),
-        color=color,
-    )
-    pos = await coins.get_position(ctx.user.id)
+    board = coins.leaderboard(group)  # type: ignore
+    my_pos = await board.rank(ctx.user.id)
     my_coins = await coins.get_or_create(ctx.user.id)
-    if pos is not None:
-        nick = ctx.user.display_name or ctx.user.global_name
-        emb.add_field(
-            "Ваше место", f"{_pretty_pos(pos)}. {nick}: {my_coins.deposit}"
+
+    async def render(page: LeaderPage[UserCoins]) -> hikari.Embed:
+        names = await ctx.client.resolver.display_names(
+            (user_coins.user_id for user_coins in page.items), ctx.guild_id
         )
-    await ctx.respond(emb)
+        leaderboard: list[str] = []
+        for i, user_coins in page.positions():
+            pos = _pretty_pos(i)
+            nickname = names[user_coins.user_id]
+            leaderboard.append(
+                f"{pos}. {nickname}: {user_coins.amount} ({user_coins.deposit})"
+            )
+
+        emb = hikari.Embed(
+            title=f"🚀 Богачи / {header}",
+            description="\n".join(leaderboard),
+            color=color,
+        )
+        if my_pos is not None:
+            nick = ctx.user.display_name or ctx.user.global_name
+            emb.add_field(
+                "Ваше место",
+                f"{_pretty_pos(my_pos)}. {nick}: "
+                f"{my_coins.amount} ({my_coins.deposit})",
+            )
+        return emb
+
+    view = LeaderboardView(board, render)
+    await ctx.respond(
+        await view.open(await board.first_page()), components=view
+    )
+    client.start_view(view)
 
 
 # Загрузчики и выгрузчики плагина
 # ===============================
 
 
+@arc.utils.interval_loop(hours=1)
+async def interest_loop() -> None:
+    """Начисляет проценты по депозитам.
+
+    Проверка выполняется каждый час, но сами проценты начисляются
+    только когда с последнего начисления прошли сутки.
+    """
+    coins = plugin.client.get_type_dependency(CoinsTable)
+    run = await coins.accrue_interest()
+    if run.days > 0:
+        logger.info(
+            "Accrued {} days interest for {} deposits in {} ms",
+            run.days,
+            run.rows,
+            round(run.duration, 2),
+        )
+
+
+@plugin.listen(arc.StartedEvent)
+async def on_start(event: arc.StartedEvent[ChioClient]) -> None:
+    """Запускаем начисление процентов по депозитам."""
+    interest_loop.start()
+
+
+@plugin.listen(arc.StoppingEvent)
+async def on_stop(event: arc.StoppingEvent[ChioClient]) -> None:
+    """Останавливаем начисление процентов по депозитам."""
+    interest_loop.cancel()
+
+
 @arc.loader
 def loader(client: ChioClient) -> None:
     """Действия при загрузке плагина.
@@ -0,0 +1,256 @@
+"""Торговая площадка.
+
+Позволяет участникам покупать и продавать друг другу предметы из
+инвентаря за монеты.
+Не нужно договариваться с продавцом: достаточно выставить заявку, и
+она исполнится как только найдётся подходящая встречная заявка.
+
+.. note:: Требует расширения монет и инвентаря.
+
+    Торговая площадка работает с таблицами `coins` и `inventory`.
+
+Version: v1.0.2 (3)
+Author: Milinuri Nirvalen
+"""
+
+import arc
+import hikari
+
+from chioricord.client import ChioClient, ChioContext
+from chioricord.hooks import has_role
+from chioricord.plugin import ChioPlugin
+from chioricord.roles import RoleLevel
+from libs.inventory import ItemIndex
+from libs.market import MarketTable
+from libs.orderbook import Order, Side, Trade
+
+plugin = ChioPlugin("Market")
+
+_COLOR_MAIN = hikari.Color(0xFFCC66)
+# Ограничение цены, чтобы стоимость заявки помещалась в INTEGER
+_MAX_PRICE = 1_000_000
+_MAX_AMOUNT = 1000
+
+_SIDE_NAMES: dict[Side, str] = {"buy": "Покупка", "sell": "Продажа"}
+_BOOK_SIDES: tuple[tuple[Side, str], ...] = (
+    ("sell", "Продают"),
+    ("buy", "Покупают"),
+)
+
+
+def _order_status(order: Order) -> str:
+    return (
+        f"`#{order.order_id}` {_SIDE_NAMES[order.side]} `{order.item_id}`: "
+        f"{order.amount} шт. по {order.price} монет"
+    )
+
+
+def _trades_status(trades: list[Trade]) -> str:
+    if not trades:
+        return "Пока подходящих встречных заявок нет."
+    amount = sum(t.amount for t in trades)
+    total = sum(t.total for t in trades)
+    return f"Исполнено сразу: {amount} шт. на {total} монет."
+
+
+market_group = plugin.include_slash_group(
+    name="market", description="Торговая площадка предметов."
+)
+
+
+async def _place(  # noqa: PLR0913
+    ctx: ChioContext,
+    *,
+    market: MarketTable,
+    index: ItemIndex,
+    side: Side,
+    item_id: int,
+    amount: int,
+    price: int,
+) -> None:
+    item = await index.get(item_id)
+    if item is None:
+        await ctx.respond("👀 Предмета с таким ID не существует")
+        return
+
+    res = await market.place(ctx.user.id, item_id, side, price, amount)
+    if res is None:
+        await ctx.respond(
+            "🗑️ Недостаточно "
+            + ("предметов в инвентаре." if side == "sell" else "монет.")
+        )
+        return
+
+    order, trades = res
+    emb = hikari.Embed(
+        title=f"📈 Заявка выставлена: {item.name}",
+        description=f"{_order_status(order)}\n{_trades_status(trades)}",
+        color=_COLOR_MAIN,
+    )
+    await ctx.respond(emb)
+
+
+@market_group.include
+@arc.slash_subcommand("sell", description="Продать предметы.")
+async def market_sell_handler(  # noqa: PLR0913, PLR0917
+    ctx: ChioContext,
+    item_id: arc.Option[int, arc.IntParams("ID предмета")],  # type: ignore
+    amount: arc.Option[  # type: ignore
+        int, arc.IntParams("Сколько продать", min=1, max=_MAX_AMOUNT)
+    ],
+    price: arc.Option[  # type: ignore
+        int, arc.IntParams("Цена за штуку", min=1, max=_MAX_PRICE)
+    ],
+    market: MarketTable = arc.inject(),
+    index: ItemIndex = arc.inject(),
+) -> None:
+    """Выставляет предметы на продажу.
+
+    Предметы сразу убираются из инвентаря.
+    Если заявку снять, непроданные предметы вернутся обратно.
+    """
+    await _place(
+        ctx,
+        market=market,
+        index=index,
+        side="sell",
+        item_id=item_id,
+        amount=amount,
+        price=price,
+    )
+
+
+@market_group.include
+@arc.slash_subcommand("buy", description="Купить предметы.")
+async def market_buy_handler(  # noqa: PLR0913, PLR0917
+    ctx: ChioContext,
+    item_id: arc.Option[int, arc.IntParams("ID предмета")],  # type: ignore
+    amount: arc.Option[  # type: ignore
+        int, arc.IntParams("Сколько купить", min=1, max=_MAX_AMOUNT)
+    ],
+    price: arc.Option[  # type: ignore
+        int, arc.IntParams("Наибольшая цена за штуку", min=1, max=_MAX_PRICE)
+    ],
+    market: MarketTable = arc.inject(),
+    index: ItemIndex = arc.inject(),
+) -> None:
+    """Выставляет заявку на покупку.
+
+    Монеты за все предметы сразу списываются с баланса.
+    Если предметы купятся дешевле, разница вернётся на баланс.
+    """
+    await _place(
+        ctx,
+        market=market,
+        index=index,
+        side="buy",
+        item_id=item_id,
+        amount=amount,
+        price=price,
+    )
+
+
+@market_group.include
+@arc.slash_subcommand("book", description="Заявки на предмет.")
+async def market_book_handler(
+    ctx: ChioContext,
+    item_id: arc.Option[int, arc.IntParams("ID предмета")],  # type: ignore
+    market: MarketTable = arc.inject(),
+    index: ItemIndex = arc.inject(),
+) -> None:
+    """Лучшие цены покупки и продажи предмета."""
+    item = await index.get(item_id)
+    if item is None:
+        await ctx.respond("👀 Предмета с таким ID не существует")
+        return
+
+    book = market.engine.book(item_id)
+    emb = hikari.Embed(title=f"📊 Стакан: {item.name}", color=_COLOR_MAIN)
+    for side, title in _BOOK_SIDES:
+        levels = book.depth(side)
+        emb.add_field(
+            title,
+            "\n".join(
+                f"{lvl.price} монет: {lvl.amount} шт. ({lvl.orders})"
+                for lvl in levels
+            )
+            or "Заявок нет.",
+            inline=True,
+        )
+    await ctx.respond(emb)
+
+
+@market_group.include
+@arc.slash_subcommand("orders", description="Ваши заявки.")
+async def market_orders_handler(
+    ctx: ChioContext, market: MarketTable = arc.inject()
+) -> None:
+    """Активные заявки пользователя."""
+    orders = market.user_orders(ctx.user.id)
+    emb = hikari.Embed(
+        title="📋 Ваши заявки",
+        description="\n".join(_order_status(o) for o in orders)
+        or "У вас нет активных заявок.",
+        color=_COLOR_MAIN,
+    )
+    await ctx.respond(emb)
+
+
+@market_group.include
+@arc.slash_subcommand("cancel", description="Снять заявку.")
+async def market_cancel_handler(
+    ctx: ChioContext,
+    order_id: arc.Option[int, arc.IntParams("ID заявки")],  # type: ignore
+    market: MarketTable = arc.inject(),
+) -> None:
+    """Снимает заявку и возвращает неисполненный остаток."""
+    order = await market.cancel(ctx.user.id, order_id)
+    if order is None:
+        await ctx.respond("👀 У вас нет такой заявки.")
+        return
+    await ctx.respond(f"✅ Заявка снята, возвращено: {_order_status(order)}")
+
+
+@market_group.include
+@arc.with_hook(has_role(RoleLevel.ADMINISTRATOR))
+@arc.slash_subcommand("stats", description="Статистика торговой площадки.")
+async def market_stats_handler(
+    ctx: ChioContext, market: MarketTable = arc.inject()
+) -> None:
+    """Скорость сопоставления заявок и сохранения сделок."""
+    match = market.match_stats
+    settle = market.settle_stats
+    emb = hikari.Embed(title="Торговая площадка", color=_COLOR_MAIN)
+    emb.add_field(
+        "Сопоставление",
+        (
+            f"Заявок: `{match.orders}`\n"
+            f"Сделок: `{match.trades}`\n"
+            f"Предметов: `{match.items}`\n"
+            f"Заявок в секунду: `{round(match.orders_per_second)}`\n"
+            f"В стаканах: `{len(market.engine)}`"
+        ),
+        inline=True,
+    )
+    emb.add_field(
+        "Сохранение",
+        (
+            f"Пачек: `{settle.batches}`\n"
+            f"Сделок: `{settle.trades}`\n"
+            f"Время: `{round(settle.duration * 1000, 2)}` мс.\n"
+            f"Ошибок: `{settle.errors}`\n"
+            f"Отброшено сделок: `{settle.dropped}`"
+        ),
+        inline=True,
+    )
+    await ctx.respond(emb)
+
+
+@arc.loader
+def loader(client: ChioClient) -> None:
+    """Действия при загрузке плагина.
+
+    Подключаем базу данных торговой площадки.
+    """
+    plugin.add_table(MarketTable)
+    client.add_plugin(plugin)
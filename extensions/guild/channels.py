@@ -2,7 +2,7 @@
 
 позволяет просматривать/изменять/удалять каналы для сервера.
 
-Version: v1.0 (1)
+Version: v1.0.1 (2)
 Author: Milinuri Nirvalen
 """
 
@@ -23,12 +23,10 @@ channels_group = plugin.include_slash_group(
 
 
 async def _get_chan(
-    client: arc.GatewayClient, channel_id: hikari.Snowflakeish
+    client: ChioClient, channel_id: hikari.Snowflakeish
 ) -> hikari.TextableGuildChannel:
     """Возвращает канал по его ID."""
-    chan = client.cache.get_guild_channel(
-        channel_id
-    ) or await client.rest.fetch_channel(channel_id)
+    chan = await client.resolver.get_channel(int(channel_id))
     if not isinstance(chan, hikari.TextableGuildChannel):
         raise ValueError("Channel is not guild textable channel")
     return chan
@@ -5,7 +5,7 @@ Lingua — это помощник, который помогает вам с р
 Он всегда готов ответить на ваши вопросы и сделать общение
 персонализированным и приятным.
 
-Version: v0.13.3 (15)
+Version: v0.13.5 (17)
 Author: Milinuri Nirvalen
 """
 
@@ -77,22 +77,6 @@ class LinguaConfig(PluginConfig, config="lingua"):
 # ======================
 
 
-async def _get_channel(
-    client: ChioClient, channel_id: int
-) -> hikari.PartialChannel:
-    channel = client.cache.get_guild_channel(channel_id)
-    if channel is not None:
-        return channel
-    return await client.rest.fetch_channel(channel_id)
-
-
-async def _get_guild(client: ChioClient, guild_id: int) -> hikari.Guild:
-    guild = client.cache.get_guild(guild_id)
-    if guild is not None:
-        return guild
-    return await client.rest.fetch_guild(guild_id)
-
-
 @dataclass(slots=True, frozen=True)
 class ChatContext:
     user: hikari.User
@@ -109,8 +93,8 @@ class ChatContext:
     ) -> Self:
         return cls(
             event.author,
-            await _get_channel(client, event.channel_id),
-            await _get_guild(client, event.message.guild_id)
+            await client.resolver.get_channel(event.channel_id),
+            await client.resolver.get_guild(event.message.guild_id)
             if event.message.guild_id is not None
             else None,
         )
@@ -268,17 +252,11 @@ async def on_message(
     if me is None:
         raise ValueError("OwnUser can`t be None")
 
-    if event.message.guild_id is None:
-        chat = None
-    else:
-        chat = await table.get_or_create(event.message.guild_id)
-
+    # Канал чата берётся из памяти, чтобы не обращаться к базе данных
+    # ради каждого сообщения на сервере
     if (
-        chat is None
-        or (
-            chat.chat_channel is not None
-            and event.channel_id == chat.chat_channel
-        )
+        event.message.guild_id is None
+        or table.is_chat(event.message.guild_id, event.channel_id)
         or (
             event.message.referenced_message is not None
             and event.message.referenced_message.author
@@ -34,7 +34,7 @@
 - @MemberDeleteEvent
 - @voiceStateUpdateEvent
 
-Version: v1.2.2 (22)
+Version: v1.2.3 (23)
 Author: Milinuri Nirvalen
 """
 
@@ -103,9 +103,7 @@ def _get_channel(channel_id: int) -> str:
 
 
 async def _get_guild(guild_id: int) -> hikari.Guild:
-    return plugin.client.cache.get_guild(
-        guild_id
-    ) or await plugin.client.rest.fetch_guild(guild_id)
+    return await plugin.client.resolver.get_guild(guild_id)
 
 
 # Отслеживание каналов
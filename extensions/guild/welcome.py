@@ -4,7 +4,7 @@
 Приветствует новых участников на сервере.
 Автоматическая выдача роли для сервера.
 
-Version: v1.2 (8)
+Version: v1.2.1 (9)
 Author: Milinuri Nirvalen
 """
 
@@ -71,9 +71,7 @@ async def on_chio_join(event: hikari.GuildJoinEvent) -> None:
     emb.set_thumbnail("https://chio.miroq.ru/images/chio.png")
     emb.add_field("Первые шаги", _FIRST_STEPS)
 
-    guild = event.get_guild() or await event.app.rest.fetch_guild(
-        event.guild_id
-    )
+    guild = await plugin.client.resolver.get_guild(event.guild_id)
     channel = guild.system_channel_id
     if channel is not None:
         await event.app.rest.create_message(channel, emb)
@@ -102,9 +100,7 @@ async def on_member_join(
     emb.set_footer(
         text="С любовью команда Salormoon", icon="https://miroq.ru/ava.jpg"
     )
-    guild = event.member.get_guild() or await event.app.rest.fetch_guild(
-        event.member.guild_id
-    )
+    guild = await plugin.client.resolver.get_guild(event.member.guild_id)
     channel = guild.system_channel_id
     if channel is not None:
         await event.app.rest.create_message(channel, emb)
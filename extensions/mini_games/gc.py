@@ -1,11 +1,17 @@
 """Сборщик мусора.
 
 Первая игра, использующая библиотеку инвентаря.
+После похода нужно немного отдохнуть, прежде чем идти снова.
 
-Version: v0.0.4 (11)
+.. note:: Требует расширения таймеров.
+
+    Перезарядка похода хранится в таблице `timers`.
+
+Version: v0.0.6 (13)
 Author: Milinuri Nirvalen
 """
 
+from datetime import datetime, timedelta
 from random import randint
 from typing import NamedTuple
 
@@ -16,10 +22,13 @@ import miru
 from chioricord.client import ChioClient, ChioContext
 from chioricord.plugin import ChioPlugin
 from libs.inventory import Inventory, InventoryItem, ItemIndex
+from libs.timer import TimersTable
 
 plugin = ChioPlugin("Gc")
 
 _MAX_ENERGY = 5
+_TIMER_NAME = "gc"
+_COOLDOWN = timedelta(minutes=20)
 
 
 class RareInfo(NamedTuple):
@@ -155,13 +164,13 @@ class GCView(miru.View):
         """проверяет игру на завершение."""
         game_over_flag = self._energy <= 0
         if game_over_flag:
-            for item in self._collected_items:
-                await self._inventory.give(
-                    user_id=self._user.id,
-                    item_id=item.index.item_id,
-                    amount=item.amount,
-                )
-            await self._inventory.commit()
+            await self._inventory.give_many(
+                self._user.id,
+                (
+                    (item.index.item_id, item.amount)
+                    for item in self._collected_items
+                ),
+            )
         return game_over_flag
 
     def collected_items_status(self) -> str:
@@ -228,9 +237,24 @@ async def collect_garbage(
     ctx: ChioContext,
     index: ItemIndex = arc.inject(),
     inventory: Inventory = arc.inject(),
+    timers: TimersTable = arc.inject(),
     client: miru.Client = arc.inject(),
 ) -> None:
-    """Начинает новых поход на свалку."""
+    """Начинает новых поход на свалку.
+
+    Новый поход можно начать только после перезарядки.
+    """
+    timer = await timers.get(ctx.user.id, _TIMER_NAME)
+    if timer is not None:
+        left = int((timer.reset_time - datetime.now()).total_seconds())
+        await ctx.respond(
+            f"🗑️ Вы ещё не отдохнули после похода, подождите {left // 60} "
+            f"мин. {left % 60} сек.",
+            flags=hikari.MessageFlag.EPHEMERAL,
+        )
+        return
+
+    await timers.start(ctx.user.id, _TIMER_NAME, _COOLDOWN)
     view = GCView(ctx.user, _MAX_ENERGY, index, inventory)
     await ctx.respond(view.game_status(), components=view)
     client.start_view(view)
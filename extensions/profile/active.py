@@ -5,17 +5,28 @@
 Отслеживает активность в текстовых каналах.
 Для отслеживания голосовых каналов, есть отдельное расширение.
 
-Version: v1.10 (27)
+Version: v1.16 (33)
 Author: Milinuri Nirvalen
 """
 
 import arc
 import hikari
+import miru
 
-from chioricord.api import PluginConfig
+from chioricord.api import LeaderPage, PluginConfig
 from chioricord.client import ChioClient, ChioContext
+from chioricord.hooks import has_role
 from chioricord.plugin import ChioPlugin
-from libs.active_levels import ActiveTable, LevelUpEvent, UserActive
+from chioricord.roles import RoleLevel, RoleTable
+from chioricord.views import LeaderboardView
+from libs.active_levels import (
+    ActivePositions,
+    ActiveTable,
+    LevelUpEvent,
+    Period,
+    PeriodActive,
+    UserActive,
+)
 
 plugin = ChioPlugin("Active levels")
 
@@ -51,6 +62,17 @@ def _pretty_pos(pos: int | None) -> str:
     return str(pos)
 
 
+def _pretty_positions(positions: ActivePositions | None) -> list[str]:
+    if positions is None:
+        return ["0"] * 4
+    return [
+        _pretty_pos(positions.level),
+        _pretty_pos(positions.words),
+        _pretty_pos(positions.voice),
+        _pretty_pos(positions.bumps),
+    ]
+
+
 def _get_points(active: UserActive, group: str) -> str:
     if group == "level":
         target_xp = active.count_xp()
@@ -62,6 +84,19 @@ def _get_points(active: UserActive, group: str) -> str:
     return f"`{active.words}` слов / `{active.messages}` сообщений"
 
 
+def _get_period_points(active: PeriodActive, group: str) -> str:
+    if group == "level":
+        return f"`{active.xp}` опыта"
+    if group == "voice":
+        return f"`{format_duration(active.voice)}`"
+    if group == "bumps":
+        return f"`{active.bumps}` бампов"
+    return f"`{active.words}` слов / `{active.messages}` сообщений"
+
+
+_PERIOD_HEADERS = {"day": "за день", "week": "за неделю", "month": "за месяц"}
+
+
 # Отслеживание событий
 # ====================
 
@@ -69,10 +104,12 @@ def _get_points(active: UserActive, group: str) -> str:
 @plugin.listen(hikari.GuildMessageCreateEvent)
 @plugin.inject_dependencies()
 async def on_message(
-    event: hikari.GuildMessageCreateEvent, active: ActiveTable = arc.inject()
+    event: hikari.GuildMessageCreateEvent,
+    active: ActiveTable = arc.inject(),
+    roles: RoleTable = arc.inject(),
 ) -> None:
     """Добавляем опыт за текстовые сообщения."""
-    if event.author.is_bot:
+    if event.author.is_bot or roles.is_banned(event.author_id):
         return
 
     xp = len(event.message.attachments) * 5
@@ -91,14 +128,13 @@ async def on_level_up(
     at: ActiveTable = arc.inject(),
 ) -> None:
     """Когда пользователь повышает свой уровень."""
-    user = event.client.cache.get_user(
-        event.user_id
-    ) or await event.client.rest.fetch_user(event.user_id)
+    user = await event.client.resolver.get_user(event.user_id)
+    if user is None:
+        return
 
-    level_pos = _pretty_pos(await at.get_position("level", event.user_id))
-    words_pos = _pretty_pos(await at.get_position("words", event.user_id))
-    voice_pos = _pretty_pos(await at.get_position("voice", event.user_id))
-    bumps_pos = _pretty_pos(await at.get_position("bumps", event.user_id))
+    level_pos, words_pos, voice_pos, bumps_pos = _pretty_positions(
+        await at.get_positions(event.user_id)
+    )
 
     emb = hikari.Embed(
         title="Повышение уровня 🎉",
@@ -146,10 +182,19 @@ async def message_top(
             choices=["words", "level", "voice", "bumps"],
         ),
     ] = "level",
+    period: arc.Option[  # type: ignore
+        str,
+        arc.StrParams(
+            "За какой период.", choices=["all", "day", "week", "month"]
+        ),
+    ] = "all",
     at: ActiveTable = arc.inject(),
+    client: miru.Client = arc.inject(),
 ) -> None:
     """Таблица лидеров по сообщениям."""
-    leaders = await at.get_top(group)
+    if period != "all":
+        await _period_top(ctx, at, period, group)  # type: ignore
+        return
 
     header = "словам"
     if group == "level":
@@ -159,28 +204,61 @@ async def message_top(
     elif group == "bumps":
         header = "Бампам"
 
+    board = at.leaderboard(group)
+    my_pos = _pretty_pos(await board.rank(ctx.user.id))
+    my_active = await at.get_or_default(ctx.user.id)
+    my_points = _get_points(my_active, group)
+
+    async def render(page: LeaderPage[UserActive]) -> hikari.Embed:
+        names = await ctx.client.resolver.display_names(
+            (active.user_id for active in page.items), ctx.guild_id
+        )
+        leaderboard = ""
+        for pos, active in page.positions():
+            points = _get_points(active, group)
+            leaderboard += (
+                f"\n{_pretty_pos(pos)}: **{names[active.user_id]}**: {points}"
+            )
+
+        emb = hikari.Embed(
+            title=f"Таблица лидеров по {header}",
+            description=leaderboard,
+            color=hikari.Color(0xFFCC99),
+        )
+        emb.add_field(
+            "Моя позиция", f"{my_pos}: {ctx.user.display_name} {my_points}"
+        )
+        return emb
+
+    view = LeaderboardView(board, render)
+    await ctx.respond(
+        await view.open(await board.first_page()), components=view
+    )
+    client.start_view(view)
+
+
+async def _period_top(
+    ctx: ChioContext, at: ActiveTable, period: Period, group: str
+) -> None:
+    leaders = await at.get_period_top(period, group)
+    names = await ctx.client.resolver.display_names(
+        (active.user_id for active in leaders), ctx.guild_id
+    )
     leaderboard = ""
     for i, active in enumerate(leaders):
-        user = ctx.client.cache.get_user(active.user_id)
-        if user is not None:
-            name = user.display_name
-        else:
-            user = await ctx.client.rest.fetch_user(active.user_id)
-            name = user.display_name
-
-        points = _get_points(active, group)
-        leaderboard += f"\n{_pretty_pos(i + 1)}: **{name}**: {points}"
+        points = _get_period_points(active, group)
+        leaderboard += (
+            f"\n{_pretty_pos(i + 1)}: **{names[active.user_id]}**: {points}"
+        )
 
     emb = hikari.Embed(
-        title=f"Таблица лидеров по {header}",
-        description=leaderboard,
+        title=f"Самые активные {_PERIOD_HEADERS[period]}",
+        description=leaderboard or "Пока никого нет.",
         color=hikari.Color(0xFFCC99),
     )
-
-    my_pos = _pretty_pos(await at.get_position(group, ctx.user.id))
-    my_active = await at.get_or_default(ctx.user.id)
-    points = _get_points(my_active, group)
-    emb.add_field("Моя позиция", f"{my_pos}: {ctx.user.display_name} {points}")
+    my_active = await at.get_period_user(period, ctx.user.id)
+    points = _get_period_points(my_active, group)
+    emb.add_field("Моя активность", f"{ctx.user.display_name} {points}")
     await ctx.respond(emb)
 
 
@@ -214,10 +292,9 @@ async def user_active(
     emb.add_field("Опыт", f"{active.xp}/{target_xp} ({pr}%)")
     emb.set_thumbnail(user.make_avatar_url(file_format="PNG"))
 
-    level_pos = _pretty_pos(await at.get_position("level", user.id))
-    words_pos = _pretty_pos(await at.get_position("words", user.id))
-    voice_pos = _pretty_pos(await at.get_position("voice", user.id))
-    bumps_pos = _pretty_pos(await at.get_position("bumps", user.id))
+    level_pos, words_pos, voice_pos, bumps_pos = _pretty_positions(
+        await at.get_positions(user.id)
+    )
 
     emb.add_field(
         "Место в рейтинге",
@@ -232,6 +309,22 @@ async def user_active(
     await ctx.respond(emb)
 
 
+@plugin.include
+@arc.with_hook(has_role(RoleLevel.ADMINISTRATOR))
+@arc.slash_command(
+    "recount_levels", description="Пересчитать уровни всех участников."
+)
+async def recount_levels_handler(
+    ctx: ChioContext, at: ActiveTable = arc.inject()
+) -> None:
+    """Пересчитывает уровни из всего накопленного опыта.
+
+    Нужно после изменения формулы уровней.
+    """
+    count = await at.recount_levels()
+    await ctx.respond(f"✅ Уровни пересчитаны, изменено записей: {count}")
+
+
 @arc.loader
 def loader(client: ChioClient) -> None:
     """Действия при загрузке плагина."""
@@ -0,0 +1,58 @@
+"""Таймеры пользователя.
+
+Подключает общую таблицу таймеров, через которую другие расширения
+ограничивают повторное использование команд.
+Позволяет посмотреть, когда закончатся ваши таймеры.
+
+Version: v1.0 (1)
+Author: Milinuri Nirvalen
+"""
+
+from datetime import datetime
+
+import arc
+import hikari
+
+from chioricord.client import ChioClient, ChioContext
+from chioricord.plugin import ChioPlugin
+from libs.timer import TimersTable
+
+plugin = ChioPlugin("Timers")
+
+
+def _format_left(reset_time: datetime, now: datetime) -> str:
+    minutes, seconds = divmod(int((reset_time - now).total_seconds()), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+@plugin.include
+@arc.slash_command("timers", description="Ваши активные таймеры.")
+async def timers_handler(
+    ctx: ChioContext, timers: TimersTable = arc.inject()
+) -> None:
+    """Сколько осталось до окончания таймеров пользователя."""
+    now = datetime.now()
+    user_timers = await timers.select(ctx.user.id)
+    emb = hikari.Embed(
+        title="⏳ Ваши таймеры",
+        description="\n".join(
+            f"`{name}`: {_format_left(reset_time, now)}"
+            for name, reset_time in sorted(
+                user_timers.items(), key=lambda t: t[1]
+            )
+        )
+        or "У вас нет активных таймеров.",
+        color=hikari.Color(0x66CCFF),
+    )
+    await ctx.respond(emb)
+
+
+@arc.loader
+def loader(client: ChioClient) -> None:
+    """Действия при загрузке плагина.
+
+    Подключаем таблицу таймеров для всех расширений.
+    """
+    plugin.add_table(TimersTable)
+    client.add_plugin(plugin)
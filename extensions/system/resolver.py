@@ -0,0 +1,52 @@
+"""Статистика получения сущностей Discord.
+
+Показывает, как часто пользователи, гильдии и каналы находились в кеше,
+а как часто приходилось обращаться к REST.
+
+Version: v1.0 (1)
+Author: Milinuri Nirvalen
+"""
+
+import arc
+import hikari
+
+from chioricord.client import ChioClient, ChioContext
+from chioricord.hooks import has_role
+from chioricord.plugin import ChioPlugin
+from chioricord.roles import RoleLevel
+
+plugin = ChioPlugin("Resolver")
+
+_KIND_NAMES = {
+    "users": "Пользователи",
+    "guilds": "Гильдии",
+    "channels": "Каналы",
+}
+
+
+@plugin.include
+@arc.slash_command("resolver", description="Статистика кеша сущностей.")
+async def resolver_stats(ctx: ChioContext) -> None:
+    """Сколько REST запросов сэкономил кеш сущностей."""
+    emb = hikari.Embed(title="Кеш сущностей", color=hikari.Color(0x6666CC))
+    for kind, stats in ctx.client.resolver.stats.items():
+        emb.add_field(
+            _KIND_NAMES[kind],
+            (
+                f"Кеш hikari: `{stats.cache_hits}`\n"
+                f"Свой кеш: `{stats.fallback_hits}`\n"
+                f"Промахов: `{stats.misses}`\n"
+                f"REST запросов: `{stats.rest_calls}`\n"
+                f"Объединено: `{stats.shared}`\n"
+                f"Ошибок: `{stats.errors}`"
+            ),
+            inline=True,
+        )
+    await ctx.respond(emb)
+
+
+@arc.loader
+def loader(client: ChioClient) -> None:
+    """Actions on plugin load."""
+    plugin.add_hook(has_role(RoleLevel.ADMINISTRATOR))
+    client.add_plugin(plugin)
@@ -3,7 +3,7 @@
 Позволяет управлять ролями пользователей.
 Просматривать, присваивать, убирать роли для пользователей.
 
-Version: v1.0.2 (4)
+Version: v1.1.1 (6)
 Author: Milinuri Nirvalen
 """
 
@@ -178,6 +178,26 @@ async def reset_role(
     await ctx.respond(f"Роль {user.mention} сброшена.")
 
 
+@role_group.include
+@arc.slash_subcommand("cache", description="Статистика кеша ролей.")
+async def role_cache_stats(
+    ctx: ChioContext, table: RoleTable = arc.inject()
+) -> None:
+    """Сколько запросов к базе данных сэкономил кеш ролей."""
+    stats = table.cache_stats
+    emb = hikari.Embed(
+        title="Кеш ролей",
+        description=(
+            f"Попаданий: `{stats.hits}`\n"
+            f"Промахов: `{stats.misses}`\n"
+            f"Эффективность: `{round(stats.ratio * 100, 2)}%`\n"
+            f"Из загруженных ролей: `{table.preload_hits}`"
+        ),
+        color=hikari.Color(0x6666CC),
+    )
+    await ctx.respond(emb)
+
+
 @arc.loader
 def loader(client: ChioClient) -> None:
     """Actions on plugin load."""
@@ -1,18 +1,30 @@
 """Статистика использования команд бота.
 
-Version: v0.1.2 (3)
+Version: v0.3 (6)
 Author: Milinuri Nirvalen
 """
 
 import arc
+import hikari
 from loguru import logger
 
 from chioricord.client import ChioClient, ChioContext
+from chioricord.hooks import has_role
 from chioricord.plugin import ChioPlugin
-from libs.use_stat import CommandsTable
+from chioricord.roles import RoleLevel
+from chioricord.timings import CommandStats
+from libs.use_stat import CommandsTable, Period, TimingsTable
 
 plugin = ChioPlugin("Use stat")
 
+_TOP_SIZE = 15
+_PERIOD_HEADERS = {
+    "all": "за всё время",
+    "day": "за день",
+    "week": "за неделю",
+    "month": "за месяц",
+}
+
 
 @plugin.inject_dependencies()
 async def on_command(
@@ -22,12 +34,117 @@ async def on_command(
     logger.debug(
         "Use {} in {} by {}", ctx.command.name, ctx.guild_id, ctx.user.id
     )
-    await table.add_command(ctx.user.id, ctx.guild_id, ctx.command.name)
+    table.add_command(ctx.user.id, ctx.guild_id, ctx.command.name)
+
+
+@plugin.include
+@arc.with_hook(has_role(RoleLevel.ADMINISTRATOR))
+@arc.slash_command("commands", description="Статистика использования команд.")
+async def commands_stat_handler(
+    ctx: ChioContext,
+    period: arc.Option[  # type: ignore
+        str,
+        arc.StrParams(
+            "За какой период.", choices=["all", "day", "week", "month"]
+        ),
+    ] = "all",
+    user: arc.Option[  # type: ignore
+        hikari.User | None, arc.UserParams("Команды пользователя")
+    ] = None,
+    everywhere: arc.Option[  # type: ignore
+        bool, arc.BoolParams("По всем серверам")
+    ] = False,
+    table: CommandsTable = arc.inject(),
+) -> None:
+    """Самые используемые команды.
+
+    По умолчанию показывает статистику текущего сервера.
+    """
+    since: Period | None = None if period == "all" else period  # type: ignore
+    if user is not None:
+        counter = await table.count_user(user.id, since)
+        title = f"Команды {user.display_name}"
+    else:
+        guild_id = None if everywhere else (ctx.guild_id or 0)
+        counter = await table.count_commands(guild_id, since)
+        title = "Команды" if everywhere else "Команды сервера"
+
+    emb = hikari.Embed(
+        title=f"{title} {_PERIOD_HEADERS[period]}",
+        description="\n".join(
+            f"{i}. `/{name}`: {count}"
+            for i, (name, count) in enumerate(counter.most_common(_TOP_SIZE), 1)
+        )
+        or "Команды ещё не использовались.",
+        color=hikari.Color(0x6666CC),
+    )
+    emb.set_footer(
+        f"Всего: {counter.total()}, отброшено записей: {table.dropped}"
+    )
+    await ctx.respond(emb)
+
+
+def _ms(value: int) -> str:
+    return f"{value / 1000:.1f}"
+
+
+def _timings_row(name: str, stats: CommandStats) -> str:
+    total = stats.phases["total"]
+    inject = stats.phases["inject"]
+    return (
+        f"`/{name}` x{stats.calls}, ошибок: {stats.errors}\n"
+        f"> p50 `{_ms(total.percentile(50))}` "
+        f"p95 `{_ms(total.percentile(95))}` "
+        f"p99 `{_ms(total.percentile(99))}` мс, "
+        f"внедрение p95 `{_ms(inject.percentile(95))}` мс"
+    )
+
+
+@plugin.include
+@arc.with_hook(has_role(RoleLevel.ADMINISTRATOR))
+@arc.slash_command("latency", description="Время выполнения команд.")
+async def latency_handler(
+    ctx: ChioContext,
+    period: arc.Option[  # type: ignore
+        str,
+        arc.StrParams(
+            "За какой период.", choices=["start", "day", "week", "month"]
+        ),
+    ] = "start",
+    table: TimingsTable = arc.inject(),
+) -> None:
+    """Самые медленные команды по 95 перцентилю.
+
+    По умолчанию показывает замеры с момента запуска бота.
+    Внедрение: время хуков внедрения зависимостей перед командой.
+    """
+    if period == "start":
+        timings = ctx.client.timings.stats
+        header = "с запуска"
+    else:
+        timings = await table.get_timings(period)  # type: ignore
+        header = _PERIOD_HEADERS[period]
+
+    slowest = sorted(
+        timings.items(),
+        key=lambda item: item[1].phases["total"].percentile(95),
+        reverse=True,
+    )[:_TOP_SIZE]
+    emb = hikari.Embed(
+        title=f"Время выполнения команд {header}",
+        description="\n".join(
+            _timings_row(name, stats) for name, stats in slowest
+        )
+        or "Команды ещё не выполнялись.",
+        color=hikari.Color(0x6666CC),
+    )
+    await ctx.respond(emb)
 
 
 @arc.loader
 def loader(client: ChioClient) -> None:
     """Actions on plugin load."""
     plugin.add_table(CommandsTable)
+    plugin.add_table(TimingsTable)
     client.add_post_hook(on_command)
     client.add_plugin(plugin)
@@ -6,7 +6,7 @@
 > Вы Легко можете начать писать своё расширение для Чиори,
 > взяв за основу исходный код данного расширения.
 
-Version: v1.0.3 (13)
+Version: v1.1.2 (16)
 Author: Milinuri Nirvalen
 """
 
@@ -14,9 +14,12 @@ from datetime import datetime
 
 import arc
 import hikari
+import miru
 
+from chioricord.api import LeaderPage
 from chioricord.client import ChioClient, ChioContext
 from chioricord.plugin import ChioPlugin
+from chioricord.views import LeaderboardView
 from libs.rep import ReputationTable, UserReputation
 
 plugin = ChioPlugin("Reputation")
@@ -123,26 +126,24 @@ async def add_reputation(
         await ctx.respond(emb)
         return
 
-    my_rep = await table.get_or_create(ctx.user.id)
-    if now > my_rep.next_rep:
-        rep = await table.add_positive(user.id)
+    vote = await table.vote(ctx.user.id, user.id, "positive")
+    if vote.target is not None:
         pos = _pretty_pos(await table.get_position(user.id))
         emb = hikari.Embed(
             title="✨ Репутация",
             description=(
                 f"{ctx.user.mention} оказывает уважение {user.mention}🎉\n\n"
-                f"{_user_stats(rep, pos)}"
+                f"{_user_stats(vote.target, pos)}"
             ),
             color=_COLOR_SUCCESS,
         )
-        await table.bump_cooldown(ctx.user.id)
     else:
         emb = hikari.Embed(
             title="💦 Минуточку",
             description="Перезарядка ещё не прошла?",
             color=_COLOR_ERROR,
         )
-        emb.add_field("Перезарядка", _format_time(my_rep.next_rep, now))
+        emb.add_field("Перезарядка", _format_time(vote.giver.next_rep, now))
     await ctx.respond(emb)
 
 
@@ -166,26 +167,24 @@ async def remove_reputation(
         await ctx.respond(emb)
         return
 
-    my_rep = await table.get_or_create(ctx.user.id)
-    if now > my_rep.next_rep:
-        rep = await table.add_negative(user.id)
+    vote = await table.vote(ctx.user.id, user.id, "negative")
+    if vote.target is not None:
         pos = _pretty_pos(await table.get_position(user.id))
         emb = hikari.Embed(
             title="✨ Репутация",
             description=(
                 f"{ctx.user.mention} оказывает неуважение {user.mention}🎉\n\n"
-                f"{_user_stats(rep, pos)}"
+                f"{_user_stats(vote.target, pos)}"
             ),
             color=_COLOR_MAIN,
         )
-        await table.bump_cooldown(ctx.user.id)
     else:
         emb = hikari.Embed(
             title="💦 Минуточку",
             description="Перезарядка ещё не прошла?",
             color=_COLOR_ERROR,
         )
-        emb.add_field("Перезарядка", _format_time(my_rep.next_rep, now))
+        emb.add_field("Перезарядка", _format_time(vote.giver.next_rep, now))
     await ctx.respond(emb)
 
 
@@ -194,32 +193,40 @@ async def remove_reputation(
 async def reputation_top(
     ctx: ChioContext,
     table: ReputationTable = arc.inject(),
+    client: miru.Client = arc.inject(),
 ) -> None:
     """Таблица лидеров по сообщениям."""
-    leaders = await table.get_leaders("positive")
-    leaderboard: list[str] = []
-    for i, rep in enumerate(leaders):
-        user = ctx.client.cache.get_user(rep.user_id)
-        if user is not None:
-            name = user.display_name
-        else:
-            user = await ctx.client.rest.fetch_user(rep.user_id)
-            name = user.display_name
-
-        points = f"✨{rep.positive} ({rep.karma}%)"
-        leaderboard.append(f"{_pretty_pos(i + 1)}: **{name}**: {points}")
+    board = table.leaderboard("positive")
+    my_pos = _pretty_pos(await board.rank(ctx.user.id))
+    my_rep = await table.get_or_create(ctx.user.id)
+    my_points = f"✨{my_rep.positive} ({my_rep.karma}%)"
 
-    emb = hikari.Embed(
-        title="Таблица лидеров по репутации",
-        description="\n".join(leaderboard),
-        color=_COLOR_MAIN,
-    )
+    async def render(page: LeaderPage[UserReputation]) -> hikari.Embed:
+        names = await ctx.client.resolver.display_names(
+            (rep.user_id for rep in page.items), ctx.guild_id
+        )
+        leaderboard: list[str] = []
+        for i, rep in page.positions():
+            points = f"✨{rep.positive} ({rep.karma}%)"
+            leaderboard.append(
+                f"{_pretty_pos(i)}: **{names[rep.user_id]}**: {points}"
+            )
 
-    my_pos = _pretty_pos(await table.get_position(ctx.user.id))
-    my_rep = await table.get_or_create(ctx.user.id)
-    points = f"✨{my_rep.positive} ({my_rep.karma}%)"
-    emb.add_field("Моя позиция", f"{my_pos}: {ctx.user.display_name} {points}")
-    await ctx.respond(emb)
+        emb = hikari.Embed(
+            title="Таблица лидеров по репутации",
+            description="\n".join(leaderboard),
+            color=_COLOR_MAIN,
+        )
+        emb.add_field(
+            "Моя позиция", f"{my_pos}: {ctx.user.display_name} {my_points}"
+        )
+        return emb
+
+    view = LeaderboardView(board, render)
+    await ctx.respond(
+        await view.open(await board.first_page()), components=view
+    )
+    client.start_view(view)
 
 
 # Загрузчики и выгрузчики плагина
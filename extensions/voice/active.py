@@ -4,7 +4,7 @@
 опыта в голосовом канале.
 Опыт выдаётся за тип активности в канале и количество участников.
 
-Version: v1.3 (8)
+Version: v1.3.1 (9)
 Author: Milinuri Nirvalen
 """
 
@@ -192,15 +192,14 @@ async def voice_active(
     await ctx.respond(emb)
 
 
-@plugin.listen(arc.StoppingEvent)
-@plugin.inject_dependencies
-async def clear_voice_state(
-    event: arc.StoppingEvent[ChioClient],
-    active: ActiveTable = arc.inject(),
-    timer: VoiceTimer = arc.inject(),
-) -> None:
-    """Время сохранять голосовую активность пользователей."""
+async def clear_voice_state(client: ChioClient) -> None:
+    """Время сохранять голосовую активность пользователей.
+
+    Вызывается при выключении бота, пока база данных ещё подключена.
+    """
     logger.info("Save active time")
+    active = client.get_type_dependency(ActiveTable)
+    timer = client.get_type_dependency(VoiceTimer)
     now = int(time())
     for user_id, voice in timer.users.items():
         logger.info("Remove {} from listener", user_id)
@@ -212,4 +211,5 @@ async def clear_voice_state(
 def loader(client: ChioClient) -> None:
     """Actions on plugin load."""
     client.set_type_dependency(VoiceTimer, VoiceTimer())
+    client.add_shutdown_hook(clear_voice_state)
     client.add_plugin(plugin)
@@ -1,18 +1,47 @@
 """База данных активности участников.
 
-Version: v2.2.2 (10)
+Version: v2.8.7 (23)
 Author: Milinuri Nirvalen
 """
 
+import asyncio
+import math
+import time
 from dataclasses import dataclass
-from typing import Self
+from datetime import datetime, timedelta
+from typing import Literal, Self
 
 from asyncpg import Record
+from loguru import logger
 
-from chioricord.api import DBTable
+from chioricord.api import ChioDB, DBTable, Leaderboard
+from chioricord.cache import TTLCache
 from chioricord.events import DBEvent
 
 
+def level_xp(level: int) -> int:
+    """Сколько всего опыта нужно для достижения уровня.
+
+    Сумма `15L² + 5L + 10` по всем предыдущим уровням.
+    """
+    return 5 * level**3 - 5 * level**2 + 10 * level
+
+
+def level_from_xp(total: int) -> int:
+    """Какой уровень соответствует всему накопленному опыту.
+
+    Обратная функция к `level_xp`.
+    Кубический корень даёт уровень с точностью до пары единиц,
+    после чего остаётся проверить несколько следующих уровней.
+    """
+    if total <= 0:
+        return 0
+    level = max(int(math.cbrt(total / 5)) - 1, 0)
+    while level_xp(level + 1) <= total:
+        level += 1
+    return level
+
+
 @dataclass(slots=True)
 class UserActive:
     """Описание модели активности пользователя.
@@ -22,6 +51,8 @@ class UserActive:
     - voice: Сколько минут проведено в голосовом канале.
     - level: Текущий уровень участника.
     - xp: Сколько опыта накоплено в текущем уровне.
+
+    Уровень и опыт в уровне выводятся из всего накопленного опыта.
     """
 
     user_id: int
@@ -36,6 +67,20 @@ class UserActive:
         """Сколько xp надо для достижения следующего уровня."""
         return (self.level**2 * 15) + (self.level * 5) + 10
 
+    @property
+    def total_xp(self) -> int:
+        """Сколько всего опыта накоплено пользователем."""
+        return level_xp(self.level) + self.xp
+
+    def set_total_xp(self, total: int) -> None:
+        """Пересчитывает уровень и опыт из всего накопленного опыта."""
+        self.level = level_from_xp(total)
+        self.xp = total - level_xp(self.level)
+
+    def apply_xp(self, xp: int) -> None:
+        """Добавляет опыт и повышает уровень при необходимости."""
+        self.set_total_xp(self.total_xp + xp)
+
     @classmethod
     def from_row(cls, row: Record) -> Self:
         """Собирает значение из строки базы данных."""
@@ -62,6 +107,166 @@ class LevelUpEvent(DBEvent):
         return self.active.user_id
 
 
+@dataclass(slots=True)
+class ActiveDelta:
+    """Ещё не сохранённые изменения активности пользователя."""
+
+    messages: int = 0
+    words: int = 0
+    voice: int = 0
+    bumps: int = 0
+    xp: int = 0
+
+    def merge(self, other: "ActiveDelta") -> None:
+        """Добавляет изменения из другой записи."""
+        self.messages += other.messages
+        self.words += other.words
+        self.voice += other.voice
+        self.bumps += other.bumps
+        self.xp += other.xp
+
+    def apply(self, user: UserActive) -> None:
+        """Применяет изменения к активности пользователя."""
+        user.messages += self.messages
+        user.words += self.words
+        user.voice += self.voice
+        user.bumps += self.bumps
+        user.apply_xp(self.xp)
+
+
+@dataclass(slots=True, frozen=True)
+class ActivePositions:
+    """Места пользователя в таблицах лидеров."""
+
+    level: int
+    words: int
+    voice: int
+    bumps: int
+
+
+@dataclass(slots=True, frozen=True)
+class PeriodActive:
+    """Активность пользователя за период.
+
+    - xp: Сколько опыта получено за период.
+    """
+
+    user_id: int
+    messages: int
+    words: int
+    voice: int
+    bumps: int
+    xp: int
+
+    @classmethod
+    def from_row(cls, row: Record) -> Self:
+        """Собирает значение из строки базы данных."""
+        return cls(*(int(value) for value in row[:6]))
+
+
+Period = Literal["day", "week", "month"]
+PERIODS: dict[Period, timedelta] = {
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "month": timedelta(days=30),
+}
+
+# Почасовая активность хранится пару дней, после чего сжимается в дневную
+# Дневная активность хранится немногим дольше самого длинного периода
+_HOURLY_KEEP = timedelta(days=2)
+_DAILY_KEEP = timedelta(days=32)
+# Как часто сжимать старую активность в секундах
+_COMPACT_INTERVAL = 3600
+
+# Колонки, по которым строятся таблицы лидеров
+RANK_COLUMNS = ("level", "words", "voice", "bumps")
+
+# По какой колонке сортируется таблица лидеров
+# Уровень упорядочен по всему накопленному опыту
+_ORDER_COLUMNS = {
+    col: "total_xp" if col == "level" else col for col in RANK_COLUMNS
+}
+
+# Все места пользователя одним запросом
+# Каждый подзапрос считает строки по индексу `(колонка, user_id)`
+# Равные значения упорядочены по user_id, как в таблице лидеров
+_POSITIONS_SQL = (
+    "SELECT "
+    + ", ".join(
+        "(SELECT COUNT(*) + 1 FROM active "
+        f"WHERE ({col}, user_id) > (u.{col}, u.user_id))"
+        for col in _ORDER_COLUMNS.values()
+    )
+    + " FROM active AS u WHERE u.user_id = $1"
+)
+
+# Места в рейтинге меняются часто, потому кешируются ненадолго
+_RANK_CACHE_SIZE = 1024
+_RANK_CACHE_TTL = 30
+
+# Изменения нескольких пользователей применяются одним запросом
+# Уровень пересчитывается из всего накопленного опыта пользователя
+# Последняя колонка - уровень до добавления опыта
+_ADD_ACTIVE_SQL = (
+    "WITH d AS ("
+    "SELECT * FROM unnest($1::BIGINT[], $2::INTEGER[], $3::INTEGER[], "
+    "$4::INTEGER[], $5::INTEGER[], $6::INTEGER[]) "
+    "AS d(user_id, messages, words, voice, bumps, xp)"
+    "), upd AS ("
+    "INSERT INTO active AS a "
+    "SELECT user_id, messages, words, voice, bumps, active_level(xp), "
+    "xp - active_level_xp(active_level(xp)), xp FROM d "
+    "ON CONFLICT (user_id) DO UPDATE SET "
+    "messages = a.messages + EXCLUDED.messages, "
+    "words = a.words + EXCLUDED.words, "
+    "voice = a.voice + EXCLUDED.voice, "
+    "bumps = a.bumps + EXCLUDED.bumps, "
+    "total_xp = a.total_xp + EXCLUDED.total_xp, "
+    "level = active_level(a.total_xp + EXCLUDED.total_xp), "
+    "xp = a.total_xp + EXCLUDED.total_xp "
+    "- active_level_xp(active_level(a.total_xp + EXCLUDED.total_xp)) "
+    "RETURNING a.*"
+    "), hourly AS ("
+    "INSERT INTO active_hourly AS h "
+    "(user_id, bucket, messages, words, voice, bumps, xp) "
+    "SELECT user_id, date_trunc('hour', LOCALTIMESTAMP), "
+    "messages, words, voice, bumps, xp FROM d "
+    "ON CONFLICT (bucket, user_id) DO UPDATE SET "
+    "messages = h.messages + EXCLUDED.messages, "
+    "words = h.words + EXCLUDED.words, "
+    "voice = h.voice + EXCLUDED.voice, "
+    "bumps = h.bumps + EXCLUDED.bumps, "
+    "xp = h.xp + EXCLUDED.xp"
+    ") SELECT upd.*, active_level(upd.total_xp - d.xp) "
+    "FROM upd JOIN d ON d.user_id = upd.user_id"
+)
+
+# Почасовая активность старше $1 складывается в дневные корзины
+_COMPACT_SQL = (
+    "WITH old AS ("
+    "DELETE FROM active_hourly WHERE bucket < $1 "
+    "AND bucket <> date_trunc('day', bucket) RETURNING *"
+    "), daily AS ("
+    "INSERT INTO active_hourly AS h "
+    "(user_id, bucket, messages, words, voice, bumps, xp) "
+    "SELECT user_id, date_trunc('day', bucket), SUM(messages), "
+    "SUM(words), SUM(voice), SUM(bumps), SUM(xp) FROM old "
+    "GROUP BY user_id, date_trunc('day', bucket) "
+    "ON CONFLICT (bucket, user_id) DO UPDATE SET "
+    "messages = h.messages + EXCLUDED.messages, "
+    "words = h.words + EXCLUDED.words, "
+    "voice = h.voice + EXCLUDED.voice, "
+    "bumps = h.bumps + EXCLUDED.bumps, "
+    "xp = h.xp + EXCLUDED.xp"
+    ") SELECT COUNT(*) FROM old"
+)
+
+# Как часто сохранять текстовую активность в секундах
+_FLUSH_INTERVAL = 5
+# Сколько пользователей может накопиться до сохранения
+_FLUSH_SIZE = 500
+
+
 class ActiveTable(DBTable, table="active"):
     """База данных активности пользователе.
 
@@ -70,8 +275,39 @@ class ActiveTable(DBTable, table="active"):
     За определённую активность может выдаваться опыт.
     за накопленный опыт будут выдаваться уровни.
     Это будет стимулом для участников больше заниматься активностям.
+
+    Текстовая активность сначала накапливается в памяти и сохраняется
+    пачками каждые несколько секунд.
+    При чтении данных пользователя несохранённые изменения учитываются.
+
+    Вместе с общими счётчиками активность записывается в почасовые
+    корзины `active_hourly`, из которых строятся таблицы лидеров за
+    день, неделю и месяц.
     """
 
+    def __init__(self, db: ChioDB) -> None:
+        super().__init__(db)
+        self._pending: dict[int, ActiveDelta] = {}
+        self._flushing: dict[int, ActiveDelta] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._stop = asyncio.Event()
+        self._flush_task: asyncio.Task[None] | None = None
+        self._compacted_at = 0.0
+        self._ranks: TTLCache[int, ActivePositions] = TTLCache(
+            _RANK_CACHE_SIZE, _RANK_CACHE_TTL
+        )
+        self._boards = {
+            col: Leaderboard(
+                db,
+                "active",
+                _ORDER_COLUMNS[col],
+                UserActive.from_row,
+                prepare=self.flush,
+            )
+            for col in RANK_COLUMNS
+        }
+
     async def create_table(self) -> None:
         """Создаёт недостающие таблицы для базы данных."""
         await self.pool.execute(
@@ -84,13 +320,207 @@ class ActiveTable(DBTable, table="active"):
             "level	INTEGER NOT NULL DEFAULT 0,"
             "xp	INTEGER NOT NULL DEFAULT 0);"
         )
+        # Весь накопленный опыт, из которого выводятся level и xp
+        await self.pool.execute(
+            "ALTER TABLE active "
+            "ADD COLUMN IF NOT EXISTS total_xp BIGINT NOT NULL DEFAULT 0"
+        )
+        # Уровни считаются на стороне базы данных
+        # active_level_xp: Сколько всего опыта нужно для уровня.
+        # active_level: Какой уровень соответствует всему опыту.
+        await self.pool.execute(
+            "CREATE OR REPLACE FUNCTION active_level_xp(lvl BIGINT) "
+            "RETURNS BIGINT LANGUAGE SQL IMMUTABLE AS "
+            "'SELECT 5 * lvl * lvl * lvl - 5 * lvl * lvl + 10 * lvl'"
+        )
+        await self.pool.execute(
+            "CREATE OR REPLACE FUNCTION active_level(total BIGINT) "
+            "RETURNS INTEGER LANGUAGE SQL IMMUTABLE AS "
+            "'SELECT (l + (active_level_xp(l + 1) <= total)::INTEGER"
+            " + (active_level_xp(l + 2) <= total)::INTEGER"
+            " + (active_level_xp(l + 3) <= total)::INTEGER)::INTEGER "
+            "FROM (SELECT GREATEST(floor(cbrt(total / 5.0))::BIGINT - 1, 0)"
+            " AS l) AS s'"
+        )
+        await self.pool.execute(
+            "CREATE TABLE IF NOT EXISTS active_hourly ("
+            "bucket	TIMESTAMP NOT NULL,"
+            "user_id	BIGINT NOT NULL,"
+            "messages	INTEGER NOT NULL DEFAULT 0,"
+            "words	INTEGER NOT NULL DEFAULT 0,"
+            "voice	INTEGER NOT NULL DEFAULT 0,"
+            "bumps	INTEGER NOT NULL DEFAULT 0,"
+            "xp	INTEGER NOT NULL DEFAULT 0,"
+            "PRIMARY KEY (bucket, user_id))"
+        )
+        for col in _ORDER_COLUMNS.values():
+            await self.pool.execute(
+                f"CREATE INDEX IF NOT EXISTS active_{col}_user_idx "
+                f"ON active ({col}, user_id)"
+            )
+        await self.pool.execute(
+            "UPDATE active SET total_xp = active_level_xp(level) + xp "
+            "WHERE total_xp = 0 AND (level > 0 OR xp > 0)"
+        )
 
-    async def get_top(self, active: str) -> list[UserActive]:
-        """Таблица лидеров по сообщениям."""
+    async def load(self) -> None:
+        """Запускает периодическое сохранение активности."""
+        self._stop.clear()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Сохраняет накопленную активность.
+
+        Цикл сохранения не отменяется, а завершается после текущей
+        записи, чтобы не потерять сохраняемую пачку.
+        """
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    # Отложенная запись активности
+    # ============================
+
+    async def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), _FLUSH_INTERVAL)
+            except TimeoutError:
+                pass
+            try:
+                await self.flush()
+                if time.monotonic() - self._compacted_at > _COMPACT_INTERVAL:
+                    await self.compact()
+            except Exception as e:
+                logger.exception(e)
+
+    def _push(self, user_id: int, delta: ActiveDelta) -> None:
+        pending = self._pending.get(user_id)
+        if pending is None:
+            self._pending[user_id] = delta
+        else:
+            pending.merge(delta)
+
+        if len(self._pending) >= _FLUSH_SIZE and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def _merge_pending(self, user: UserActive) -> UserActive:
+        for pending in (self._flushing, self._pending):
+            delta = pending.get(user.user_id)
+            if delta is not None:
+                delta.apply(user)
+        return user
+
+    async def _apply(self, deltas: dict[int, ActiveDelta]) -> list[UserActive]:
+        cur = await self.pool.fetch(
+            _ADD_ACTIVE_SQL,
+            list(deltas.keys()),
+            [d.messages for d in deltas.values()],
+            [d.words for d in deltas.values()],
+            [d.voice for d in deltas.values()],
+            [d.bumps for d in deltas.values()],
+            [d.xp for d in deltas.values()],
+        )
+        users: list[UserActive] = []
+        for row in cur:
+            user = UserActive.from_row(row)
+            self._ranks.pop(user.user_id)
+            if user.level != row[8]:
+                self._db.client.app.event_manager.dispatch(
+                    LevelUpEvent(self._db, user)
+                )
+            users.append(user)
+        return users
+
+    async def flush(self) -> None:
+        """Сохраняет накопленную активность одним запросом.
+
+        Отправляет событие повышения уровня для пользователей,
+        у которых изменился уровень.
+        """
+        async with self._lock:
+            if not self._pending:
+                return
+
+            self._flushing, self._pending = self._pending, {}
+            try:
+                await self._apply(self._flushing)
+            except BaseException:
+                # В том числе при отмене, иначе пачка будет потеряна
+                for user_id, delta in self._flushing.items():
+                    self._push(user_id, delta)
+                raise
+            finally:
+                self._flushing = {}
+
+    async def compact(self) -> int:
+        """Сжимает старую почасовую активность в дневную.
+
+        Удаляет активность, которая уже не попадает ни в один период.
+        Возвращает количество сжатых почасовых корзин.
+        """
+        now = datetime.now()
+        async with self.pool.acquire() as conn, conn.transaction():
+            await conn.execute(
+                "DELETE FROM active_hourly WHERE bucket < $1",
+                now - _DAILY_KEEP,
+            )
+            rows = await conn.fetchval(_COMPACT_SQL, now - _HOURLY_KEEP)
+        self._compacted_at = time.monotonic()
+        return int(rows)
+
+    async def get_period_top(
+        self, period: Period, active: str
+    ) -> list[PeriodActive]:
+        """Таблица лидеров за период.
+
+        Уровень за период определяется полученным опытом.
+        """
+        if active not in RANK_COLUMNS:
+            raise ValueError(f"Unknown rank column: {active}")
+        await self.flush()
+        order = "xp" if active == "level" else active
         cur = await self.pool.fetch(
-            f"SELECT * FROM active ORDER BY {active} DESC LIMIT 10"
+            "SELECT user_id, SUM(messages), SUM(words), SUM(voice), "
+            "SUM(bumps), SUM(xp) AS xp FROM active_hourly "
+            f"WHERE bucket >= $1 GROUP BY user_id ORDER BY SUM({order}) DESC "
+            "LIMIT 10",
+            datetime.now() - PERIODS[period],
         )
-        return [UserActive.from_row(row) for row in cur]
+        return [PeriodActive.from_row(row) for row in cur]
+
+    async def get_period_user(
+        self, period: Period, user_id: int
+    ) -> PeriodActive:
+        """Активность пользователя за период."""
+        await self.flush()
+        cur = await self.pool.fetchrow(
+            "SELECT $2::BIGINT, COALESCE(SUM(messages), 0), "
+            "COALESCE(SUM(words), 0), COALESCE(SUM(voice), 0), "
+            "COALESCE(SUM(bumps), 0), COALESCE(SUM(xp), 0) "
+            "FROM active_hourly WHERE bucket >= $1 AND user_id = $2",
+            datetime.now() - PERIODS[period],
+            user_id,
+        )
+        return PeriodActive.from_row(cur)  # type: ignore
+
+    def leaderboard(self, active: str) -> Leaderboard[UserActive]:
+        """Постраничная таблица лидеров.
+
+        Таблица лидеров по уровню строится по всему накопленному опыту.
+        """
+        if active not in RANK_COLUMNS:
+            raise ValueError(f"Unknown rank column: {active}")
+        return self._boards[active]
+
+    async def get_top(self, active: str) -> list[UserActive]:
+        """Первая страница таблицы лидеров."""
+        page = await self.leaderboard(active).first_page()
+        return page.items
 
     async def get_user(self, user_id: int) -> UserActive | None:
         """Получает пользователя по ID."""
@@ -98,8 +528,12 @@ class ActiveTable(DBTable, table="active"):
             "SELECT * FROM active WHERE user_id=$1", user_id
         )
         if cur is None:
+            if user_id in self._pending or user_id in self._flushing:
+                return self._merge_pending(
+                    UserActive(user_id, 0, 0, 0, 0, 0, 0)
+                )
             return None
-        return UserActive.from_row(cur)
+        return self._merge_pending(UserActive.from_row(cur))
 
     async def get_or_default(self, user_id: int) -> UserActive:
         """Получает пользователя или значение по умолчанию."""
@@ -108,92 +542,98 @@ class ActiveTable(DBTable, table="active"):
             return user
         return UserActive(user_id, 0, 0, 0, 0, 0, 0)
 
+    async def get_positions(self, user_id: int) -> ActivePositions | None:
+        """Места пользователя во всех таблицах лидеров.
+
+        Все места считаются одним запросом по индексам колонок.
+        Результат ненадолго кешируется.
+        """
+        positions = self._ranks.get(user_id)
+        if positions is not None:
+            return positions
+
+        await self.flush()
+        cur = await self.pool.fetchrow(_POSITIONS_SQL, user_id)
+        if cur is None:
+            return None
+        positions = ActivePositions(*(int(pos) for pos in cur))
+        self._ranks.set(user_id, positions)
+        return positions
+
     async def get_position(self, active: str, user_id: int) -> int | None:
-        """Таблица лидеров по сообщениям."""
-        cur = await self.pool.fetch(
-            "SELECT COUNT(*) + 1 AS position FROM active "
-            f"WHERE {active} > (SELECT {active} FROM active "
-            "WHERE user_id = $1)",
-            user_id,
-        )
-        return int(cur[0][0]) if len(cur) > 0 else None
+        """Место пользователя в таблице лидеров."""
+        if active not in RANK_COLUMNS:
+            raise ValueError(f"Unknown rank column: {active}")
+        positions = await self.get_positions(user_id)
+        return None if positions is None else getattr(positions, active)
 
     async def set_user(self, user: UserActive) -> UserActive | None:
-        """Получает пользователя по ID."""
-        cur = await self.pool.fetch(
-            "SELECT * FROM active WHERE user_id=$1", user.user_id
-        )
-        if len(cur) == 0:
-            await self.pool.execute(
-                "INSERT INTO active VALUES($1, $2, $3, $4, $5, $6, $7)",
-                user.user_id,
-                user.messages,
-                user.words,
-                user.voice,
-                user.bumps,
-                user.level,
-                user.xp,
-            )
-            return await self.get_user(user.user_id)
+        """Перезаписывает активность пользователя.
+
+        Несохранённые изменения будут добавлены поверх новых значений.
+        """
         await self.pool.execute(
-            "UPDATE active SET messages=$1, words=$2, voice=$3, "
-            "bumps=$4, level=$5, xp=$6 WHERE user_id=$7",
+            "INSERT INTO active VALUES($1, $2, $3, $4, $5, $6, $7, $8) "
+            "ON CONFLICT (user_id) DO UPDATE SET "
+            "messages=EXCLUDED.messages, words=EXCLUDED.words, "
+            "voice=EXCLUDED.voice, bumps=EXCLUDED.bumps, "
+            "level=EXCLUDED.level, xp=EXCLUDED.xp, "
+            "total_xp=EXCLUDED.total_xp",
+            user.user_id,
             user.messages,
             user.words,
             user.voice,
             user.bumps,
             user.level,
             user.xp,
-            user.user_id,
+            user.total_xp,
         )
         return user
 
-    async def add_xp(
-        self, user: UserActive, user_id: int, xp: int
-    ) -> UserActive:
-        """Добавляет опыт пользователю и сохраняет его."""
-        user.xp += xp
-
-        start_level = user.level
-        next_level = user.count_xp()
-        while user.xp >= next_level:
-            user.level += 1
-            user.xp -= next_level
-            next_level = user.count_xp()
-
-        await self.set_user(user)
-        if user.level != start_level:
-            self._db.client.app.event_manager.dispatch(
-                LevelUpEvent(self._db, user)
-            )
-        return user
+    async def recount_levels(self) -> int:
+        """Пересчитывает уровни всех пользователей одним запросом.
+
+        Уровень и опыт выводятся из всего накопленного опыта.
+        Используется после изменения формулы уровней.
+        Возвращает количество изменённых записей.
+        """
+        status = await self.pool.execute(
+            "UPDATE active SET level = l.level, "
+            "xp = active.total_xp - active_level_xp(l.level) "
+            "FROM (SELECT user_id, active_level(total_xp) AS level "
+            "FROM active) AS l "
+            "WHERE active.user_id = l.user_id "
+            "AND (active.level <> l.level "
+            "OR active.xp <> active.total_xp - active_level_xp(l.level))"
+        )
+        return int(status.split()[-1])
 
-    async def add_messages(self, user_id: int, amount: int) -> UserActive:
+    async def add_messages(self, user_id: int, amount: int) -> None:
         """Обновляет счётчик сообщений.
 
         Прибавляет равноценное количество xp.
+        Изменения накапливаются в памяти и будут сохранены позже.
         """
-        user = await self.get_or_default(user_id)
-        user.messages += 1
-        user.words += amount
-        return await self.add_xp(user, user_id, amount)
+        self._push(user_id, ActiveDelta(messages=1, words=amount, xp=amount))
 
     async def add_voice(
         self, user_id: int, amount: int, xp: int
     ) -> UserActive | None:
         """Обновляет счётчик голосового канала.
 
-        Также прибавляет 2*amount xp.
+        Также прибавляет 5*xp опыта.
         """
-        user = await self.get_or_default(user_id)
-        user.voice += amount
-        return await self.add_xp(user, user_id, xp * 5)
+        users = await self._apply(
+            {user_id: ActiveDelta(voice=amount, xp=xp * 5)}
+        )
+        return self._merge_pending(users[0])
 
     async def add_bump(self, user_id: int, amount: int) -> UserActive | None:
-        """ТОбновляет список бампов сервера.
+        """Обновляет список бампов сервера.
 
         Также прибавляет 5*amount xp.
         """
-        user = await self.get_or_default(user_id)
-        user.bumps += amount
-        return await self.add_xp(user, user_id, amount * 5)
+        users = await self._apply(
+            {user_id: ActiveDelta(bumps=amount, xp=amount * 5)}
+        )
+        return self._merge_pending(users[0])
@@ -76,22 +76,6 @@ class LinguaConfig(PluginConfig):
     """Список всех доступных моделей."""
 
 
-async def _get_channel(
-    client: ChioClient, channel_id: int
-) -> hikari.PartialChannel:
-    channel = client.cache.get_guild_channel(channel_id)
-    if channel is not None:
-        return channel
-    return await client.rest.fetch_channel(channel_id)
-
-
-async def _get_guild(client: ChioClient, guild_id: int) -> hikari.Guild:
-    guild = client.cache.get_guild(guild_id)
-    if guild is not None:
-        return guild
-    return await client.rest.fetch_guild(guild_id)
-
-
 @dataclass(slots=True, frozen=True)
 class ChatContext:
     user: hikari.User
@@ -114,8 +98,8 @@ class ChatContext:
     ) -> Self:
         return cls(
             event.author,
-            await _get_channel(client, event.channel_id),
-            await _get_guild(client, event.message.guild_id)
+            await client.resolver.get_channel(event.channel_id),
+            await client.resolver.get_guild(event.message.guild_id)
             if event.message.guild_id is not None
             else None,
         )
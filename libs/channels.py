@@ -2,21 +2,37 @@
 
 На сервере вы можете устанавливать специальные каналы, куда боте будет
 отправлять свои сообщения.
+
+Каналы сервера загружаются один раз и дальше берутся из памяти.
+Об изменениях каналов другие процессы бота узнают через
+`LISTEN/NOTIFY` и сбрасывают свою копию каналов сервера.
 """
 
 from __future__ import annotations
 
+import asyncio
+import secrets
 from dataclasses import dataclass
 from typing import TYPE_CHECKING, Self
 
 import arc
+import asyncpg
 from asyncpg import Record
+from asyncpg.pool import PoolConnectionProxy
+from loguru import logger
 
 from chioricord.api import ChioDB, DBTable
+from chioricord.resolver import SingleFlight
 
 if TYPE_CHECKING:
     from chioricord.client import ChioContext
 
+# Канал уведомлений об изменении каналов сервера
+# Содержимое уведомления: "<guild_id> <token процесса>"
+_NOTIFY_CHANNEL = "chio_channels"
+# Через сколько секунд переподключаться при потере соединения
+_RELISTEN_DELAY = 5
+
 
 @dataclass(frozen=True, slots=True)
 class GuildChannel:
@@ -41,12 +57,7 @@ class GuildChannels:
 
     async def prefer(self, names: list[str]) -> GuildChannel:
         """Получает один из ID каналов по имени."""
-        channels = await self.table.select(self.guild_id)
-        for name in names:
-            chan = channels.get(name)
-            if chan is not None:
-                return chan
-        raise KeyError(f"Channels {names} not found")
+        return await self.table.prefer(self.guild_id, names)
 
     async def channels(self) -> dict[str, GuildChannel]:
         """Словарь всех каналов сервера."""
@@ -73,10 +84,25 @@ class ChannelsTable(DBTable, table="channels"):
     """Таблица каналов сервера.
 
     Позволяет связать ID канала на сервере с именем в базе.
+    Каналы каждого сервера кешируются в памяти при первом обращении.
+    Изменения сразу применяются к кешу и отправляются остальным
+    процессам через `NOTIFY`.
     """
 
     def __init__(self, db: ChioDB) -> None:
         super().__init__(db)
+        self._guilds: dict[int, dict[str, GuildChannel]] = {}
+        self._views: dict[int, GuildChannels] = {}
+        self._loading: SingleFlight[int, dict[str, GuildChannel]] = (
+            SingleFlight()
+        )
+        self._token = secrets.token_hex(8)
+        # Увеличивается при каждом изменении, чтобы не сохранить в кеш
+        # каналы, загруженные до изменения
+        self._epoch = 0
+        self._conn: PoolConnectionProxy | None = None
+        self._relisten_task: asyncio.Task[None] | None = None
+        self._closed = False
         self._db.client.add_injection_hook(self._chan_injector)
 
     async def _chan_injector(
@@ -85,9 +111,10 @@ class ChannelsTable(DBTable, table="channels"):
         if ctx.guild_id is None:
             return
 
-        inj_ctx.set_type_dependency(
-            GuildChannels, GuildChannels(self, ctx.guild_id)
-        )
+        view = self._views.get(ctx.guild_id)
+        if view is None:
+            view = self._views[ctx.guild_id] = GuildChannels(self, ctx.guild_id)
+        inj_ctx.set_type_dependency(GuildChannels, view)
 
     async def create_table(self) -> None:
         """Создаёт таблицы для базы данных."""
@@ -99,45 +126,145 @@ class ChannelsTable(DBTable, table="channels"):
             "PRIMARY KEY (guild_id, name))"
         )
 
-    async def get(self, guild_id: int, name: str) -> GuildChannel | None:
-        """Возвращает информацию о канале из базы данных по имени."""
-        cur = await self.pool.fetchrow(
-            "SELECT * FROM channels WHERE guild_id=$1 AND name=$2",
-            guild_id,
-            name,
+    async def load(self) -> None:
+        """Подписывается на изменения каналов из других процессов."""
+        await self._listen()
+
+    async def close(self) -> None:
+        """Отписывается от изменений каналов."""
+        self._closed = True
+        if self._relisten_task is not None:
+            self._relisten_task.cancel()
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        await conn.remove_listener(_NOTIFY_CHANNEL, self._on_notify)
+        await self.pool.release(conn)
+
+    # Уведомления об изменениях
+    # =========================
+
+    async def _listen(self) -> None:
+        conn = await self.pool.acquire()
+        await conn.add_listener(_NOTIFY_CHANNEL, self._on_notify)
+        conn.add_termination_listener(self._on_terminate)
+        self._conn = conn
+        # Пока не было подписки, каналы могли измениться
+        self._epoch += 1
+        self._guilds.clear()
+
+    def _on_notify(
+        self,
+        conn: asyncpg.Connection | PoolConnectionProxy,
+        pid: int,
+        channel: str,
+        payload: object,
+    ) -> None:
+        guild_id, _, token = str(payload).partition(" ")
+        if token != self._token:
+            self._epoch += 1
+            self._guilds.pop(int(guild_id), None)
+
+    def _on_terminate(
+        self, conn: asyncpg.Connection | PoolConnectionProxy
+    ) -> None:
+        # Без подписки кеш может устареть
+        logger.warning("Channels listener connection lost")
+        self._conn = None
+        self._epoch += 1
+        self._guilds.clear()
+        if not self._closed:
+            self._relisten_task = asyncio.create_task(self._relisten())
+
+    async def _relisten(self) -> None:
+        while self._conn is None and not self._closed:
+            await asyncio.sleep(_RELISTEN_DELAY)
+            try:
+                await self._listen()
+            except Exception as e:
+                logger.exception(e)
+
+    async def _write(self, guild_id: int, query: str, *args: object) -> None:
+        # Изменение и уведомление выполняются одним запросом
+        await self.pool.execute(
+            f"WITH w AS ({query}) SELECT pg_notify($1, $2)",
+            _NOTIFY_CHANNEL,
+            f"{guild_id} {self._token}",
+            *args,
         )
-        return None if cur is None else GuildChannel.from_row(cur)
+        self._epoch += 1
+
+    # Работа с каналами
+    # =================
+
+    async def _fetch(self, guild_id: int) -> dict[str, GuildChannel]:
+        epoch = self._epoch
+        cur = await self.pool.fetch(
+            "SELECT * FROM channels WHERE guild_id=$1", guild_id
+        )
+        channels = {row[1]: GuildChannel.from_row(row) for row in cur}
+        # Кешируем только пока есть подписка на изменения
+        if self._conn is not None and epoch == self._epoch:
+            self._guilds[guild_id] = channels
+        return channels
+
+    async def _guild(self, guild_id: int) -> dict[str, GuildChannel]:
+        channels = self._guilds.get(guild_id)
+        if channels is not None:
+            return channels
+        return await self._loading.do(guild_id, lambda: self._fetch(guild_id))
+
+    async def get(self, guild_id: int, name: str) -> GuildChannel | None:
+        """Возвращает информацию о канале по имени."""
+        return (await self._guild(guild_id)).get(name)
+
+    async def prefer(self, guild_id: int, names: list[str]) -> GuildChannel:
+        """Возвращает первый установленный канал из списка имён."""
+        channels = await self._guild(guild_id)
+        for name in names:
+            chan = channels.get(name)
+            if chan is not None:
+                return chan
+        raise KeyError(f"Channels {names} not found")
 
     async def set(
         self, guild_id: int, name: str, channel_id: int
     ) -> GuildChannel:
         """Устанавливает новое значение для канала."""
-        await self.pool.execute(
+        await self._write(
+            guild_id,
             "INSERT INTO channels (guild_id, name, channel_id) "
-            "VALUES ($1, $2, $3) "
+            "VALUES ($3, $4, $5) "
             "ON CONFLICT (guild_id, name) DO UPDATE "
-            "SET channel_id = $3;",
+            "SET channel_id = $5",
             guild_id,
             name,
             channel_id,
         )
-        return GuildChannel(guild_id, name, channel_id)
+        chan = GuildChannel(guild_id, name, channel_id)
+        channels = self._guilds.get(guild_id)
+        if channels is not None:
+            channels[name] = chan
+        return chan
 
     async def unset(self, guild_id: int, name: str) -> None:
         """Сбрасывает канал по имени."""
-        await self.pool.execute(
-            "DELETE FROM channels WHERE guild_id=$1 AND name=$2", guild_id, name
+        await self._write(
+            guild_id,
+            "DELETE FROM channels WHERE guild_id=$3 AND name=$4",
+            guild_id,
+            name,
         )
+        self._guilds.get(guild_id, {}).pop(name, None)
 
     async def select(self, guild_id: int) -> dict[str, GuildChannel]:
-        """Возвращает информацию о канале из базы данных по имени."""
-        cur = await self.pool.fetch(
-            "SELECT * FROM channels WHERE guild_id=$1", guild_id
-        )
-        return {row[1]: GuildChannel.from_row(row) for row in cur}
+        """Возвращает все каналы сервера."""
+        return dict(await self._guild(guild_id))
 
     async def reset(self, guild_id: int) -> None:
         """Сбрасывает все каналы на сервере."""
-        await self.pool.execute(
-            "DELETE FROM channels WHERE guild_id=$1", guild_id
+        await self._write(
+            guild_id, "DELETE FROM channels WHERE guild_id=$3", guild_id
         )
+        if self._conn is not None:
+            self._guilds[guild_id] = {}
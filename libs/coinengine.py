@@ -3,19 +3,27 @@
 Часть экономической системы.
 Предоставляет базу данных для работы с валютой пользователя.
 
-Version: v2.2 (11)
+Version: v2.7.1 (17)
 Author: Milinuri Nirvalen
 """
 
+import time
 from dataclasses import dataclass
+from datetime import datetime, timedelta
 from typing import Literal, Self
 
+import asyncpg
 from asyncpg import Record
+from asyncpg.pool import PoolConnectionProxy
 
-from chioricord.api import DBTable
+from chioricord.api import ChioDB, CopyBuffer, DBTable, Leaderboard
 
 # Будет капать на баланс каждый день
+# Начисляется через CoinsTable.accrue_interest
 DEPOSIT_PERCENT = 0.05
+# Депозит хранится в колонке INTEGER, потому проценты не начисляются
+# сверх этого значения
+MAX_DEPOSIT = 2**31 - 1
 
 
 @dataclass(slots=True, frozen=True)
@@ -41,11 +49,77 @@ class UserCoins:
         return cls(int(row[0]), int(row[1]), int(row[2]))
 
 
+@dataclass(slots=True, frozen=True)
+class InterestRun:
+    """Результат начисления процентов по депозиту.
+
+    - days: За сколько дней начислены проценты.
+    - rows: Сколько депозитов было изменено.
+    - duration: Время выполнения в миллисекундах.
+    - last_run: Момент, до которого начислены проценты.
+    """
+
+    days: int
+    rows: int
+    duration: float
+    last_run: datetime
+
+
+LedgerOp = Literal[
+    "give", "take", "move", "deposit", "withdraw", "interest", "market"
+]
+
+
+@dataclass(slots=True, frozen=True)
+class LedgerEntry:
+    """Запись в журнале операций с монетами.
+
+    - user_id: Чей баланс изменился.
+    - other_id: Второй участник перевода, если есть.
+    - op: Тип операции.
+    - amount: Сумма операции. Отрицательная, если монеты списаны.
+    - created_at: Когда была проведена операция.
+    """
+
+    user_id: int
+    other_id: int | None
+    op: LedgerOp
+    amount: int
+    created_at: datetime
+
+    @classmethod
+    def from_row(cls, row: Record) -> Self:
+        """Собирает значение из строки базы данных."""
+        return cls(row[1], row[2], row[3], row[4], row[5])
+
+
 OrderBy = Literal["amount", "deposit", "amount+deposit"]
+_ORDER_BY: tuple[OrderBy, ...] = ("amount", "deposit", "amount+deposit")
+Executor = asyncpg.Pool | PoolConnectionProxy
 
 
 class CoinsTable(DBTable, table="coins"):
-    """Таблица монет пользователя."""
+    """Таблица монет пользователя.
+
+    Все операции с монетами записываются в журнал `coin_ledger`.
+    Записи журнала накапливаются в памяти и сохраняются пачками, чтобы
+    операции не ждали дополнительной записи в базу данных.
+    """
+
+    def __init__(self, db: ChioDB) -> None:
+        super().__init__(db)
+        self.last_interest: InterestRun | None = None
+        self.ledger = CopyBuffer(
+            db,
+            "coin_ledger",
+            ("user_id", "other_id", "op", "amount", "created_at"),
+            batch_size=200,
+            interval=0.5,
+        )
+        self._boards = {
+            order_by: Leaderboard(db, "coins", order_by, UserCoins.from_row)
+            for order_by in _ORDER_BY
+        }
 
     async def create_table(self) -> None:
         """Создаёт таблицу для базы данных."""
@@ -55,23 +129,82 @@ class CoinsTable(DBTable, table="coins"):
             '"amount"	INTEGER NOT NULL,'
             '"deposit"	INTEGER NOT NULL);'
         )
-
-    async def get_leaders(self, order_by: OrderBy) -> list[UserCoins]:
-        """Собирает таблицу лидеров по количеству монет."""
-        cur = await self.pool.fetch(
-            f"SELECT * FROM coins ORDER BY {order_by} DESC LIMIT 10"
+        await self.pool.execute(
+            "CREATE TABLE IF NOT EXISTS coins_interest ("
+            "id INTEGER PRIMARY KEY DEFAULT 1,"
+            "last_run TIMESTAMP NOT NULL)"
         )
-        return [UserCoins.from_row(row) for row in cur]
-
-    async def get_position(self, user_id: int) -> int | None:
-        """Таблица лидеров по сообщениям."""
+        await self.pool.execute(
+            "INSERT INTO coins_interest VALUES(1, $1) "
+            "ON CONFLICT (id) DO NOTHING",
+            datetime.now(),
+        )
+        await self.pool.execute(
+            "CREATE TABLE IF NOT EXISTS coin_ledger ("
+            "id BIGSERIAL PRIMARY KEY,"
+            "user_id BIGINT NOT NULL,"
+            "other_id BIGINT,"
+            "op VARCHAR(16) NOT NULL,"
+            "amount INTEGER NOT NULL,"
+            "created_at TIMESTAMP NOT NULL DEFAULT NOW())"
+        )
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS coin_ledger_user_idx "
+            "ON coin_ledger (user_id, created_at)"
+        )
+        # Индексы для таблиц лидеров
+        for name, order_by in zip(
+            ("amount", "deposit", "balance"), _ORDER_BY, strict=True
+        ):
+            await self.pool.execute(
+                f"CREATE INDEX IF NOT EXISTS coins_{name}_idx "
+                f"ON coins (({order_by}), user_id)"
+            )
+
+    async def load(self) -> None:
+        """Запускает запись журнала операций."""
+        self.ledger.start()
+
+    async def close(self) -> None:
+        """Сохраняет оставшиеся записи журнала операций."""
+        await self.ledger.close()
+
+    def _log(
+        self,
+        user_id: int,
+        op: LedgerOp,
+        amount: int,
+        other_id: int | None = None,
+    ) -> None:
+        self.ledger.add((user_id, other_id, op, amount, datetime.now()))
+
+    async def get_history(
+        self, user_id: int, limit: int = 15
+    ) -> list[LedgerEntry]:
+        """Последние операции с монетами пользователя."""
+        await self.ledger.flush()
         cur = await self.pool.fetch(
-            "SELECT COUNT(*) + 1 AS position FROM coins "
-            "WHERE deposit > (SELECT deposit FROM active "
-            "WHERE user_id = $1)",
+            "SELECT * FROM coin_ledger WHERE user_id=$1 "
+            "ORDER BY created_at DESC LIMIT $2",
             user_id,
+            limit,
         )
-        return int(cur[0][0]) if len(cur) > 0 else None
+        return [LedgerEntry.from_row(row) for row in cur]
+
+    def leaderboard(self, order_by: OrderBy) -> Leaderboard[UserCoins]:
+        """Постраничная таблица лидеров по количеству монет."""
+        return self._boards[order_by]
+
+    async def get_leaders(self, order_by: OrderBy) -> list[UserCoins]:
+        """Собирает таблицу лидеров по количеству монет."""
+        page = await self.leaderboard(order_by).first_page()
+        return page.items
+
+    async def get_position(
+        self, user_id: int, order_by: OrderBy = "deposit"
+    ) -> int | None:
+        """Место пользователя в таблице лидеров."""
+        return await self.leaderboard(order_by).rank(user_id)
 
     async def get_user(self, user_id: int) -> UserCoins | None:
         """Получает пользователя по его id."""
@@ -101,61 +234,50 @@ class CoinsTable(DBTable, table="coins"):
 
     async def set_user(self, coins: UserCoins) -> None:
         """Обновляет данные пользователя."""
-        user = await self.get_user(user_id=coins.user_id)
-        if user is None:
-            await self.create_user(coins)
-            return
         await self.pool.execute(
-            "UPDATE coins SET amount=$1,deposit=$2 WHERE user_id=$3",
+            "INSERT INTO coins VALUES($1,$2,$3) "
+            "ON CONFLICT (user_id) DO UPDATE "
+            "SET amount=EXCLUDED.amount, deposit=EXCLUDED.deposit",
+            coins.user_id,
             coins.amount,
             coins.deposit,
-            coins.user_id,
         )
 
     # Методы изменения данных
     # =======================
+    # Каждая операция выполняется одним условным запросом.
+    # Проверка баланса происходит на стороне базы данных, потому
+    # одновременные операции не могут потерять монеты.
 
-    async def _update_amount(self, user_id: int, amount: int) -> bool:
-        await self.pool.execute(
-            "UPDATE coins SET amount=$1 WHERE user_id=$2", amount, user_id
-        )
-        return True
-
-    async def give(self, user_id: int, amount: int) -> None:
+    async def give(self, user_id: int, amount: int) -> UserCoins:
         """Выдаёт пользователю монеты."""
-        user = await self.get_user(user_id)
-        if user is None:
-            await self.create_user(UserCoins(user_id, amount, 0))
-            return
-        await self._update_amount(user_id, max(user.amount + amount, 0))
+        coins = await _give(self.pool, user_id, amount)
+        self._log(user_id, "give", amount)
+        return coins
 
     async def take(self, user_id: int, amount: int) -> bool:
         """Вычитает монеты с баланса пользователя."""
         if amount < 0:
             return False
-
-        user = await self.get_user(user_id)
-        if user is None or user.amount < amount:
+        if await _take(self.pool, user_id, amount) is None:
             return False
-
-        return await self._update_amount(user_id, user.amount - amount)
+        self._log(user_id, "take", -amount)
+        return True
 
     async def to_deposit(self, user_id: int, amount: int) -> bool:
         """Ложит монеты на депозит."""
         if amount < 0:
             return False
 
-        user = await self.get_user(user_id)
-        if user is None:
-            return False
-        if user.amount < amount:
-            return False
-        await self.pool.execute(
-            "UPDATE coins SET amount=$1, deposit=$2 WHERE user_id=$3",
-            user.amount - amount,
-            user.deposit + amount,
+        cur = await self.pool.fetchrow(
+            "UPDATE coins SET amount=amount-$2, deposit=deposit+$2 "
+            "WHERE user_id=$1 AND amount>=$2 RETURNING *",
             user_id,
+            amount,
         )
+        if cur is None:
+            return False
+        self._log(user_id, "deposit", amount)
         return True
 
     async def from_deposit(self, user_id: int, amount: int) -> bool:
@@ -163,22 +285,106 @@ class CoinsTable(DBTable, table="coins"):
         if amount < 0:
             return False
 
-        user = await self.get_user(user_id)
-        if user is None:
-            return False
-        if user.deposit < amount:
-            return False
-        await self.pool.execute(
-            "UPDATE coins SET amount=$1, deposit=$2 WHERE user_id=$3",
-            user.amount + amount,
-            user.deposit - amount,
+        cur = await self.pool.fetchrow(
+            "UPDATE coins SET amount=amount+$2, deposit=deposit-$2 "
+            "WHERE user_id=$1 AND deposit>=$2 RETURNING *",
             user_id,
+            amount,
         )
+        if cur is None:
+            return False
+        self._log(user_id, "withdraw", amount)
         return True
 
+    async def accrue_interest(self) -> InterestRun:
+        """Начисляет проценты на все депозиты.
+
+        Проценты начисляются одним запросом для всех пользователей.
+        Если начисление было пропущено (к примеру бот был выключен),
+        то проценты начисляются сразу за все пропущенные дни.
+        Начисления записываются в журнал операций тем же запросом.
+        Депозит не может вырасти больше `MAX_DEPOSIT`.
+        """
+        start = time.monotonic()
+        async with self.pool.acquire() as conn, conn.transaction():
+            last_run: datetime = await conn.fetchval(
+                "SELECT last_run FROM coins_interest WHERE id=1 FOR UPDATE"
+            )
+            days = (datetime.now() - last_run).days
+            rows = 0
+            if days > 0:
+                status = await conn.execute(
+                    "WITH interest AS ("
+                    "SELECT user_id, LEAST(floor(deposit * "
+                    "(power(1 + $1::NUMERIC, $2) - 1)), $4::INTEGER - deposit)"
+                    "::INTEGER AS delta "
+                    "FROM coins WHERE deposit > 0"
+                    "), upd AS ("
+                    "UPDATE coins SET deposit = deposit + interest.delta "
+                    "FROM interest WHERE coins.user_id = interest.user_id "
+                    "AND interest.delta > 0 "
+                    "RETURNING coins.user_id, interest.delta"
+                    ") INSERT INTO coin_ledger "
+                    "(user_id, op, amount, created_at) "
+                    "SELECT user_id, 'interest', delta, $3 FROM upd",
+                    DEPOSIT_PERCENT,
+                    days,
+                    datetime.now(),
+                    MAX_DEPOSIT,
+                )
+                rows = int(status.split()[-1])
+                last_run += timedelta(days=days)
+                await conn.execute(
+                    "UPDATE coins_interest SET last_run=$1 WHERE id=1",
+                    last_run,
+                )
+
+        self.last_interest = InterestRun(
+            days, rows, (time.monotonic() - start) * 1000, last_run
+        )
+        return self.last_interest
+
     async def move(self, amount: int, from_id: int, to_id: int) -> bool:
-        """Перемещает монеты между двумя пользователями."""
-        status = await self.take(from_id, amount)
-        if status:
-            await self.give(to_id, amount)
-        return status
+        """Перемещает монеты между двумя пользователями.
+
+        Выполняется в одной транзакции.
+        Записи обоих пользователей блокируются в порядке возрастания ID,
+        чтобы встречные переводы не приводили к взаимной блокировке.
+        """
+        if amount < 0:
+            return False
+
+        async with self.pool.acquire() as conn, conn.transaction():
+            await conn.execute(
+                "SELECT 1 FROM coins WHERE user_id = ANY($1::BIGINT[]) "
+                "ORDER BY user_id FOR UPDATE",
+                sorted({from_id, to_id}),
+            )
+            if await _take(conn, from_id, amount) is None:
+                return False
+            await _give(conn, to_id, amount)
+
+        self._log(from_id, "move", -amount, to_id)
+        self._log(to_id, "move", amount, from_id)
+        return True
+
+
+async def _give(conn: Executor, user_id: int, amount: int) -> UserCoins:
+    cur = await conn.fetchrow(
+        "INSERT INTO coins VALUES($1, GREATEST($2, 0), 0) "
+        "ON CONFLICT (user_id) DO UPDATE "
+        "SET amount=GREATEST(coins.amount + $2, 0) RETURNING *",
+        user_id,
+        amount,
+    )
+    return UserCoins.from_row(cur)  # type: ignore
+
+
+async def _take(conn: Executor, user_id: int, amount: int) -> UserCoins | None:
+    cur = await conn.fetchrow(
+        "UPDATE coins SET amount=amount-$2 "
+        "WHERE user_id=$1 AND amount>=$2 RETURNING *",
+        user_id,
+        amount,
+    )
+    return None if cur is None else UserCoins.from_row(cur)
@@ -6,18 +6,24 @@
 
 Пока что в инвентаре не будет каких-либо ограничений на предметы.
 
-Version: 0.6.1 (13)
+Version: 0.9 (16)
 Author: Milinuri Nirvalen
 """
 
+from collections.abc import Iterable
 from dataclasses import dataclass
 from random import choice
 from typing import Self
 
+import asyncpg
 from asyncpg import Record
+from asyncpg.pool import PoolConnectionProxy
+from loguru import logger
 
 from chioricord.api import ChioDB, DBTable
 
+Executor = asyncpg.Pool | PoolConnectionProxy
+
 
 class ItemIndexError(Exception):
     """При неполадках в базе данных.
@@ -64,6 +70,23 @@ class InventoryItem:
     index: Item
     amount: int
 
+    @classmethod
+    def from_row(cls, row: Record) -> Self:
+        """Собирает предмет из строки индекса и количества предметов.
+
+        Если предмета нет в индексе, он будет помечен как `???`.
+        """
+        if row[1] is None:
+            return cls(Item(int(row[0]), "???", "Без описания", 0), int(row[4]))
+        return cls(Item.from_row(row), int(row[4]))
+
+
+# Предметы инвентаря вместе с информацией о них из индекса
+_SELECT_ITEMS = (
+    "SELECT inv.item_id, i.name, i.description, i.rare, inv.amount "
+    'FROM inventory AS inv LEFT JOIN "index" AS i ON i.id = inv.item_id '
+)
+
 
 # Определение таблиц базы данных
 # ==============================
@@ -73,8 +96,16 @@ class ItemIndex(DBTable, table="index"):
     """Индекс предметов.
 
     Хранит сведения о всех существующих предметах.
+    Индекс небольшой и меняется редко, потому полностью загружается в
+    память при запуске и перезагружается после изменения.
+    Предметы дополнительно сгруппированы по редкости.
     """
 
+    def __init__(self, db: ChioDB) -> None:
+        super().__init__(db)
+        self._items: dict[int, Item] = {}
+        self._rares: dict[int, list[Item]] = {}
+
     async def create_table(self) -> None:
         """Создаёт таблицы для базы данных."""
         await self.pool.execute(
@@ -85,6 +116,18 @@ class ItemIndex(DBTable, table="index"):
             '"rare"	INTEGER DEFAULT 0)'
         )
 
+    async def load(self) -> None:
+        """Загружает индекс предметов в память."""
+        cur = await self.pool.fetch('SELECT * FROM "index" ORDER BY id')
+        items = [Item.from_row(row) for row in cur]
+        rares: dict[int, list[Item]] = {}
+        for item in items:
+            rares.setdefault(item.rare, []).append(item)
+
+        self._items = {item.item_id: item for item in items}
+        self._rares = rares
+        logger.info("Loaded {} items to index", len(self._items))
+
     async def get_index(self, rare: int | None = None) -> list[Item]:
         """Возвращает список предметов из индекса.
 
@@ -92,48 +135,43 @@ class ItemIndex(DBTable, table="index"):
         необходимо собрать список предметов.
         """
         if rare is not None:
-            items = await self.pool.fetch(
-                "SELECT * FROM 'index' WHERE rare=?", (rare,)
-            )
-        else:
-            items = await self.pool.fetch("SELECT * FROM 'index'")
-        return [Item.from_row(row) for row in items]
+            return list(self._rares.get(rare, ()))
+        return list(self._items.values())
 
     async def get(self, id: int) -> Item | None:
         """Получает информацию о предмете по его id.
 
         Если такого предмета нет. вернёт None.
         """
-        cur = await self.pool.fetchrow("SELECT * FROM 'index' WHERE id=$1", id)
-        return None if cur is None else Item.from_row(cur)
+        return self._items.get(id)
 
     async def get_or_create(self, id: int) -> Item:
         """Получает информацию о предмете по его id.
 
         Если такого предмета нет. вернёт None.
         """
-        item = await self.get(id)
+        item = self._items.get(id)
         return Item.new("???") if item is None else item
 
     async def get_random(self, rare: int) -> Item | None:
         """Получает случайные предметы по их редкости."""
-        cur = await self.pool.fetch("SELECT * FROM 'index' WHERE rare=$1", rare)
-        if len(cur) == 0:
-            return None
-        return Item.from_row(choice(cur))
+        items = self._rares.get(rare)
+        return None if not items else choice(items)
 
     async def add(self, item: Item) -> None:
         """Добавляет новый предмет в индекс."""
         await self.pool.execute(
-            "INSERT INTO 'index' (name,description,rare) VALUES($1,$2,$3)",
+            'INSERT INTO "index" (name,description,rare) VALUES($1,$2,$3)',
             item.name,
             item.description,
             item.rare,
         )
+        await self.load()
 
     async def remove(self, item_id: int) -> None:
         """удаляет предмет из индекса по его id."""
-        await self.pool.execute("DELETE FROM 'index' WHERE id=$1", item_id)
+        await self.pool.execute('DELETE FROM "index" WHERE id=$1', item_id)
+        await self.load()
 
 
 class Inventory(DBTable, table="inventory"):
@@ -161,54 +199,65 @@ class Inventory(DBTable, table="inventory"):
         """Создаёт таблицы для базы данных."""
         await self.pool.execute(
             'CREATE TABLE IF NOT EXISTS "inventory" ('
-            '"user_id"	BIGINT,'
-            '"item_id"	INTEGER,'
-            '"amount"   INTEGER,'
+            '"user_id"	BIGINT NOT NULL,'
+            '"item_id"	INTEGER NOT NULL,'
+            '"amount"   INTEGER NOT NULL,'
+            'PRIMARY KEY ("user_id", "item_id"),'
             'FOREIGN KEY("item_id") REFERENCES "index"("id")'
             "ON UPDATE CASCADE)"
         )
+        # Раньше у таблицы не было первичного ключа
+        # Одинаковые предметы пользователя складываются в одну запись
+        await self.pool.execute(
+            "DO $$ BEGIN "
+            "IF NOT EXISTS (SELECT 1 FROM pg_constraint "
+            "WHERE conrelid = 'inventory'::regclass AND contype = 'p') THEN "
+            "WITH old AS (DELETE FROM inventory RETURNING *) "
+            "INSERT INTO inventory SELECT user_id, item_id, SUM(amount) "
+            "FROM old WHERE user_id IS NOT NULL AND item_id IS NOT NULL "
+            "GROUP BY user_id, item_id HAVING SUM(amount) > 0; "
+            "ALTER TABLE inventory ALTER COLUMN amount SET NOT NULL, "
+            "ADD PRIMARY KEY (user_id, item_id); "
+            "END IF; END $$"
+        )
 
     # Методы получения данных из инвентаря
     # ====================================
 
     async def get(self, user_id: int) -> list[InventoryItem]:
-        """Получает инвентарь пользователя."""
-        items = await self.pool.fetch(
-            "SELECT item_id, amount FROM inventory WHERE user_id=$1", user_id
+        """Получает инвентарь пользователя.
+
+        Информация о предметах получается тем же запросом.
+        """
+        cur = await self.pool.fetch(
+            _SELECT_ITEMS + "WHERE inv.user_id=$1", user_id
         )
-        return [
-            InventoryItem(
-                await self.index.get_or_create(int(item[0])), int(item[1])
-            )
-            for item in items
-        ]
+        return [InventoryItem.from_row(row) for row in cur]
 
     async def get_item(
         self, user_id: int, item_id: int
     ) -> InventoryItem | None:
         """получает информацию о предмете из инвентаря пользователя."""
         cur = await self.pool.fetchrow(
-            "SELECT item_id, amount FROM inventory "
-            "WHERE user_id=$1 AND item_id=$2",
+            _SELECT_ITEMS + "WHERE inv.user_id=$1 AND inv.item_id=$2",
             user_id,
             item_id,
         )
         if cur is None:
             return None
-
-        index_item = await self.index.get(int(cur[0]))
-        if index_item is None:
+        if cur[1] is None:
             raise ItemIndexError(f"{cur[0]} not found in Index DB.")
-        return InventoryItem(index_item, int(cur[1]))
+        return InventoryItem.from_row(cur)
 
     # Примитивные методы
     # ==================
 
     async def add(self, user_id: int, item_id: int, amount: int) -> None:
-        """Добавляет предметы в инвентарь пользователю."""
-        await self.pool.execute(
-            "INSERT INTO inventory VALUES($1, $2, $3)", user_id, item_id, amount
-        )
+        """Добавляет предметы в инвентарь пользователю.
+
+        Если предмет уже есть в инвентаре, количество складывается.
+        """
+        await _give(self.pool, user_id, item_id, amount)
 
     async def remove(self, user_id: int, item_id: int) -> None:
         """удаляет предметы из инвентаря пользователя."""
@@ -229,42 +278,90 @@ class Inventory(DBTable, table="inventory"):
 
     async def give(self, user_id: int, item_id: int, amount: int) -> None:
         """Выдаёт пользователю предметы."""
-        in_inventory = await self.get_item(user_id, item_id)
-        if in_inventory is None:
-            await self.add(user_id, item_id, amount)
-        else:
-            await self.pool.execute(
-                "UPDATE inventory SET amount=$1 "
-                "WHERE user_id=$2 AND item_id=$3",
-                in_inventory.amount + amount,
-                user_id,
-                item_id,
-            )
+        await _give(self.pool, user_id, item_id, amount)
+
+    async def give_many(
+        self, user_id: int, items: Iterable[tuple[int, int]]
+    ) -> None:
+        """Выдаёт пользователю сразу несколько предметов.
+
+        Принимает пары из ID предмета и количества.
+        Все предметы выдаются одним запросом.
+        """
+        amounts: dict[int, int] = {}
+        for item_id, amount in items:
+            amounts[item_id] = amounts.get(item_id, 0) + amount
+        if not amounts:
+            return
+
+        await self.pool.execute(
+            "INSERT INTO inventory "
+            "SELECT $1, item_id, amount "
+            "FROM unnest($2::INTEGER[], $3::INTEGER[]) AS d(item_id, amount) "
+            "ON CONFLICT (user_id, item_id) DO UPDATE "
+            "SET amount = inventory.amount + EXCLUDED.amount",
+            user_id,
+            list(amounts.keys()),
+            list(amounts.values()),
+        )
 
     async def take(
         self, user_id: int, item_id: int, amount: int
     ) -> InventoryItem | None:
         """Забирает предметы из инвентаря пользователя."""
-        in_inventory = await self.get_item(user_id, item_id)
-        if in_inventory is None or amount > in_inventory.amount:
-            return None
-        if amount == in_inventory.amount:
-            await self.remove(user_id, item_id)
-            return in_inventory
-        await self.pool.execute(
-            "UPDATE inventory SET amount=$1 WHERE user_id=$2 AND item_id=$3",
-            in_inventory.amount - amount,
-            user_id,
-            item_id,
-        )
-        return InventoryItem(in_inventory.index, amount)
+        async with self.pool.acquire() as conn, conn.transaction():
+            return await _take(conn, user_id, item_id, amount)
 
     async def move(
         self, item_id: int, amount: int, from_user: int, to_user: int
     ) -> bool:
-        """Передаёт предметы между инвентарями."""
-        take_item = await self.take(from_user, item_id, amount)
-        if take_item is None:
-            return False
-        await self.give(to_user, item_id, amount)
+        """Передаёт предметы между инвентарями.
+
+        Выполняется в одной транзакции.
+        """
+        async with self.pool.acquire() as conn, conn.transaction():
+            if await _take(conn, from_user, item_id, amount) is None:
+                return False
+            await _give(conn, to_user, item_id, amount)
         return True
+
+
+async def _give(
+    conn: Executor, user_id: int, item_id: int, amount: int
+) -> None:
+    await conn.execute(
+        "INSERT INTO inventory VALUES($1, $2, $3) "
+        "ON CONFLICT (user_id, item_id) DO UPDATE "
+        "SET amount = inventory.amount + EXCLUDED.amount",
+        user_id,
+        item_id,
+        amount,
+    )
+
+
+async def _take(
+    conn: Executor, user_id: int, item_id: int, amount: int
+) -> InventoryItem | None:
+    if amount < 0:
+        return None
+
+    # Информация о предмете возвращается тем же запросом
+    cur = await conn.fetchrow(
+        "UPDATE inventory AS inv SET amount=inv.amount-$3 "
+        'FROM "index" AS i WHERE i.id = inv.item_id '
+        "AND inv.user_id=$1 AND inv.item_id=$2 AND inv.amount>=$3 "
+        "RETURNING inv.item_id, i.name, i.description, i.rare, inv.amount",
+        user_id,
+        item_id,
+        amount,
+    )
+    if cur is None:
+        return None
+    if cur[4] == 0:
+        await conn.execute(
+            "DELETE FROM inventory WHERE user_id=$1 AND item_id=$2 "
+            "AND amount<=0",
+            user_id,
+            item_id,
+        )
+    return InventoryItem(Item.from_row(cur), amount)
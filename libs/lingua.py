@@ -2,7 +2,7 @@
 
 До тех пор, пока не появится нормальная поддержка хранилища сервера.
 
-Version: v1.0.1 (9)
+Version: v1.1 (10)
 Author: Milinuri Nirvalen
 """
 
@@ -104,18 +104,27 @@ class CreateUserEvent(DBEvent):
 
 
 class ChatTable(DBTable, table="chat"):
-    """Таблица чатов с ии для гильдии."""
+    """Таблица чатов с ии для гильдии.
+
+    Все выбранные чаты загружаются в память при запуске, потому
+    обработка сообщений не обращается к базе данных.
+    Память обновляется вместе с базой данных в `set_chat`.
+    """
 
     def __init__(self, db: ChioDB) -> None:
         super().__init__(db)
+        self._chats: dict[int, ChatGuild] = {}
+        self._loaded = False
         self._db.client.add_injection_hook(self.chat_injector)
 
     async def chat_injector(
         self, ctx: ChioContext, inj_ctx: arc.InjectorOverridingContext
     ) -> None:
-        """Предоставляет роль пользователя в arc inject."""
-        logger.debug("Try to get user with id {}", ctx.user.id)
-        chat = await self.get_or_create(ctx.user.id)
+        """Предоставляет чат сервера в arc inject.
+
+        В личных сообщениях предоставляет пустой чат с guild_id 0.
+        """
+        chat = await self.get_cached(ctx.guild_id or 0)
         inj_ctx.set_type_dependency(ChatGuild, chat)
 
     async def create_table(self) -> None:
@@ -126,22 +135,24 @@ class ChatTable(DBTable, table="chat"):
             "chat_channel BIGINT)"
         )
 
-    async def _create_chat(self, chat: ChatGuild) -> None:
-        """Create a new user record in the database."""
-        await self.pool.execute(
-            f"INSERT INTO {self.__tablename__} VALUES($1,$2)",
-            chat.guild_id,
-            chat.chat_channel,
-        )
-
-    async def _set_chat(self, chat: ChatGuild) -> None:
-        """Update user record in the database."""
-        await self.pool.execute(
-            f"UPDATE {self.__tablename__} SET chat_channel=$1 "
-            "WHERE guild_id=$2",
-            chat.chat_channel,
-            chat.guild_id,
-        )
+    async def load(self) -> None:
+        """Загружает выбранные чаты серверов в память."""
+        self._chats = {
+            chat.guild_id: chat
+            for chat in await self.get_chats()
+            if chat.chat_channel is not None
+        }
+        self._loaded = True
+        logger.info("Loaded {} AI chats", len(self._chats))
+
+    def is_chat(self, guild_id: int, channel_id: int) -> bool:
+        """Проверяет, выбран ли канал для общения с ИИ.
+
+        Не обращается к базе данных.
+        Работает только после загрузки таблицы.
+        """
+        chat = self._chats.get(guild_id)
+        return chat is not None and chat.chat_channel == channel_id
 
     async def get_chats(self) -> list[ChatGuild]:
         """Retrieve items by parameter from the database."""
@@ -162,16 +173,31 @@ class ChatTable(DBTable, table="chat"):
             return chat
         return ChatGuild(guild_id, None)
 
+    async def get_cached(self, guild_id: int) -> ChatGuild:
+        """Получает чат сервера из памяти.
+
+        До загрузки таблицы получает чат из базы данных.
+        """
+        if not self._loaded:
+            return await self.get_or_create(guild_id)
+        return self._chats.get(guild_id) or ChatGuild(guild_id, None)
+
     async def set_chat(
         self, guild_id: int, chat_channel: int | None = None
     ) -> ChatGuild:
         """Устанавливает чат для общения."""
-        chat = await self.get_chat(guild_id)
         new_chat = ChatGuild(guild_id, chat_channel)
-        if chat is None:
-            await self._create_chat(new_chat)
+        await self.pool.execute(
+            f"INSERT INTO {self.__tablename__} VALUES($1,$2) "
+            "ON CONFLICT (guild_id) DO UPDATE "
+            "SET chat_channel = EXCLUDED.chat_channel",
+            guild_id,
+            chat_channel,
+        )
+        if chat_channel is None:
+            self._chats.pop(guild_id, None)
         else:
-            await self._set_chat(new_chat)
+            self._chats[guild_id] = new_chat
         return new_chat
 
 
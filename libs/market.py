@@ -0,0 +1,435 @@
+"""Торговая площадка предметов.
+
+Пользователи выставляют заявки на покупку и продажу предметов из
+индекса за монеты.
+Заявки сопоставляются в памяти через `libs.orderbook`, а заключённые
+сделки сохраняются пачками, каждая пачка в одной транзакции.
+
+При выставлении заявки её стоимость сразу резервируется: продавец
+отдаёт предметы, а покупатель монеты.
+Потому сохранение сделок только начисляет предметы и монеты и не
+может завершиться из-за нехватки средств.
+
+Version: v1.1.1 (3)
+Author: Milinuri Nirvalen
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from asyncpg import DataError, IntegrityConstraintViolationError
+from loguru import logger
+
+from chioricord.api import ChioDB, DBTable
+from libs.orderbook import MatchingEngine, MatchStats, Order, Side, Trade
+
+# Как часто сохранять сделки в секундах
+_SETTLE_INTERVAL = 1.0
+# Сколько сделок может накопиться до внеочередного сохранения
+_SETTLE_SIZE = 200
+# После скольких неудачных попыток сделки сохраняются по одной
+_SETTLE_RETRIES = 3
+# Стоимость заявки хранится в колонках INTEGER
+_MAX_INTEGER = 2**31 - 1
+
+
+@dataclass(slots=True)
+class SettleStats:
+    """Статистика сохранения сделок.
+
+    - batches: Сколько пачек сделок было сохранено.
+    - trades: Сколько сделок было сохранено.
+    - duration: Сколько всего заняло сохранение в секундах.
+    - errors: Сколько раз сохранение завершилось ошибкой.
+    - dropped: Сколько сделок не удалось сохранить из-за ошибок в
+      данных самих сделок.
+    """
+
+    batches: int = 0
+    trades: int = 0
+    duration: float = 0
+    errors: int = 0
+    dropped: int = 0
+
+
+class MarketTable(DBTable, table="market_orders"):
+    """Заявки и сделки торговой площадки.
+
+    Активные заявки хранятся в `market_orders`, а заключённые
+    сделки в `market_trades`.
+    При запуске стаканы заявок собираются заново из базы данных.
+    """
+
+    def __init__(self, db: ChioDB) -> None:
+        super().__init__(db)
+        self.engine = MatchingEngine()
+        self.settle_stats = SettleStats()
+        self._pending: list[Trade] = []
+        self._failures = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._stop = asyncio.Event()
+        self._settle_task: asyncio.Task[None] | None = None
+
+    @property
+    def match_stats(self) -> MatchStats:
+        """Статистика сопоставления заявок."""
+        return self.engine.stats
+
+    async def create_table(self) -> None:
+        """Создаёт таблицы для базы данных."""
+        await self.pool.execute(
+            "CREATE TABLE IF NOT EXISTS market_orders ("
+            "id BIGSERIAL PRIMARY KEY,"
+            "user_id BIGINT NOT NULL,"
+            "item_id INTEGER NOT NULL,"
+            "side VARCHAR(4) NOT NULL,"
+            "price INTEGER NOT NULL,"
+            "amount INTEGER NOT NULL,"
+            "created_at TIMESTAMP NOT NULL DEFAULT NOW())"
+        )
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS market_orders_user_idx "
+            "ON market_orders (user_id)"
+        )
+        await self.pool.execute(
+            "CREATE TABLE IF NOT EXISTS market_trades ("
+            "id BIGSERIAL PRIMARY KEY,"
+            "item_id INTEGER NOT NULL,"
+            "buy_id BIGINT NOT NULL,"
+            "sell_id BIGINT NOT NULL,"
+            "buyer_id BIGINT NOT NULL,"
+            "seller_id BIGINT NOT NULL,"
+            "price INTEGER NOT NULL,"
+            "amount INTEGER NOT NULL,"
+            "created_at TIMESTAMP NOT NULL DEFAULT NOW())"
+        )
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS market_trades_item_idx "
+            "ON market_trades (item_id, created_at)"
+        )
+
+    async def load(self) -> None:
+        """Собирает стаканы заявок и запускает сохранение сделок.
+
+        Заявки добавляются в порядке выставления.
+        Если бот был выключен до сохранения сделок, то заявки снова
+        сопоставятся и сделки будут сохранены заново.
+        """
+        cur = await self.pool.fetch("SELECT * FROM market_orders ORDER BY id")
+        for row in cur:
+            self._pending.extend(
+                self.engine.submit(
+                    Order(row[0], row[1], row[2], row[3], row[4], row[5])
+                )
+            )
+        logger.info("Loaded {} market orders", len(self.engine))
+        self._stop.clear()
+        self._task = asyncio.create_task(self._settle_loop())
+        if self._pending:
+            await self.settle()
+
+    async def close(self) -> None:
+        """Сохраняет оставшиеся сделки.
+
+        Цикл сохранения не отменяется посреди транзакции, а дожидается
+        окончания текущего сохранения и останавливается сам.
+        """
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.settle()
+
+    # Заявки
+    # ======
+
+    async def place(
+        self, user_id: int, item_id: int, side: Side, price: int, amount: int
+    ) -> tuple[Order, list[Trade]] | None:
+        """Выставляет заявку на покупку или продажу предмета.
+
+        Стоимость заявки резервируется в той же транзакции, в которой
+        заявка сохраняется.
+        Возвращает None, если у пользователя недостаточно предметов
+        или монет.
+        """
+        if price <= 0 or amount <= 0:
+            return None
+        if price * amount > _MAX_INTEGER:
+            raise ValueError("Order total does not fit into INTEGER")
+
+        async with self.pool.acquire() as conn, conn.transaction():
+            if side == "sell":
+                reserved = await conn.fetchval(
+                    "UPDATE inventory SET amount=amount-$3 "
+                    "WHERE user_id=$1 AND item_id=$2 AND amount>=$3 "
+                    "RETURNING amount",
+                    user_id,
+                    item_id,
+                    amount,
+                )
+                if reserved == 0:
+                    await conn.execute(
+                        "DELETE FROM inventory "
+                        "WHERE user_id=$1 AND item_id=$2 AND amount<=0",
+                        user_id,
+                        item_id,
+                    )
+            else:
+                reserved = await conn.fetchval(
+                    "UPDATE coins SET amount=amount-$2 "
+                    "WHERE user_id=$1 AND amount>=$2 RETURNING amount",
+                    user_id,
+                    price * amount,
+                )
+                if reserved is not None:
+                    await conn.execute(
+                        "INSERT INTO coin_ledger "
+                        "(user_id, op, amount, created_at) "
+                        "VALUES($1, 'market', $2, $3)",
+                        user_id,
+                        -price * amount,
+                        datetime.now(),
+                    )
+            if reserved is None:
+                return None
+
+            order_id = await conn.fetchval(
+                "INSERT INTO market_orders "
+                "(user_id, item_id, side, price, amount) "
+                "VALUES($1, $2, $3, $4, $5) RETURNING id",
+                user_id,
+                item_id,
+                side,
+                price,
+                amount,
+            )
+
+        order = Order(order_id, user_id, item_id, side, price, amount)
+        trades = self.engine.submit(order)
+        if trades:
+            self._push(trades)
+        return order, trades
+
+    async def cancel(self, user_id: int, order_id: int) -> Order | None:
+        """Снимает заявку пользователя и возвращает её резерв.
+
+        Заявка сразу перестаёт исполняться, чтобы встречные заявки не
+        забрали уже возвращённый резерв.
+        Если сохранить сделки или снять заявку в базе данных не
+        удалось, заявка возвращается в стакан.
+        Возвращает None, если у пользователя нет такой заявки.
+        """
+        order = self.engine.get(order_id)
+        if order is None or order.user_id != user_id:
+            return None
+        left = self.engine.cancel(order_id)
+        if left is None:
+            return None
+
+        try:
+            # Все сделки по заявке должны быть сохранены до возврата
+            await self.settle()
+            return await self._cancel(order_id)
+        except BaseException:
+            trades = self.engine.restore(left)
+            if trades:
+                self._push(trades)
+            raise
+
+    async def _cancel(self, order_id: int) -> Order | None:
+        async with self.pool.acquire() as conn, conn.transaction():
+            row = await conn.fetchrow(
+                "DELETE FROM market_orders WHERE id=$1 RETURNING *", order_id
+            )
+            if row is None:
+                return None
+            left = Order(row[0], row[1], row[2], row[3], row[4], row[5])
+            if left.side == "sell":
+                await conn.execute(
+                    "INSERT INTO inventory VALUES($1, $2, $3) "
+                    "ON CONFLICT (user_id, item_id) DO UPDATE "
+                    "SET amount = inventory.amount + EXCLUDED.amount",
+                    left.user_id,
+                    left.item_id,
+                    left.amount,
+                )
+            else:
+                await conn.execute(
+                    "INSERT INTO coins VALUES($1, $2, 0) "
+                    "ON CONFLICT (user_id) DO UPDATE "
+                    "SET amount = coins.amount + EXCLUDED.amount",
+                    left.user_id,
+                    left.price * left.amount,
+                )
+                await conn.execute(
+                    "INSERT INTO coin_ledger "
+                    "(user_id, op, amount, created_at) "
+                    "VALUES($1, 'market', $2, $3)",
+                    left.user_id,
+                    left.price * left.amount,
+                    datetime.now(),
+                )
+        return left
+
+    def user_orders(self, user_id: int) -> list[Order]:
+        """Активные заявки пользователя."""
+        return sorted(
+            self.engine.user_orders(user_id), key=lambda o: o.order_id
+        )
+
+    # Сохранение сделок
+    # =================
+
+    async def _settle_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), _SETTLE_INTERVAL)
+            except TimeoutError:
+                pass
+            try:
+                await self.settle()
+            except Exception as e:
+                logger.exception(e)
+
+    def _push(self, trades: list[Trade]) -> None:
+        self._pending.extend(trades)
+        if len(self._pending) >= _SETTLE_SIZE and (
+            self._settle_task is None or self._settle_task.done()
+        ):
+            self._settle_task = asyncio.create_task(self.settle())
+
+    async def settle(self) -> None:
+        """Сохраняет накопленные сделки в одной транзакции.
+
+        Уменьшает остаток заявок, записывает сделки, начисляет монеты
+        продавцам и предметы покупателям.
+        Если сохранение не удалось, сделки вернутся в очередь.
+        После нескольких неудачных попыток подряд сделки сохраняются
+        по одной, а сделки с ошибкой в данных отбрасываются.
+        """
+        async with self._lock:
+            if not self._pending:
+                return
+
+            trades, self._pending = self._pending, []
+            start = time.monotonic()
+            saved = len(trades)
+            try:
+                if self._failures >= _SETTLE_RETRIES:
+                    saved -= await self._settle_each(trades)
+                else:
+                    await self._settle(trades)
+            except BaseException:
+                self._failures += 1
+                self.settle_stats.errors += 1
+                self._pending = trades + self._pending
+                raise
+
+            self._failures = 0
+            self.settle_stats.batches += 1
+            self.settle_stats.trades += saved
+            self.settle_stats.duration += time.monotonic() - start
+
+    async def _settle_each(self, trades: list[Trade]) -> int:
+        # Сохранённые сделки убираются из списка, чтобы при ошибке
+        # в очередь вернулись только оставшиеся
+        dropped = 0
+        while trades:
+            trade = trades[0]
+            try:
+                await self._settle([trade])
+            except (DataError, IntegrityConstraintViolationError) as e:
+                logger.error("Drop market trade {}: {}", trade, e)
+                self.settle_stats.dropped += 1
+                dropped += 1
+            del trades[0]
+        return dropped
+
+    async def _settle(self, trades: list[Trade]) -> None:
+        now = datetime.now()
+        filled: dict[int, int] = {}
+        coins: dict[int, int] = {}
+        items: dict[tuple[int, int], int] = {}
+        ledger: list[tuple[int, int | None, str, int, datetime]] = []
+        for t in trades:
+            for order in (t.buy, t.sell):
+                filled[order.order_id] = (
+                    filled.get(order.order_id, 0) + t.amount
+                )
+            coins[t.sell.user_id] = coins.get(t.sell.user_id, 0) + t.total
+            ledger.append(
+                (t.sell.user_id, t.buy.user_id, "market", t.total, now)
+            )
+            if t.refund > 0:
+                coins[t.buy.user_id] = coins.get(t.buy.user_id, 0) + t.refund
+                ledger.append((t.buy.user_id, None, "market", t.refund, now))
+            key = (t.buy.user_id, t.sell.item_id)
+            items[key] = items.get(key, 0) + t.amount
+
+        async with self.pool.acquire() as conn, conn.transaction():
+            await conn.execute(
+                "UPDATE market_orders AS o SET amount = o.amount - d.filled "
+                "FROM unnest($1::BIGINT[], $2::INTEGER[]) AS d(id, filled) "
+                "WHERE o.id = d.id",
+                list(filled.keys()),
+                list(filled.values()),
+            )
+            await conn.execute(
+                "DELETE FROM market_orders "
+                "WHERE id = ANY($1::BIGINT[]) AND amount <= 0",
+                list(filled.keys()),
+            )
+            await conn.copy_records_to_table(
+                "market_trades",
+                records=[
+                    (
+                        t.sell.item_id,
+                        t.buy.order_id,
+                        t.sell.order_id,
+                        t.buy.user_id,
+                        t.sell.user_id,
+                        t.price,
+                        t.amount,
+                        now,
+                    )
+                    for t in trades
+                ],
+                columns=(
+                    "item_id",
+                    "buy_id",
+                    "sell_id",
+                    "buyer_id",
+                    "seller_id",
+                    "price",
+                    "amount",
+                    "created_at",
+                ),
+            )
+            await conn.execute(
+                "INSERT INTO coins SELECT user_id, amount, 0 "
+                "FROM unnest($1::BIGINT[], $2::INTEGER[]) "
+                "AS d(user_id, amount) "
+                "ON CONFLICT (user_id) DO UPDATE "
+                "SET amount = coins.amount + EXCLUDED.amount",
+                list(coins.keys()),
+                list(coins.values()),
+            )
+            await conn.copy_records_to_table(
+                "coin_ledger",
+                records=ledger,
+                columns=("user_id", "other_id", "op", "amount", "created_at"),
+            )
+            await conn.execute(
+                "INSERT INTO inventory "
+                "SELECT * FROM unnest($1::BIGINT[], $2::INTEGER[], "
+                "$3::INTEGER[]) "
+                "ON CONFLICT (user_id, item_id) DO UPDATE "
+                "SET amount = inventory.amount + EXCLUDED.amount",
+                [user_id for user_id, _ in items],
+                [item_id for _, item_id in items],
+                list(items.values()),
+            )
@@ -0,0 +1,280 @@
+"""Биржевой стакан для торговой площадки.
+
+Сопоставляет заявки на покупку и продажу предметов в памяти.
+Заявки исполняются по приоритету цены, а при равной цене по времени
+выставления.
+Сделка проходит по цене заявки, которая уже стояла в стакане.
+
+Модуль не работает с базой данных, потому его можно использовать и
+отдельно от бота, к примеру в замерах производительности.
+
+Version: v1.1 (2)
+Author: Milinuri Nirvalen
+"""
+
+import heapq
+import time
+from dataclasses import dataclass
+from itertools import count
+from typing import Literal
+
+Side = Literal["buy", "sell"]
+
+
+@dataclass(slots=True)
+class Order:
+    """Заявка на покупку или продажу предмета.
+
+    - order_id: Уникальный ID заявки.
+    - user_id: Кто выставил заявку.
+    - item_id: Какой предмет покупается или продаётся.
+    - side: Покупка или продажа.
+    - price: Цена за один предмет.
+    - amount: Сколько предметов ещё осталось исполнить.
+    """
+
+    order_id: int
+    user_id: int
+    item_id: int
+    side: Side
+    price: int
+    amount: int
+
+
+@dataclass(slots=True, frozen=True)
+class Trade:
+    """Сделка между двумя заявками.
+
+    - buy: Заявка на покупку.
+    - sell: Заявка на продажу.
+    - price: Цена за один предмет.
+    - amount: Сколько предметов перешло к покупателю.
+    """
+
+    buy: Order
+    sell: Order
+    price: int
+    amount: int
+
+    @property
+    def total(self) -> int:
+        """Сколько монет получает продавец."""
+        return self.price * self.amount
+
+    @property
+    def refund(self) -> int:
+        """Сколько монет возвращается покупателю.
+
+        Покупатель мог предложить цену выше той, по которой прошла
+        сделка.
+        """
+        return (self.buy.price - self.price) * self.amount
+
+
+@dataclass(slots=True)
+class MatchStats:
+    """Статистика сопоставления заявок.
+
+    - orders: Сколько заявок было обработано.
+    - trades: Сколько сделок было заключено.
+    - items: Сколько предметов перешло к покупателям.
+    - duration: Сколько всего заняло сопоставление в секундах.
+    """
+
+    orders: int = 0
+    trades: int = 0
+    items: int = 0
+    duration: float = 0
+
+    @property
+    def orders_per_second(self) -> float:
+        """Сколько заявок обрабатывается в секунду."""
+        return self.orders / self.duration if self.duration else 0
+
+
+@dataclass(slots=True, frozen=True)
+class PriceLevel:
+    """Все заявки одной стороны стакана по одной цене."""
+
+    price: int
+    amount: int
+    orders: int
+
+
+# Элемент кучи: (ключ цены, очерёдность, заявка)
+_Entry = tuple[int, int, Order]
+
+
+class OrderBook:
+    """Стакан заявок одного предмета.
+
+    Каждая сторона хранится в куче, на вершине которой лучшая заявка.
+    Отменённые и исполненные заявки не удаляются из кучи сразу, а
+    пропускаются, когда оказываются на её вершине.
+    """
+
+    __slots__ = ("item_id", "_bids", "_asks", "_seq")
+
+    def __init__(self, item_id: int) -> None:
+        self.item_id = item_id
+        # Цена покупки хранится со знаком минус, чтобы сверху была
+        # самая высокая цена
+        self._bids: list[_Entry] = []
+        self._asks: list[_Entry] = []
+        self._seq = count()
+
+    def _side(self, side: Side) -> list[_Entry]:
+        return self._bids if side == "buy" else self._asks
+
+    @staticmethod
+    def _top(heap: list[_Entry]) -> Order | None:
+        while heap:
+            order = heap[0][2]
+            if order.amount > 0:
+                return order
+            heapq.heappop(heap)
+        return None
+
+    def best_bid(self) -> Order | None:
+        """Заявка на покупку с наибольшей ценой."""
+        return self._top(self._bids)
+
+    def best_ask(self) -> Order | None:
+        """Заявка на продажу с наименьшей ценой."""
+        return self._top(self._asks)
+
+    def submit(self, order: Order) -> list[Trade]:
+        """Исполняет заявку по стоящим в стакане встречным заявкам.
+
+        Неисполненный остаток заявки остаётся в стакане.
+        Возвращает заключённые сделки.
+        """
+        trades: list[Trade] = []
+        buy = order.side == "buy"
+        opposite = self._asks if buy else self._bids
+        while order.amount > 0:
+            best = self._top(opposite)
+            if best is None:
+                break
+            crosses = (
+                best.price <= order.price if buy else best.price >= order.price
+            )
+            if not crosses:
+                break
+
+            amount = min(order.amount, best.amount)
+            order.amount -= amount
+            best.amount -= amount
+            trades.append(
+                Trade(order, best, best.price, amount)
+                if buy
+                else Trade(best, order, best.price, amount)
+            )
+
+        if order.amount > 0:
+            key = -order.price if buy else order.price
+            heapq.heappush(
+                self._side(order.side), (key, next(self._seq), order)
+            )
+        return trades
+
+    def depth(self, side: Side, limit: int = 10) -> list[PriceLevel]:
+        """Лучшие ценовые уровни одной стороны стакана."""
+        levels: list[PriceLevel] = []
+        for _, _, order in sorted(self._side(side)):
+            if order.amount <= 0:
+                continue
+            if levels and levels[-1].price == order.price:
+                last = levels[-1]
+                levels[-1] = PriceLevel(
+                    last.price, last.amount + order.amount, last.orders + 1
+                )
+            elif len(levels) == limit:
+                break
+            else:
+                levels.append(PriceLevel(order.price, order.amount, 1))
+        return levels
+
+
+class MatchingEngine:
+    """Стаканы заявок для всех предметов.
+
+    Держит в памяти все активные заявки и собирает статистику
+    сопоставления.
+    """
+
+    __slots__ = ("_books", "_orders", "stats")
+
+    def __init__(self) -> None:
+        self._books: dict[int, OrderBook] = {}
+        self._orders: dict[int, Order] = {}
+        self.stats = MatchStats()
+
+    def __len__(self) -> int:
+        """Сколько заявок сейчас стоит в стаканах."""
+        return len(self._orders)
+
+    def book(self, item_id: int) -> OrderBook:
+        """Стакан заявок предмета."""
+        book = self._books.get(item_id)
+        if book is None:
+            book = self._books[item_id] = OrderBook(item_id)
+        return book
+
+    def get(self, order_id: int) -> Order | None:
+        """Активная заявка по её ID."""
+        return self._orders.get(order_id)
+
+    def user_orders(self, user_id: int) -> list[Order]:
+        """Активные заявки пользователя."""
+        return [o for o in self._orders.values() if o.user_id == user_id]
+
+    def _submit(self, order: Order) -> list[Trade]:
+        trades = self.book(order.item_id).submit(order)
+        for trade in trades:
+            for filled in (trade.buy, trade.sell):
+                if filled.amount == 0:
+                    self._orders.pop(filled.order_id, None)
+        if order.amount > 0:
+            self._orders[order.order_id] = order
+        return trades
+
+    def submit(self, order: Order) -> list[Trade]:
+        """Исполняет заявку и оставляет её остаток в стакане."""
+        start = time.perf_counter()
+        trades = self._submit(order)
+        self.stats.duration += time.perf_counter() - start
+        self.stats.orders += 1
+        self.stats.trades += len(trades)
+        self.stats.items += sum(t.amount for t in trades)
+        return trades
+
+    def cancel(self, order_id: int) -> Order | None:
+        """Снимает заявку из стакана.
+
+        Возвращает снятую заявку с оставшимся количеством.
+        """
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        # Копия нужна, чтобы стакан пропустил заявку, а вызывающий
+        # узнал сколько предметов осталось
+        left = Order(
+            order.order_id,
+            order.user_id,
+            order.item_id,
+            order.side,
+            order.price,
+            order.amount,
+        )
+        order.amount = 0
+        return left
+
+    def restore(self, order: Order) -> list[Trade]:
+        """Возвращает снятую заявку в стакан.
+
+        Используется, если снять заявку не удалось.
+        Заявка встаёт в очередь заново и может сразу исполниться по
+        встречным заявкам, выставленным пока она была снята.
+        """
+        return self._submit(order)
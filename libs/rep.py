@@ -6,7 +6,7 @@ from typing import Literal, Self
 
 from asyncpg import Record
 
-from chioricord.api import DBTable
+from chioricord.api import ChioDB, DBTable, Leaderboard
 
 _REP_COOLDOWN = timedelta(minutes=10)
 
@@ -36,12 +36,59 @@ class UserReputation:
         return cls(int(row[0]), int(row[1]), int(row[2]), row[3])
 
 
+@dataclass(slots=True, frozen=True)
+class RepVote:
+    """Результат голоса за репутацию.
+
+    - giver: Репутация проголосовавшего.
+      Если голос не засчитан, содержит время окончания перезарядки.
+    - target: Репутация получателя или None, если голос не засчитан.
+    """
+
+    giver: UserReputation
+    target: UserReputation | None
+
+    @property
+    def accepted(self) -> bool:
+        """Засчитан ли голос."""
+        return self.target is not None
+
+
 OrderBy = Literal["positive", "negative"]
 
+# Голос засчитывается, только если у проголосовавшего прошла перезарядка
+# Перезарядка и репутация получателя обновляются одним запросом
+# Если голос не засчитан, возвращается текущая запись проголосовавшего
+_VOTE_SQL = (
+    "WITH giver AS ("
+    "INSERT INTO reputation AS r VALUES($1, 0, 0, $4) "
+    "ON CONFLICT (user_id) DO UPDATE SET next_rep = EXCLUDED.next_rep "
+    "WHERE r.next_rep <= $3 RETURNING *"
+    "), target AS ("
+    "INSERT INTO reputation AS r SELECT $2, $5, $6, $3 FROM giver "
+    "ON CONFLICT (user_id) DO UPDATE "
+    "SET positive = r.positive + EXCLUDED.positive, "
+    "negative = r.negative + EXCLUDED.negative RETURNING *"
+    ") "
+    "SELECT TRUE, * FROM giver "
+    "UNION ALL SELECT FALSE, * FROM target "
+    "UNION ALL SELECT TRUE, * FROM reputation "
+    "WHERE user_id = $1 AND NOT EXISTS (SELECT 1 FROM giver)"
+)
+
 
 class ReputationTable(DBTable, table="reputation"):
     """Репутация пользователя."""
 
+    def __init__(self, db: ChioDB) -> None:
+        super().__init__(db)
+        self._boards = {
+            order_by: Leaderboard(
+                db, "reputation", order_by, UserReputation.from_row
+            )
+            for order_by in ("positive", "negative")
+        }
+
     async def create_table(self) -> None:
         """Создаёт таблицу для базы данных."""
         await self.pool.execute(
@@ -51,23 +98,26 @@ class ReputationTable(DBTable, table="reputation"):
             '"negative"	INTEGER NOT NULL,'
             '"next_rep" TIMESTAMP NOT NULL DEFAULT NOW());'
         )
+        for order_by in self._boards:
+            await self.pool.execute(
+                f"CREATE INDEX IF NOT EXISTS reputation_{order_by}_idx "
+                f"ON reputation ({order_by}, user_id)"
+            )
+
+    def leaderboard(self, order_by: OrderBy) -> Leaderboard[UserReputation]:
+        """Постраничная таблица лидеров по репутации."""
+        return self._boards[order_by]
 
     async def get_leaders(self, order_by: OrderBy) -> list[UserReputation]:
-        """Собирает таблицу лидеров по количеству монет."""
-        cur = await self.pool.fetch(
-            f"SELECT * FROM reputation ORDER BY {order_by} LIMIT 10"
-        )
-        return [UserReputation.from_row(row) for row in cur]
+        """Собирает таблицу лидеров по репутации."""
+        page = await self.leaderboard(order_by).first_page()
+        return page.items
 
-    async def get_position(self, user_id: int) -> int | None:
-        """Таблица лидеров по сообщениям."""
-        cur = await self.pool.fetch(
-            "SELECT COUNT(*) + 1 AS position FROM reputation "
-            "WHERE positive > (SELECT positive FROM reputation "
-            "WHERE user_id = $1)",
-            user_id,
-        )
-        return int(cur[0][0]) if len(cur) > 0 else None
+    async def get_position(
+        self, user_id: int, order_by: OrderBy = "positive"
+    ) -> int | None:
+        """Место пользователя в таблице лидеров."""
+        return await self.leaderboard(order_by).rank(user_id)
 
     async def get_user(self, user_id: int) -> UserReputation | None:
         """Получает пользователя по его id."""
@@ -77,21 +127,25 @@ class ReputationTable(DBTable, table="reputation"):
         return None if cur is None else UserReputation.from_row(cur)
 
     async def get_or_create(self, user_id: int) -> UserReputation:
-        """Получает пользователя или создаёт его."""
+        """Получает пользователя или пустую репутацию.
+
+        Запись в базе данных не создаётся.
+        """
         user = await self.get_user(user_id)
-        if user is not None:
-            return user
-        user = UserReputation(user_id, 0, 0, datetime.now())
-        await self.create_user(user)
-        return user
+        return (
+            user
+            if user is not None
+            else UserReputation(user_id, 0, 0, datetime.now())
+        )
 
     async def create_user(self, user: UserReputation) -> None:
         """Создаёт нового пользователя."""
         await self.pool.execute(
-            "INSERT INTO reputation VALUES($1,$2,$3)",
+            "INSERT INTO reputation VALUES($1,$2,$3,$4)",
             user.user_id,
             user.positive,
             user.negative,
+            user.next_rep,
         )
 
     async def set_user(self, user: UserReputation) -> None:
@@ -105,27 +159,69 @@ class ReputationTable(DBTable, table="reputation"):
             user.user_id,
         )
 
+    async def _add(
+        self, user_id: int, positive: int, negative: int
+    ) -> UserReputation:
+        cur = await self.pool.fetchrow(
+            "INSERT INTO reputation AS r VALUES($1, $2, $3, $4) "
+            "ON CONFLICT (user_id) DO UPDATE "
+            "SET positive = r.positive + EXCLUDED.positive, "
+            "negative = r.negative + EXCLUDED.negative RETURNING *",
+            user_id,
+            positive,
+            negative,
+            datetime.now(),
+        )
+        return UserReputation.from_row(cur)  # type: ignore
+
     async def add_positive(
         self, user_id: int, amount: int = 1
     ) -> UserReputation:
         """Добавляет позитивную репутацию пользователя."""
-        user = await self.get_or_create(user_id)
-        user.positive += amount
-        await self.set_user(user)
-        return user
+        return await self._add(user_id, amount, 0)
 
     async def add_negative(
         self, user_id: int, amount: int = 1
     ) -> UserReputation:
-        """Добавляет позитивную репутацию пользователя."""
-        user = await self.get_or_create(user_id)
-        user.negative += amount
-        await self.set_user(user)
-        return user
+        """Добавляет негативную репутацию пользователя."""
+        return await self._add(user_id, 0, amount)
 
     async def bump_cooldown(self, user_id: int) -> None:
         """Обновляет счётчик перезарядки."""
+        await self.pool.execute(
+            "INSERT INTO reputation VALUES($1, 0, 0, $2) "
+            "ON CONFLICT (user_id) DO UPDATE SET next_rep = EXCLUDED.next_rep",
+            user_id,
+            datetime.now() + _REP_COOLDOWN,
+        )
+
+    async def vote(
+        self, giver_id: int, target_id: int, kind: OrderBy = "positive"
+    ) -> RepVote:
+        """Голос одного пользователя за репутацию другого.
+
+        Проверка перезарядки, изменение репутации получателя и новая
+        перезарядка проголосовавшего выполняются одним запросом.
+        Потому одновременные голоса не могут обойти перезарядку.
+        """
+        if giver_id == target_id:
+            raise ValueError("User can't vote for himself")
+
         now = datetime.now()
-        user = await self.get_or_create(user_id)
-        user.next_rep = now + _REP_COOLDOWN
-        await self.set_user(user)
+        cur = await self.pool.fetch(
+            _VOTE_SQL,
+            giver_id,
+            target_id,
+            now,
+            now + _REP_COOLDOWN,
+            int(kind == "positive"),
+            int(kind == "negative"),
+        )
+        giver: UserReputation | None = None
+        target: UserReputation | None = None
+        for row in cur:
+            if row[0]:
+                giver = UserReputation.from_row(row[1:])
+            else:
+                target = UserReputation.from_row(row[1:])
+        return RepVote(giver, target)  # type: ignore
@@ -4,17 +4,33 @@
 Таймеры используются чтобы блокировать выполнение операций.
 Рекомендуется использовать более длительные таймеры.
 
-Version: v1.0 (1)
+Активные таймеры хранятся в памяти, потому проверка перезарядки не
+обращается к базе данных.
+Изменения записываются в базу данных пачками.
+
+Version: v1.1.1 (3)
 Author: Milinuri Nirvalen
 """
 
+import asyncio
+import heapq
+import time
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Self
 
 from asyncpg import Record
+from loguru import logger
+
+from chioricord.api import ChioDB, DBTable
+
+# Как часто записывать изменения таймеров в секундах
+_FLUSH_INTERVAL = 5
+# Как часто удалять истёкшие таймеры из базы данных в секундах
+_PURGE_INTERVAL = 60
 
-from chioricord.api import DBTable
+# Ключ таймера: (user_id, name)
+_TimerKey = tuple[int, str]
 
 
 @dataclass(frozen=True, slots=True)
@@ -31,73 +47,210 @@ class UserTimer:
         return cls(row[0], row[1], row[2])
 
 
-class ChannelsTable(DBTable, table="timers"):
+class TimersTable(DBTable, table="timers"):
     """Таблица таймеров пользователя.
 
     Пользователь может задавать таймеры на определённое действие.
     Часто используется в других библиотеках.
+
+    Таймеры дополнительно хранятся в куче по времени окончания.
+    Истёкшие таймеры периодически убираются из памяти, а из базы
+    данных удаляются одним запросом.
     """
 
+    def __init__(self, db: ChioDB) -> None:
+        super().__init__(db)
+        self._timers: dict[int, dict[str, datetime]] = {}
+        self._expires: list[tuple[datetime, int, str]] = []
+        # Несохранённые изменения, None для удалённых таймеров
+        self._dirty: dict[_TimerKey, datetime | None] = {}
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task[None] | None = None
+        self._stop = asyncio.Event()
+        self._purged_at = 0.0
+
     async def create_table(self) -> None:
         """Создаёт таблицы для базы данных."""
         await self.pool.execute(
             "CREATE TABLE IF NOT EXISTS timers ("
             "user_id BIGINT NOT NULL,"
             "name VARCHAR(32) NOT NULL,"
-            "reset_tome TIMESTAMP NOT NULL,"
+            "reset_time TIMESTAMP NOT NULL,"
             "PRIMARY KEY (user_id, name))"
         )
+        # Раньше колонка была создана с опечаткой
+        await self.pool.execute(
+            "DO $$ BEGIN "
+            "IF EXISTS (SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'timers' AND column_name = 'reset_tome') "
+            "THEN ALTER TABLE timers RENAME COLUMN reset_tome TO reset_time; "
+            "END IF; END $$"
+        )
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS timers_reset_time_idx "
+            "ON timers (reset_time)"
+        )
+
+    async def load(self) -> None:
+        """Загружает активные таймеры в память."""
+        await self.purge()
+        cur = await self.pool.fetch("SELECT * FROM timers")
+        for row in cur:
+            self._put(UserTimer.from_row(row))
+        logger.info("Loaded {} timers", len(cur))
+        self._stop.clear()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """Сохраняет изменения таймеров.
+
+        Цикл записи не отменяется, а завершается после текущей записи.
+        """
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    # Таймеры в памяти
+    # ================
+
+    def _put(self, timer: UserTimer) -> None:
+        self._timers.setdefault(timer.user_id, {})[timer.name] = (
+            timer.reset_time
+        )
+        heapq.heappush(
+            self._expires, (timer.reset_time, timer.user_id, timer.name)
+        )
+
+    def _drop(self, user_id: int, name: str) -> None:
+        timers = self._timers.get(user_id)
+        if timers is None:
+            return
+        timers.pop(name, None)
+        if not timers:
+            del self._timers[user_id]
+
+    def sweep(self) -> int:
+        """Убирает из памяти истёкшие таймеры.
+
+        Возвращает сколько таймеров было убрано.
+        """
+        now = datetime.now()
+        count = 0
+        while self._expires and self._expires[0][0] <= now:
+            reset_time, user_id, name = heapq.heappop(self._expires)
+            # Таймер мог быть изменён после добавления в кучу
+            if self._timers.get(user_id, {}).get(name) == reset_time:
+                self._drop(user_id, name)
+                count += 1
+        return count
+
+    # Работа с таймерами
+    # ==================
 
     async def get(self, user_id: int, name: str) -> UserTimer | None:
         """Возвращает таймер пользователя по имени."""
-        cur = await self.pool.fetchrow(
-            "SELECT * FROM timers WHERE user_id=$1 AND name=$2",
-            user_id,
-            name,
-        )
-        if cur is None:
+        reset_time = self._timers.get(user_id, {}).get(name)
+        if reset_time is None:
             return None
-
-        timer = UserTimer.from_row(cur)
-        if timer.reset_time <= datetime.now():
-            await self.reset(timer.user_id, timer.name)
+        if reset_time <= datetime.now():
+            self._drop(user_id, name)
             return None
-
-        return timer
+        return UserTimer(user_id, name, reset_time)
 
     async def set(self, timer: UserTimer) -> None:
         """Устанавливает новое значение для таймера."""
-        await self.pool.execute(
-            "INSERT INTO timers (user_id, name, reset_time) "
-            "VALUES ($1, $2, $3) "
-            "ON CONFLICT (user_id, name) DO UPDATE "
-            "SET reset_time = $3;",
-            timer.user_id,
-            timer.name,
-            timer.reset_time,
-        )
+        self._put(timer)
+        self._dirty[(timer.user_id, timer.name)] = timer.reset_time
+
+    async def start(
+        self, user_id: int, name: str, duration: timedelta
+    ) -> UserTimer:
+        """Запускает таймер на указанное время."""
+        timer = UserTimer(user_id, name, datetime.now() + duration)
+        await self.set(timer)
+        return timer
 
     async def reset(self, user_id: int, name: str) -> None:
         """Сбрасывает таймер по имени."""
-        await self.pool.execute(
-            "DELETE FROM timers WHERE user_id=$1 AND name=$2", user_id, name
-        )
+        self._drop(user_id, name)
+        self._dirty[(user_id, name)] = None
 
     async def select(self, user_id: int) -> dict[str, datetime]:
         """Возвращает все таймеры пользователя."""
-        cur = await self.pool.fetch(
-            "SELECT * FROM timers WHERE user_id=$1", user_id
-        )
-        timers: dict[str, datetime] = {}
-        for row in cur:
-            timer = UserTimer.from_row(row)
-            if timer.reset_time <= datetime.now():
-                await self.reset(timer.user_id, timer.name)
-                continue
-
-            timers[timer.name] = timer.reset_time
-        return timers
+        now = datetime.now()
+        return {
+            name: reset_time
+            for name, reset_time in self._timers.get(user_id, {}).items()
+            if reset_time > now
+        }
 
     async def clear(self, user_id: int) -> None:
         """Сбрасывает все таймеры пользователя."""
-        await self.pool.execute("DELETE FROM timers WHERE user_id=$1", user_id)
+        for name in self._timers.pop(user_id, {}):
+            self._dirty[(user_id, name)] = None
+
+    # Запись в базу данных
+    # ====================
+
+    async def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), _FLUSH_INTERVAL)
+            except TimeoutError:
+                pass
+            try:
+                await self.flush()
+                if time.monotonic() - self._purged_at > _PURGE_INTERVAL:
+                    self.sweep()
+                    await self.purge()
+            except Exception as e:
+                logger.exception(e)
+
+    async def flush(self) -> None:
+        """Записывает изменения таймеров в одной транзакции."""
+        async with self._lock:
+            if not self._dirty:
+                return
+
+            dirty, self._dirty = self._dirty, {}
+            changed = [(k, v) for k, v in dirty.items() if v is not None]
+            removed = [k for k, v in dirty.items() if v is None]
+            try:
+                async with self.pool.acquire() as conn, conn.transaction():
+                    if changed:
+                        await conn.execute(
+                            "INSERT INTO timers SELECT * FROM unnest("
+                            "$1::BIGINT[], $2::VARCHAR[], $3::TIMESTAMP[]) "
+                            "ON CONFLICT (user_id, name) DO UPDATE "
+                            "SET reset_time = EXCLUDED.reset_time",
+                            [k[0] for k, _ in changed],
+                            [k[1] for k, _ in changed],
+                            [v for _, v in changed],
+                        )
+                    if removed:
+                        await conn.execute(
+                            "DELETE FROM timers AS t USING unnest("
+                            "$1::BIGINT[], $2::VARCHAR[]) AS d(user_id, name) "
+                            "WHERE t.user_id = d.user_id AND t.name = d.name",
+                            [k[0] for k in removed],
+                            [k[1] for k in removed],
+                        )
+            except BaseException:
+                # В том числе при отмене, иначе изменения будут потеряны
+                # Более новые изменения не перезаписываются
+                for key, value in dirty.items():
+                    self._dirty.setdefault(key, value)
+                raise
+
+    async def purge(self) -> int:
+        """Удаляет истёкшие таймеры из базы данных одним запросом.
+
+        Возвращает количество удалённых таймеров.
+        """
+        status = await self.pool.execute(
+            "DELETE FROM timers WHERE reset_time <= $1", datetime.now()
+        )
+        self._purged_at = time.monotonic()
+        return int(status.split()[-1])
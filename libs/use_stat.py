@@ -1,17 +1,69 @@
 """Статистика использования команд в боте.
 
-Version: v1.1 (4)
+Каждое использование команды записывается в `commands_stat`.
+Периодически новые записи сворачиваются в почасовую статистику по
+серверам и дневную по пользователям.
+Статистика читается только из свёрток, а старые записи удаляются.
+
+Дополнительно сохраняется время выполнения команд.
+
+Version: v1.4.2 (9)
 Author: Milinuri Nirvalen
 """
 
+import asyncio
+import time
 from collections import Counter
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Self
+from datetime import datetime, timedelta
+from typing import Literal, Self
 
 from asyncpg import Record
+from loguru import logger
+
+from chioricord.api import ChioDB, CopyBuffer, DBTable
+from chioricord.timings import CommandStats, Histogram
+
+Period = Literal["day", "week", "month"]
+PERIODS: dict[Period, timedelta] = {
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+    "month": timedelta(days=30),
+}
+
+# Сколько хранятся записи об использовании команд
+RAW_RETENTION = timedelta(days=30)
+# Как часто сворачивать новые записи в секундах
+_ROLLUP_INTERVAL = 300
+# Как часто удалять старые записи в секундах
+_PRUNE_INTERVAL = 3600
+# Как часто сохранять время выполнения команд в секундах
+_TIMINGS_INTERVAL = 300
 
-from chioricord.api import DBTable
+# Сворачивает записи с ID в диапазоне ($1, $2]
+# Команды в личных сообщениях учитываются с guild_id = 0
+_ROLLUP_SQL = (
+    "WITH new AS ("
+    "SELECT * FROM commands_stat WHERE id > $1 AND id <= $2"
+    "), guilds AS ("
+    "INSERT INTO commands_hourly "
+    "SELECT date_trunc('hour', used_at), COALESCE(guild_id, 0), command, "
+    "COUNT(*) FROM new GROUP BY 1, 2, 3 "
+    "ON CONFLICT (hour, guild_id, command) DO UPDATE "
+    "SET count = commands_hourly.count + EXCLUDED.count"
+    ") "
+    "INSERT INTO commands_users_daily "
+    "SELECT used_at::DATE, user_id, command, COUNT(*) "
+    "FROM new GROUP BY 1, 2, 3 "
+    "ON CONFLICT (day, user_id, command) DO UPDATE "
+    "SET count = commands_users_daily.count + EXCLUDED.count"
+)
+
+
+def _since(period: Period | None) -> datetime:
+    if period is None:
+        return datetime.min
+    return datetime.now() - PERIODS[period]
 
 
 @dataclass(frozen=True, slots=True)
@@ -30,7 +82,35 @@ class CommandUsage:
 
 
 class CommandsTable(DBTable, table="commands_stat"):
-    """Таблица использования команд пользователями."""
+    """Таблица использования команд пользователями.
+
+    Использование команд накапливается в памяти и записывается пачками,
+    чтобы команды не ждали записи в базу данных.
+    Если база данных не успевает, лишние записи отбрасываются.
+
+    Статистика строится по свёрткам `commands_hourly` и
+    `commands_users_daily`, потому её стоимость не зависит от того,
+    сколько всего команд было использовано.
+    """
+
+    def __init__(self, db: ChioDB) -> None:
+        super().__init__(db)
+        self.buffer = CopyBuffer(
+            db,
+            "commands_stat",
+            ("user_id", "guild_id", "command", "used_at"),
+            batch_size=200,
+            interval=1.0,
+            max_size=10_000,
+        )
+        self._task: asyncio.Task[None] | None = None
+        self._stop = asyncio.Event()
+        self._pruned_at = 0.0
+
+    @property
+    def dropped(self) -> int:
+        """Сколько записей было отброшено из-за перегрузки."""
+        return self.buffer.dropped
 
     async def create_table(self) -> None:
         """Создаёт таблицы для базы данных."""
@@ -42,20 +122,273 @@ class CommandsTable(DBTable, table="commands_stat"):
             "command TEXT NOT NULL,"
             "used_at TIMESTAMP NOT NULL DEFAULT NOW())"
         )
+        await self.pool.execute(
+            "CREATE TABLE IF NOT EXISTS commands_hourly ("
+            "hour TIMESTAMP NOT NULL,"
+            "guild_id BIGINT NOT NULL,"
+            "command TEXT NOT NULL,"
+            "count INTEGER NOT NULL,"
+            "PRIMARY KEY (hour, guild_id, command))"
+        )
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS commands_hourly_guild_idx "
+            "ON commands_hourly (guild_id, hour)"
+        )
+        await self.pool.execute(
+            "CREATE TABLE IF NOT EXISTS commands_users_daily ("
+            "day DATE NOT NULL,"
+            "user_id BIGINT NOT NULL,"
+            "command TEXT NOT NULL,"
+            "count INTEGER NOT NULL,"
+            "PRIMARY KEY (day, user_id, command))"
+        )
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS commands_users_daily_user_idx "
+            "ON commands_users_daily (user_id, day)"
+        )
+        # До какой записи статистика уже свёрнута
+        # Уже существующие записи будут свёрнуты при первом запуске
+        await self.pool.execute(
+            "CREATE TABLE IF NOT EXISTS commands_rollup ("
+            "id INTEGER PRIMARY KEY DEFAULT 1,"
+            "last_id INTEGER NOT NULL)"
+        )
+        await self.pool.execute(
+            "INSERT INTO commands_rollup VALUES(1, 0) "
+            "ON CONFLICT (id) DO NOTHING"
+        )
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS commands_stat_used_at_idx "
+            "ON commands_stat (used_at)"
+        )
+
+    async def load(self) -> None:
+        """Запускает запись и сворачивание использования команд."""
+        self.buffer.start()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._rollup_loop())
+
+    async def close(self) -> None:
+        """Сохраняет оставшиеся записи.
+
+        Цикл свёрток не отменяется, а дожидается окончания текущей
+        свёртки, чтобы не прерывать её транзакцию.
+        """
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.buffer.close()
+
+    # Свёртки статистики
+    # ==================
+
+    async def _rollup_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), _ROLLUP_INTERVAL)
+            except TimeoutError:
+                pass
+            try:
+                await self.rollup()
+                if time.monotonic() - self._pruned_at > _PRUNE_INTERVAL:
+                    await self.prune()
+            except Exception as e:
+                logger.exception(e)
+
+    async def rollup(self) -> None:
+        """Сворачивает новые записи в почасовую и дневную статистику.
+
+        Записи сворачиваются в одной транзакции вместе с отметкой о
+        последней свёрнутой записи, потому не учитываются дважды.
+        """
+        await self.buffer.flush()
+        async with self.pool.acquire() as conn, conn.transaction():
+            last_id: int = await conn.fetchval(
+                "SELECT last_id FROM commands_rollup WHERE id=1 FOR UPDATE"
+            )
+            upto: int | None = await conn.fetchval(
+                "SELECT MAX(id) FROM commands_stat"
+            )
+            if upto is None or upto <= last_id:
+                return
+            await conn.execute(_ROLLUP_SQL, last_id, upto)
+            await conn.execute(
+                "UPDATE commands_rollup SET last_id=$1 WHERE id=1", upto
+            )
+
+    async def prune(self) -> int:
+        """Удаляет свёрнутые записи старше `RAW_RETENTION`.
+
+        Возвращает количество удалённых записей.
+        """
+        status = await self.pool.execute(
+            "DELETE FROM commands_stat WHERE used_at < $1 "
+            "AND id <= (SELECT last_id FROM commands_rollup WHERE id=1)",
+            datetime.now() - RAW_RETENTION,
+        )
+        self._pruned_at = time.monotonic()
+        return int(status.split()[-1])
+
+    # Получение статистики
+    # ====================
+
+    async def count_commands(
+        self, guild_id: int | None = None, period: Period | None = None
+    ) -> Counter[str]:
+        """Сколько раз использовалась каждая команда.
+
+        Можно ограничить статистику сервером и периодом.
+        Для личных сообщений используется `guild_id = 0`.
+        """
+        await self.rollup()
+        since = _since(period)
+        cur = await self.pool.fetch(
+            "SELECT command, SUM(count) FROM commands_hourly "
+            "WHERE ($1::BIGINT IS NULL OR guild_id = $1) AND hour >= $2 "
+            "GROUP BY command",
+            guild_id,
+            since,
+        )
+        return Counter({row[0]: int(row[1]) for row in cur})
 
-    async def count_commands(self) -> Counter[str]:
-        """Retrieve items by parameter from the database."""
-        cur = await self.pool.fetch(f"SELECT command FROM {self.__tablename__}")
-        return Counter(row[0] for row in cur)
+    async def count_user(
+        self, user_id: int, period: Period | None = None
+    ) -> Counter[str]:
+        """Сколько раз пользователь использовал каждую команду."""
+        await self.rollup()
+        since = _since(period)
+        cur = await self.pool.fetch(
+            "SELECT command, SUM(count) FROM commands_users_daily "
+            "WHERE user_id = $1 AND day >= $2 GROUP BY command",
+            user_id,
+            since.date(),
+        )
+        return Counter({row[0]: int(row[1]) for row in cur})
 
-    async def add_command(
+    def add_command(
         self, user_id: int, guild_id: int | None, command: str
-    ) -> None:
-        """Create a new user record in the database."""
+    ) -> bool:
+        """Записывает использование команды.
+
+        Не ждёт записи в базу данных.
+        Возвращает False, если запись была отброшена.
+        """
+        return self.buffer.add((user_id, guild_id, command, datetime.now()))
+
+
+class TimingsTable(DBTable, table="commands_timings"):
+    """Время выполнения команд.
+
+    Периодически сохраняет гистограммы из `ChioClient.timings`.
+    Каждая запись содержит замеры одной команды за время с прошлого
+    сохранения, в гистограмме хранятся только непустые корзины.
+    """
+
+    def __init__(self, db: ChioDB) -> None:
+        super().__init__(db)
+        self._task: asyncio.Task[None] | None = None
+        self._stop = asyncio.Event()
+
+    async def create_table(self) -> None:
+        """Создаёт таблицы для базы данных."""
         await self.pool.execute(
-            f"INSERT INTO {self.__tablename__}(user_id, guild_id, command) "
-            "VALUES($1,$2,$3)",
-            user_id,
-            guild_id,
-            command,
+            "CREATE TABLE IF NOT EXISTS commands_timings ("
+            "saved_at TIMESTAMP NOT NULL,"
+            "command TEXT NOT NULL,"
+            "phase VARCHAR(8) NOT NULL,"
+            "errors INTEGER NOT NULL,"
+            "buckets INTEGER[] NOT NULL,"
+            "counts INTEGER[] NOT NULL)"
+        )
+        await self.pool.execute(
+            "CREATE INDEX IF NOT EXISTS commands_timings_saved_at_idx "
+            "ON commands_timings (saved_at)"
+        )
+
+    async def load(self) -> None:
+        """Запускает периодическое сохранение замеров."""
+        self._stop.clear()
+        self._task = asyncio.create_task(self._save_loop())
+
+    async def close(self) -> None:
+        """Сохраняет оставшиеся замеры.
+
+        Цикл сохранения не отменяется, а дожидается окончания текущего
+        сохранения, чтобы замеры не потерялись посреди записи.
+        """
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.save()
+
+    async def _save_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), _TIMINGS_INTERVAL)
+            except TimeoutError:
+                pass
+            try:
+                await self.save()
+                await self.prune()
+            except Exception as e:
+                logger.exception(e)
+
+    async def save(self) -> None:
+        """Сохраняет замеры, накопленные с прошлого сохранения."""
+        timings = self._db.client.timings
+        pending = timings.take_pending()
+        if not pending:
+            return
+
+        now = datetime.now()
+        records = []
+        for name, stats in pending.items():
+            for phase, hist in stats.phases.items():
+                buckets, counts = hist.sparse()
+                errors = stats.errors if phase == "total" else 0
+                records.append((now, name, phase, errors, buckets, counts))
+        try:
+            await self.pool.copy_records_to_table(
+                "commands_timings",
+                records=records,
+                columns=(
+                    "saved_at",
+                    "command",
+                    "phase",
+                    "errors",
+                    "buckets",
+                    "counts",
+                ),
+            )
+        except BaseException:
+            timings.restore_pending(pending)
+            raise
+
+    async def prune(self) -> int:
+        """Удаляет замеры старше `RAW_RETENTION`."""
+        status = await self.pool.execute(
+            "DELETE FROM commands_timings WHERE saved_at < $1",
+            datetime.now() - RAW_RETENTION,
+        )
+        return int(status.split()[-1])
+
+    async def get_timings(self, period: Period) -> dict[str, CommandStats]:
+        """Время выполнения команд за период.
+
+        Сохранённые замеры складываются в одну гистограмму на каждый
+        этап выполнения команды.
+        """
+        await self.save()
+        cur = await self.pool.fetch(
+            "SELECT command, phase, errors, buckets, counts "
+            "FROM commands_timings WHERE saved_at >= $1",
+            _since(period),
         )
+        timings: dict[str, CommandStats] = {}
+        for row in cur:
+            stats = timings.setdefault(row[0], CommandStats())
+            stats.errors += row[2]
+            stats.phases[row[1]].merge(Histogram.from_sparse(row[3], row[4]))
+        return timings
@@ -0,0 +1,168 @@
+"""Запросы активности на настоящей схеме базы данных.
+
+Запросы проверяются в Postgres, потому для запуска нужна тестовая
+база данных, адрес которой указывается в `CHIO_TEST_DSN`.
+Каждый тест работает в отдельной схеме, которая удаляется после него.
+"""
+
+import asyncio
+import os
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import TYPE_CHECKING
+
+import pytest
+
+if TYPE_CHECKING:
+    from libs.active_levels import ActiveTable
+
+asyncpg = pytest.importorskip("asyncpg")
+active_levels = pytest.importorskip("libs.active_levels")
+
+DSN = os.environ.get("CHIO_TEST_DSN")
+pytestmark = pytest.mark.skipif(DSN is None, reason="CHIO_TEST_DSN not set")
+
+TableTest = Callable[["ActiveTable", list[object]], Awaitable[None]]
+
+
+def run_with_table(test: TableTest) -> None:
+    """Запускает тест с таблицей активности во временной схеме."""
+
+    async def main() -> None:
+        schema = f"test_{uuid.uuid4().hex}"
+        conn = await asyncpg.connect(DSN)
+        await conn.execute(f"CREATE SCHEMA {schema}")
+        try:
+            pool = await asyncpg.create_pool(
+                DSN, server_settings={"search_path": schema}
+            )
+            events: list[object] = []
+            db = SimpleNamespace(
+                pool=pool,
+                client=SimpleNamespace(
+                    app=SimpleNamespace(
+                        event_manager=SimpleNamespace(dispatch=events.append)
+                    )
+                ),
+            )
+            try:
+                table = active_levels.ActiveTable(db)
+                await table.create_table()
+                await test(table, events)
+            finally:
+                await pool.close()
+        finally:
+            await conn.execute(f"DROP SCHEMA {schema} CASCADE")
+            await conn.close()
+
+    asyncio.run(main())
+
+
+def test_flush_writes_active_and_hourly() -> None:
+    """Сохранение активности записывает общие и почасовые счётчики."""
+
+    async def test(table: "ActiveTable", events: list[object]) -> None:
+        await table.add_messages(1, 10)
+        await table.add_messages(2, 3)
+        await table.flush()
+
+        user = await table.get_user(1)
+        assert user is not None
+        assert user.messages == 1
+        assert user.words == 10
+
+        day = await table.get_period_user("day", 1)
+        assert day.messages == 1
+        assert day.words == 10
+        assert day.xp == user.total_xp
+
+    run_with_table(test)
+
+
+def test_add_voice_writes_hourly() -> None:
+    """Голосовая активность сохраняется сразу вместе с корзиной."""
+
+    async def test(table: "ActiveTable", events: list[object]) -> None:
+        user = await table.add_voice(1, 30, 2)
+        assert user is not None
+        assert user.voice == 30
+
+        day = await table.get_period_user("day", 1)
+        assert day.voice == 30
+        assert day.xp == 10
+
+    run_with_table(test)
+
+
+def test_flush_twice_merges_hourly_bucket() -> None:
+    """Повторное сохранение дополняет ту же почасовую корзину."""
+
+    async def test(table: "ActiveTable", events: list[object]) -> None:
+        for _ in range(2):
+            await table.add_messages(1, 5)
+            await table.flush()
+
+        day = await table.get_period_user("day", 1)
+        assert day.messages == 2
+        assert day.words == 10
+        count = await table.pool.fetchval("SELECT COUNT(*) FROM active_hourly")
+        assert count == 1
+
+    run_with_table(test)
+
+
+def test_compact_merges_old_hours() -> None:
+    """Старые почасовые корзины сжимаются в дневную."""
+
+    async def test(table: "ActiveTable", events: list[object]) -> None:
+        day = datetime.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) - timedelta(days=5)
+        await table.pool.executemany(
+            "INSERT INTO active_hourly "
+            "(user_id, bucket, messages, words, voice, bumps, xp) "
+            "VALUES(1, $1, 1, 2, 0, 0, 3)",
+            [(day + timedelta(hours=h),) for h in (1, 2, 3)],
+        )
+
+        assert await table.compact() == 3
+        rows = await table.pool.fetch("SELECT * FROM active_hourly")
+        assert len(rows) == 1
+        assert rows[0]["bucket"] == day
+        assert rows[0]["messages"] == 3
+        assert rows[0]["xp"] == 9
+
+    run_with_table(test)
+
+
+def test_level_position_matches_leaderboard() -> None:
+    """Место по уровню совпадает с таблицей лидеров по опыту."""
+
+    async def test(table: "ActiveTable", events: list[object]) -> None:
+        await table.set_user(active_levels.UserActive(1, 0, 0, 0, 0, 2, 0))
+        await table.set_user(active_levels.UserActive(2, 0, 0, 0, 0, 2, 5))
+
+        top = await table.get_top("level")
+        assert [user.user_id for user in top] == [2, 1]
+        assert await table.get_position("level", 2) == 1
+        assert await table.get_position("level", 1) == 2
+
+    run_with_table(test)
+
+
+def test_tied_positions_match_leaderboard() -> None:
+    """При равных значениях место совпадает с порядком таблицы лидеров."""
+
+    async def test(table: "ActiveTable", events: list[object]) -> None:
+        for user_id in (1, 2, 3):
+            await table.set_user(
+                active_levels.UserActive(user_id, 5, 0, 0, 0, 1, 0)
+            )
+
+        top = await table.get_top("messages")
+        for pos, user in enumerate(top, 1):
+            assert await table.get_position("messages", user.user_id) == pos
+
+    run_with_table(test)
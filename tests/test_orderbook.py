@@ -0,0 +1,170 @@
+"""Сопоставление заявок торговой площадки.
+
+Стакан работает только в памяти, потому тесты не требуют базы данных.
+"""
+
+from itertools import count
+
+from libs.orderbook import MatchingEngine, Order, Side
+
+_ids = count(1)
+
+
+def make_order(
+    side: Side, price: int, amount: int, user_id: int = 1, item_id: int = 1
+) -> Order:
+    """Заявка с новым ID."""
+    return Order(next(_ids), user_id, item_id, side, price, amount)
+
+
+def test_best_price_first() -> None:
+    """Покупка исполняется сначала по самой низкой цене продажи."""
+    engine = MatchingEngine()
+    expensive = make_order("sell", 12, 1)
+    cheap = make_order("sell", 10, 1)
+    engine.submit(expensive)
+    engine.submit(cheap)
+
+    trades = engine.submit(make_order("buy", 15, 1))
+    assert len(trades) == 1
+    assert trades[0].sell is cheap
+    assert trades[0].price == 10
+
+
+def test_same_price_by_time() -> None:
+    """При равной цене первой исполняется более ранняя заявка."""
+    engine = MatchingEngine()
+    first = make_order("buy", 10, 1)
+    second = make_order("buy", 10, 1)
+    engine.submit(first)
+    engine.submit(second)
+
+    trades = engine.submit(make_order("sell", 10, 1))
+    assert [t.buy for t in trades] == [first]
+    assert engine.get(second.order_id) is second
+
+
+def test_no_match_when_prices_do_not_cross() -> None:
+    """Заявки без пересечения цен остаются в стакане."""
+    engine = MatchingEngine()
+    engine.submit(make_order("sell", 11, 1))
+    assert engine.submit(make_order("buy", 10, 1)) == []
+    assert len(engine) == 2
+
+    book = engine.book(1)
+    assert book.best_bid().price == 10
+    assert book.best_ask().price == 11
+
+
+def test_partial_fill_keeps_rest() -> None:
+    """Неисполненный остаток заявки остаётся в стакане."""
+    engine = MatchingEngine()
+    sell = make_order("sell", 10, 5)
+    engine.submit(sell)
+
+    buy = make_order("buy", 10, 3)
+    trades = engine.submit(buy)
+    assert [t.amount for t in trades] == [3]
+    assert buy.amount == 0
+    assert engine.get(buy.order_id) is None
+    assert engine.get(sell.order_id).amount == 2
+
+    levels = engine.book(1).depth("sell")
+    assert [(lvl.price, lvl.amount, lvl.orders) for lvl in levels] == [
+        (10, 2, 1)
+    ]
+
+
+def test_order_sweeps_several_levels() -> None:
+    """Крупная заявка исполняется по нескольким ценам."""
+    engine = MatchingEngine()
+    engine.submit(make_order("sell", 10, 2))
+    engine.submit(make_order("sell", 11, 2))
+
+    buy = make_order("buy", 12, 5)
+    trades = engine.submit(buy)
+    assert [(t.price, t.amount) for t in trades] == [(10, 2), (11, 2)]
+    assert buy.amount == 1
+    assert engine.book(1).best_bid() is buy
+    assert engine.stats.trades == 2
+    assert engine.stats.items == 4
+
+
+def test_buyer_refund() -> None:
+    """Покупателю возвращается разница с ценой продажи."""
+    engine = MatchingEngine()
+    engine.submit(make_order("sell", 7, 3))
+
+    trade = engine.submit(make_order("buy", 10, 3))[0]
+    assert trade.total == 21
+    assert trade.refund == 9
+
+
+def test_resting_buy_has_no_refund() -> None:
+    """Сделка по цене стоящей покупки не возвращает монет."""
+    engine = MatchingEngine()
+    engine.submit(make_order("buy", 10, 2))
+
+    trade = engine.submit(make_order("sell", 7, 2))[0]
+    assert trade.price == 10
+    assert trade.refund == 0
+
+
+def test_items_do_not_mix() -> None:
+    """Заявки разных предметов не сопоставляются."""
+    engine = MatchingEngine()
+    engine.submit(make_order("sell", 10, 1, item_id=1))
+    assert engine.submit(make_order("buy", 10, 1, item_id=2)) == []
+
+
+def test_cancel_removes_order() -> None:
+    """Снятая заявка возвращает остаток и больше не исполняется."""
+    engine = MatchingEngine()
+    sell = make_order("sell", 10, 4, user_id=2)
+    engine.submit(sell)
+    engine.submit(make_order("buy", 10, 1))
+
+    left = engine.cancel(sell.order_id)
+    assert left is not None
+    assert left.amount == 3
+    assert engine.get(sell.order_id) is None
+    assert engine.user_orders(2) == []
+    assert engine.book(1).best_ask() is None
+    assert engine.submit(make_order("buy", 10, 1)) == []
+    assert engine.cancel(sell.order_id) is None
+
+
+def test_restore_requeues_order() -> None:
+    """Возвращённая заявка встаёт в конец очереди по своей цене."""
+    engine = MatchingEngine()
+    first = make_order("sell", 10, 1)
+    second = make_order("sell", 10, 1)
+    engine.submit(first)
+    engine.submit(second)
+
+    left = engine.cancel(first.order_id)
+    assert left is not None
+    assert engine.restore(left) == []
+    assert len(engine) == 2
+
+    trades = engine.submit(make_order("buy", 10, 2))
+    assert [t.sell.order_id for t in trades] == [
+        second.order_id,
+        first.order_id,
+    ]
+
+
+def test_restore_matches_new_orders() -> None:
+    """Возвращённая заявка исполняется по заявкам, пришедшим без неё."""
+    engine = MatchingEngine()
+    sell = make_order("sell", 10, 2)
+    engine.submit(sell)
+    left = engine.cancel(sell.order_id)
+    assert left is not None
+
+    buy = make_order("buy", 10, 1)
+    assert engine.submit(buy) == []
+
+    trades = engine.restore(left)
+    assert [(t.buy, t.amount) for t in trades] == [(buy, 1)]
+    assert engine.get(sell.order_id).amount == 1